@@ -28,7 +28,7 @@ class BVRuleContextManager(object):
                 #print "# Adding rule ", x.added_rule
                 r = x.added_rule
                 self.added_rules.append(r)
-                self.grammar.rules[r.nt].append(r)
+                self.grammar.add_bv_rule(r)
 
     def __exit__(self, t, value, traceback):
 
@@ -36,8 +36,8 @@ class BVRuleContextManager(object):
             return
 
         #print "# Removing rule", r
-        for r in self.added_rules:
-            self.grammar.rules[r.nt].remove(r)
+        for r in reversed(self.added_rules): # last in, first out, so Grammar.remove_bv_rule can just pop
+            self.grammar.remove_bv_rule(r)
 
         # reset
         self.added_rules = []
@@ -8,6 +8,8 @@ For functions, we have a data object of the form [output, args]
 """
 from copy import deepcopy
 
+import numpy
+
 from LOTlib.Miscellaneous import weighted_sample, qq
 
 # ------------------------------------------------------------------------------------------------------------
@@ -37,6 +39,76 @@ class FunctionData:
 
 # ------------------------------------------------------------------------------------------------------------
 
+def object_array(xs):
+    """A 1-d numpy array of objects (so that, e.g., tuples stay elements rather than becoming rows)."""
+    a = numpy.empty(len(xs), dtype=object)
+    for i, x in enumerate(xs):
+        a[i] = x
+    return a
+
+class ColumnarFunctionData(object):
+    """
+    A list of FunctionData stored by columns, so that likelihoods can score all of them at once (see
+    Hypothesis.compute_batch_likelihood). It still acts as the list it was made from, so code that loops over
+    data works on it too.
+
+    Attributes:
+        inputs: the tuple of inputs of each datum
+        input_columns: if each argument is always an int, or always a float, a numpy array (of int64s or floats)
+                       for each argument; otherwise None
+        outputs: numpy array of outputs (floats, bools, or objects)
+        alpha, ll_sd, ... : numpy arrays of any other attribute that all the data have
+
+    """
+    def __init__(self, data):
+        assert all(isinstance(di, FunctionData) for di in data), "ColumnarFunctionData must be made from FunctionData"
+        self.data = list(data)
+        self.inputs = [tuple(di.input) for di in self.data]
+
+        # if the inputs are all numbers (and the same length), also keep an array for each argument position, as
+        # long as each position's are all ints (that fit in int64s) or all floats, so that they act as the scalars do
+        self.input_columns = None
+        if self.inputs and len(set(map(len, self.inputs))) == 1:
+            columns = []
+            for col in zip(*self.inputs):
+                if all(isinstance(x, (int, long)) and not isinstance(x, bool) and abs(x) < 2**62 for x in col):
+                    columns.append(numpy.array(col, dtype=numpy.int64))
+                elif all(isinstance(x, float) for x in col):
+                    columns.append(numpy.array(col, dtype=float))
+                else:
+                    break
+            else:
+                self.input_columns = columns
+
+        outputs = [di.output for di in self.data]
+        if all(isinstance(o, (bool, numpy.bool_)) for o in outputs):
+            self.outputs = numpy.array(outputs, dtype=bool)
+        elif all(isinstance(o, (int, long, float)) and not isinstance(o, bool) for o in outputs):
+            self.outputs = numpy.array(outputs, dtype=float)
+        else:
+            self.outputs = object_array(outputs)
+
+        # every other attribute the data share becomes a column
+        keys = set(self.data[0].__dict__.keys()) if self.data else set()
+        for di in self.data:
+            keys &= set(di.__dict__.keys())
+        for k in keys - set(['input', 'output', 'data', 'inputs', 'input_columns', 'outputs']):
+            setattr(self, k, numpy.array([getattr(di, k) for di in self.data]))
+
+    def __len__(self):
+        return len(self.data)
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __getitem__(self, i):
+        return self.data[i]
+
+    def __repr__(self):
+        return '<ColumnarFunctionData: %i data>' % len(self)
+
+# ------------------------------------------------------------------------------------------------------------
+
 class HumanData:
     """Human data class.
 
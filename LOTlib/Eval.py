@@ -2,6 +2,7 @@
     Routines for evaling
 """
 import sys
+import inspect
 
 """
     The exceptions we throw for all problems in Evaluation
@@ -24,8 +25,11 @@ class RecursionDepthException(EvaluationException):
 # GLOBAL_PRIMITIVE_OPS = 0
 #  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-def primitive(fn):
-    """A decocator for basic primitives that increments our counters. Used to be known as @LOTlib_primitive"""
+def primitive(fn=None, **kwargs):
+    """A decocator for basic primitives that increments our counters. Used to be known as @LOTlib_primitive
+
+    It can also take any of register_primitive's keywords, as in @primitive(stochastic=True)
+    """
 
     """
     def inside(*args, **kwargs):
@@ -41,8 +45,11 @@ def primitive(fn):
     return inside
     """
 
+    if fn is None: # called with keywords, so return the decorator
+        return lambda fn: primitive(fn, **kwargs)
+
     # Just register the primitive
-    register_primitive(fn)
+    register_primitive(fn, **kwargs)
 
     return fn
 
@@ -65,7 +72,56 @@ def None2None(fn):
 
     return inside
 
-def register_primitive(function, name=None):
+class PrimitiveInfo(object):
+    """
+        What we know about a registered primitive, for whatever needs to know it (e.g. LOTlib.SubtreeCache, which
+        only stores pure subtrees, and NumpyArithmetic's vectorized functions):
+
+        function -- the function
+        name -- what it is called when evaled
+        pure -- does it always give the same output for the same inputs, without changing them? (Only if marked so)
+        stochastic -- does it sample (and so is not pure)?
+        arity -- (the fewest, the most) args it takes, where the most is None for *args; None if we can't tell
+        argtypes, returntype -- optionally, the types (or nonterminals) of its args and what it returns
+        vectorized -- optionally, a version that takes and returns numpy arrays, elementwise
+        cost -- optionally, an estimate of how expensive a call is
+    """
+
+    def __init__(self, function, name, pure=False, stochastic=False, arity=None, argtypes=None, returntype=None,
+                 vectorized=None, cost=None):
+        self.__dict__.update(locals())
+        del self.self
+
+    def __repr__(self):
+        return "<PrimitiveInfo: %s%s>" % (self.name, '' if self.pure else (' stochastic' if self.stochastic else ' impure'))
+
+primitive_info = dict() # name -> PrimitiveInfo, for every registered primitive
+vectorized_primitives = dict() # name -> vectorized version, for the primitives that have one
+
+def get_arity(function):
+    """(the fewest, the most) args function takes, or None if we can't tell (e.g. for builtins)."""
+    try:
+        spec = inspect.getargspec(function)
+    except TypeError:
+        return None
+    n, ndefaults = len(spec.args), len(spec.defaults or ())
+    return (n - ndefaults, None if spec.varargs is not None else n)
+
+def get_primitive_info(name):
+    """The PrimitiveInfo for the primitive called name, or None if there isn't one."""
+    return primitive_info.get(name, None)
+
+def is_pure_primitive(name):
+    info = primitive_info.get(name, None)
+    return info is not None and info.pure
+
+def register_vectorized(name, vectorized):
+    """Give the already registered primitive called name a vectorized version."""
+    assert name in primitive_info, "*** Cannot vectorize %s, which is not a primitive" % name
+    primitive_info[name].vectorized = vectorized
+    vectorized_primitives[name] = vectorized
+
+def register_primitive(function, name=None, pure=False, stochastic=False, **kwargs):
     """
         This allows us to load new functions into the evaluation environment.
         Defaultly all in LOTlib.Primitives are imported. However, we may want to add our
@@ -78,7 +134,12 @@ def register_primitive(function, name=None):
         register_primitive(flatten, name="myflatten")
 
         where flatten is a function that is defined in the calling context and name
-        specifies that it takes a different name when evaled in LOTlib
+        specifies that it takes a different name when evaled in LOTlib.
+
+        This also records a PrimitiveInfo for it, with the rest of the keywords (argtypes,
+        returntype, vectorized, cost). Give pure=True if it always gives the same output for the
+        same inputs, without changing them; only then do we cache (or fold) its results. Give
+        stochastic=True if it samples.
 
         NOTE: For primitives, this is now defaultly called by the decorator @LOT_primitive
 
@@ -89,3 +150,172 @@ def register_primitive(function, name=None):
 
     sys.modules['__builtin__'].__dict__[name] = function
 
+    assert not (pure and stochastic), "*** Stochastic primitives can't be pure"
+
+    primitive_info[name] = PrimitiveInfo(function, name, pure=pure, stochastic=stochastic, arity=get_arity(function),
+                                         **kwargs)
+    if primitive_info[name].vectorized is not None:
+        vectorized_primitives[name] = primitive_info[name].vectorized
+    else:
+        vectorized_primitives.pop(name, None)
+
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# A cache of compiled functions, so that we do not eval the same expression every time
+# MCMC comes back to it. LOTHypothesis.compile_function uses compiled_function_cache below.
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+from collections import OrderedDict
+
+class CompiledFunctionCache(object):
+    """
+        A bounded least-recently-used cache from expression strings to the functions they eval to.
+        hits and misses count the lookups. A maxsize of 0 turns the cache off.
+
+        NOTE: The functions are shared by every hypothesis with the same string, so they must not keep state.
+    """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self.functions = OrderedDict() # in order of use, least recent first
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, s):
+        """Return the function for s, or None if we don't have it."""
+        f = self.functions.pop(s, None)
+        if f is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.functions[s] = f # move to the end, as the most recent
+        return f
+
+    def add(self, s, f):
+        if self.maxsize > 0:
+            self.functions[s] = f
+            while len(self.functions) > self.maxsize:
+                self.functions.popitem(last=False)
+
+    def clear(self):
+        self.functions.clear()
+        self.hits, self.misses = 0, 0
+
+    def __len__(self):
+        return len(self.functions)
+
+    def __str__(self):
+        return "<CompiledFunctionCache: %i functions, %i hits, %i misses>" % (len(self), self.hits, self.misses)
+
+compiled_function_cache = CompiledFunctionCache()
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Evaluation budgets: counting primitive operations (what LOCAL_PRIMITIVE_OPS above was
+# for), and giving up on calls that use too many or take too long.
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+from time import time
+from heapq import heappush, heappushpop
+
+class EvaluationBudget(object):
+    """
+        Limits on a call of a hypothesis: one that uses more than max_ops primitive operations (each counting its
+        PrimitiveInfo.cost, or 1 if that is None) or runs longer than max_time seconds raises TooBigException. Either
+        may be None for no limit.
+
+        To use one, give budget=EvaluationBudget(...) to a LOTHypothesis. Its function then calls counting versions
+        of the primitives, so hypotheses without a budget pay nothing for this. Each hypothesis keeps what its calls
+        cost (see LOTHypothesis.get_evaluation_cost), and the budget keeps totals over all calls, along with the
+        nexpensive most expensive calls as (ops, seconds, hypothesis string), in self.expensive.
+
+        NOTE: Only registered primitives (and recursive calls) are counted, so a budget can't stop a long
+              computation inside of one primitive.
+    """
+
+    def __init__(self, max_ops=None, max_time=None, nexpensive=10):
+        self.max_ops = max_ops
+        self.max_time = max_time
+        self.nexpensive = nexpensive
+        self.functions = CompiledFunctionCache() # our functions are different from everyone else's
+        self.namespaces = dict() # id of the globals we were given -> (number of primitives, our namespace)
+        self.depth = 0 # how many calls we are inside of
+        self.reset()
+
+    def reset(self):
+        self.ops, self.start_time = 0, None
+        self.calls, self.aborts = 0, 0
+        self.total_ops, self.total_time = 0, 0.0
+        self.expensive = [] # a heap of the most expensive calls
+
+    def __getstate__(self):
+        return (self.max_ops, self.max_time, self.nexpensive)
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def __str__(self):
+        return "<EvaluationBudget: %i calls, %i aborted, %i ops, %.3fs>" % \
+               (self.calls, self.aborts, self.total_ops, self.total_time)
+
+    def counted(self, f, cost):
+        """A version of the primitive f that counts against this budget."""
+        max_ops = self.max_ops if self.max_ops is not None else float("inf")
+        max_time = self.max_time
+
+        def inside(*args, **kwargs):
+            self.ops += cost
+            if self.ops > max_ops or (max_time is not None and time() - self.start_time > max_time):
+                raise TooBigException
+            return f(*args, **kwargs)
+
+        return inside
+
+    def charge(self, cost=1):
+        """Count an operation that isn't a primitive (e.g. a recursive call of a RecursiveLOTHypothesis)."""
+        self.ops += cost
+        if (self.max_ops is not None and self.ops > self.max_ops) or \
+                (self.max_time is not None and time() - self.start_time > self.max_time):
+            raise TooBigException
+
+    def namespace(self, g):
+        """The globals g, with every registered primitive replaced by its counted version."""
+        n, ns = self.namespaces.get(id(g), (None, None))
+        if n != len(primitive_info):
+            ns = dict(g)
+            for name, info in primitive_info.items():
+                ns[name] = self.counted(info.function, info.cost if info.cost is not None else 1)
+            self.namespaces[id(g)] = (len(primitive_info), ns)
+        return ns
+
+    def compile(self, s, g):
+        """eval the string s in namespace(g)."""
+        f = self.functions.get(s)
+        if f is None:
+            f = eval(s, self.namespace(g))
+            self.functions.add(s, f)
+        return f
+
+    def start(self):
+        """Start a call (inside of which, self.depth > 0)."""
+        self.depth += 1
+        self.ops, self.start_time = 0, time()
+
+    def stop(self, h, aborted=False):
+        """Finish a call of h, and return its (ops, seconds)."""
+        t = time() - self.start_time
+        self.depth -= 1
+        self.calls += 1
+        self.aborts += aborted
+        self.total_ops += self.ops
+        self.total_time += t
+
+        if len(self.expensive) < self.nexpensive:
+            heappush(self.expensive, (self.ops, t, str(h)))
+        elif self.nexpensive > 0 and self.ops > self.expensive[0][0]:
+            heappushpop(self.expensive, (self.ops, t, str(h)))
+
+        return self.ops, t
+
+    def most_expensive(self):
+        """The most expensive calls, as (ops, seconds, hypothesis string), most expensive first."""
+        return sorted(self.expensive, reverse=True)
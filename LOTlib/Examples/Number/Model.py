@@ -28,13 +28,13 @@ word_to_number['undef'] = 'U'
 
 prev_hash[None] = None
 
-@primitive
+@primitive(pure=True)
 def next_(w): return next_hash[w]
 
-@primitive
+@primitive(pure=True)
 def prev_(w): return prev_hash[w]
 
-@primitive
+@primitive(pure=True)
 def ifU_(C,X):
     if C:
         return X
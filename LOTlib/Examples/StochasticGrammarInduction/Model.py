@@ -26,7 +26,7 @@ from LOTlib.Grammar import Grammar
 from LOTlib.Miscellaneous import q
 
 from LOTlib.Eval import register_primitive
-register_primitive(LOTlib.Miscellaneous.flatten2str)
+register_primitive(LOTlib.Miscellaneous.flatten2str, pure=True)
 
 # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 
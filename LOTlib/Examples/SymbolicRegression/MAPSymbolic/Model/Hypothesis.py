@@ -1,6 +1,7 @@
 
 import numpy
 from scipy.optimize import fmin
+from LOTlib.DataAndObjects import ColumnarFunctionData
 from LOTlib.Hypotheses.LOTHypothesis import LOTHypothesis
 from LOTlib.Hypotheses.Likelihoods.GaussianLikelihood import GaussianLikelihood
 from LOTlib.Miscellaneous import normlogpdf, Infinity, attrmem
@@ -32,6 +33,10 @@ class MAPSymbolicRegressionHypothesis(GaussianLikelihood, LOTHypothesis):
         vals.extend(self.CONSTANT_VALUES)
         return LOTHypothesis.__call__(self, *vals)
 
+    def batch_responses(self, data):
+        """ Likewise, include the constants when running on all the data at once """
+        return LOTHypothesis.batch_responses(self, data, *self.CONSTANT_VALUES)
+
     @attrmem('prior')
     def compute_prior(self):
         # Add together the structural prior and the constant prior
@@ -42,6 +47,10 @@ class MAPSymbolicRegressionHypothesis(GaussianLikelihood, LOTHypothesis):
     def compute_likelihood(self, data):
         """ A pseudo-likelihood corresponding to that under the best fitting params """
 
+        # With columns, each likelihood in the optimization is one numpy call on all the data (when we can vectorize)
+        if not isinstance(data, ColumnarFunctionData):
+            data = ColumnarFunctionData(data)
+
         def to_maximize(fit_params):
             self.CONSTANT_VALUES = fit_params.tolist() # set these
             # And return the original likelihood, which by get_function_responses above uses this
@@ -0,0 +1,227 @@
+"""
+    A compact encoding of FunctionNode trees as flat arrays, for storing and shipping large sets of hypotheses.
+
+    A FlatTree is two parallel integer arrays in prefix order:
+        ids[k]      -- the id of the grammar rule that made the k'th node. Strings left in a node's args (e.g.
+                       nonterminals that were not expanded) are LEAF, and uses of bound variables are BV.
+        bindings[k] -- for BV entries, the position of the lambda that introduced the variable; otherwise NO_BINDING.
+
+    The ids come from a FlatTreeEncoder, which numbers a grammar's rules by sorting their signatures (see
+    GrammarRule.get_rule_signature), so the same grammar gives the same ids in every process. Decoding makes new
+    uuids for bound variables, so the result is equal to (but not identical to) the tree that was encoded.
+
+    Example:
+        encoder = FlatTreeEncoder(grammar)
+        ft = encoder.encode(h.value)
+        encoder.log_probability(ft) # == grammar.log_probability(h.value)
+        t = encoder.decode(ft)      # == h.value
+"""
+import numpy
+
+from LOTlib.FunctionNode import isFunctionNode, BVAddFunctionNode, BVUseFunctionNode
+from LOTlib.GrammarRule import BVAddGrammarRule
+
+LEAF = -1
+BV = -2
+NO_BINDING = -1
+
+
+class FlatTree(object):
+    """The ids and bindings arrays for one tree. These hash and compare by value, and pickle compactly."""
+    __slots__ = ['ids', 'bindings']
+
+    def __init__(self, ids, bindings):
+        self.ids = numpy.asarray(ids, dtype=numpy.int32)
+        self.bindings = numpy.asarray(bindings, dtype=numpy.int32)
+        assert self.ids.shape == self.bindings.shape
+
+    def __getstate__(self):
+        return (self.ids, self.bindings)
+
+    def __setstate__(self, state):
+        self.ids, self.bindings = state
+
+    def __len__(self):
+        return len(self.ids)
+
+    def count_nodes(self):
+        """The number of FunctionNodes in the tree."""
+        return int(numpy.count_nonzero(self.ids != LEAF))
+
+    def __hash__(self):
+        return hash((self.ids.tostring(), self.bindings.tostring()))
+
+    def __eq__(self, other):
+        return isinstance(other, FlatTree) and numpy.array_equal(self.ids, other.ids) and \
+            numpy.array_equal(self.bindings, other.bindings)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+
+class FlatTreeEncoder(object):
+    """Converts between FunctionNodes and FlatTrees for a grammar, and computes things directly on FlatTrees.
+
+    The rules and their probabilities are read when this is made, so make a new one if you change the grammar.
+    Bound variable rules must not be in the grammar (i.e. don't make one inside a BVRuleContextManager).
+
+    """
+
+    def __init__(self, grammar):
+        self.grammar = grammar
+
+        self.rules = sorted(grammar, key=lambda r: r.get_rule_signature())
+        self.sig2id = {r.get_rule_signature(): i for i, r in enumerate(self.rules)}
+        assert len(self.sig2id) == len(self.rules), "*** Rule signatures must be unique to encode trees"
+
+        # Number the nonterminals, including ones that only bound variables return
+        nts = set(r.nt for r in self.rules) | set(r.bv_type for r in self.rules if isinstance(r, BVAddGrammarRule))
+        self.nt2idx = {nt: i for i, nt in enumerate(sorted(nts))}
+
+        # The normalizer of each nonterminal (outside of any lambda)
+        self.nt_Z = numpy.zeros(len(self.nt2idx))
+        for r in self.rules:
+            self.nt_Z[self.nt2idx[r.nt]] += r.p
+
+        # For each rule id: its nonterminal, p, and number of args. For lambdas, the same for the variable they add
+        # (for other rules these are unused)
+        self.rule_nt = numpy.array([self.nt2idx[r.nt] for r in self.rules], dtype=int)
+        self.rule_p = numpy.array([r.p for r in self.rules])
+        self.rule_nargs = numpy.array([len(r.to) if r.to is not None else 0 for r in self.rules], dtype=int)
+        self.is_bvadd = numpy.array([isinstance(r, BVAddGrammarRule) for r in self.rules], dtype=bool)
+
+        self.bv_nt = numpy.zeros(len(self.rules), dtype=int)
+        self.bv_p = numpy.ones(len(self.rules))
+        self.bv_nargs = numpy.zeros(len(self.rules), dtype=int)
+        for i, r in enumerate(self.rules):
+            if isinstance(r, BVAddGrammarRule):
+                self.bv_nt[i] = self.nt2idx[r.bv_type]
+                self.bv_p[i] = r.bv_p if r.bv_p is not None else grammar.BV_P
+                self.bv_nargs[i] = len(r.bv_args) if r.bv_args is not None else 0
+
+    # --------------------------------------------------------------------------------------------------------
+    # Conversion
+
+    def encode(self, t):
+        """Return the FlatTree for the FunctionNode t."""
+        ids, bindings = [], []
+        self._encode(t, ids, bindings, dict())
+        return FlatTree(ids, bindings)
+
+    def _encode(self, x, ids, bindings, lambdas):
+        # lambdas maps the names of the bound variables above us to the positions of their lambdas
+        if not isFunctionNode(x):
+            ids.append(LEAF)
+            bindings.append(NO_BINDING)
+            return
+
+        if isinstance(x, BVUseFunctionNode):
+            assert x.name in lambdas, "*** Cannot encode a bound variable without its lambda: %s" % x.name
+            ids.append(BV)
+            bindings.append(lambdas[x.name])
+        else:
+            s = x.get_rule_signature()
+            assert s in self.sig2id, "*** No rule in the grammar for %s" % str(s)
+            ids.append(self.sig2id[s])
+            bindings.append(NO_BINDING)
+
+            if isinstance(x, BVAddFunctionNode):
+                lambdas = dict(lambdas)
+                lambdas[x.added_rule.name] = len(ids)-1
+
+        if x.args is not None:
+            for a in x.args:
+                self._encode(a, ids, bindings, lambdas)
+
+    def decode(self, ft):
+        """Return a new FunctionNode for the FlatTree ft."""
+        t, k = self._decode(ft.ids.tolist(), ft.bindings.tolist(), 0, None, dict())
+        assert k == len(ft), "*** Extra entries at the end of a FlatTree"
+        return t
+
+    def _decode(self, ids, bindings, k, parent, lambdas):
+        # Decode the subtree starting at k, and return it with the position after it.
+        # lambdas maps positions of lambdas to the nodes we made for them
+        if ids[k] == BV:
+            fn = lambdas[bindings[k]].added_rule.make_FunctionNodeStub(self.grammar, parent)
+        else:
+            fn = self.rules[ids[k]].make_FunctionNodeStub(self.grammar, parent)
+            if isinstance(fn, BVAddFunctionNode):
+                lambdas[k] = fn
+        k += 1
+
+        if fn.args is not None:
+            for i in xrange(len(fn.args)):
+                if ids[k] == LEAF: # keep the string from the rule
+                    k += 1
+                else:
+                    fn.args[i], k = self._decode(ids, bindings, k, fn, lambdas)
+
+        return fn, k
+
+    # --------------------------------------------------------------------------------------------------------
+    # Computing on FlatTrees
+
+    def nargs(self, ft):
+        """The number of args of each entry."""
+        ids = ft.ids
+        nargs = numpy.zeros(len(ids), dtype=int)
+
+        isrule = ids >= 0
+        nargs[isrule] = self.rule_nargs[ids[isrule]]
+
+        isbv = ids == BV
+        nargs[isbv] = self.bv_nargs[ids[ft.bindings[isbv]]]
+
+        return nargs
+
+    def subtree_ends(self, ft, positions):
+        """For each of positions, the position just after the subtree that starts there."""
+        # unfinished[k] is how many subtrees are unfinished just before entry k; a subtree starting at k ends at
+        # the first place after k where there is one fewer
+        unfinished = numpy.concatenate([[1], 1 + numpy.cumsum(self.nargs(ft) - 1)])
+        return [k + 1 + int(numpy.argmax(unfinished[k+1:] == unfinished[k] - 1)) for k in positions]
+
+    def depth(self, ft):
+        """Returns the depth of the tree, as FunctionNode.depth."""
+        nargs = self.nargs(ft)
+        ids = ft.ids.tolist()
+
+        d, stack = 0, [] # stack holds how many args are left to do at each level above
+        for k in xrange(len(ids)):
+            if ids[k] != LEAF:
+                d = max(d, len(stack))
+
+            if stack:
+                stack[-1] -= 1
+            if nargs[k] > 0:
+                stack.append(nargs[k])
+            while stack and stack[-1] == 0:
+                stack.pop()
+
+        return d
+
+    def log_probability(self, ft):
+        """Returns the log probability of the tree, as Grammar.log_probability."""
+        ids = ft.ids
+        isnode = ids != LEAF
+        isrule = ids >= 0
+        isbv = ids == BV
+
+        # the nonterminal and p of each entry; bound variables get theirs from their lambda's rule
+        nt = numpy.zeros(len(ids), dtype=int)
+        p = numpy.ones(len(ids))
+        nt[isrule] = self.rule_nt[ids[isrule]]
+        p[isrule] = self.rule_p[ids[isrule]]
+        binders = ids[ft.bindings[isbv]]
+        nt[isbv] = self.bv_nt[binders]
+        p[isbv] = self.bv_p[binders]
+
+        # and the normalizer, which includes the rules of the bound variables in scope
+        Z = self.nt_Z[nt]
+        lambdas = numpy.flatnonzero(isrule & self.is_bvadd[numpy.maximum(ids, 0)])
+        for k, end in zip(lambdas, self.subtree_ends(ft, lambdas)):
+            scope = slice(k+1, end)
+            Z[scope] += numpy.where(nt[scope] == self.bv_nt[ids[k]], self.bv_p[ids[k]], 0.0)
+
+        return float(numpy.sum(numpy.log(p[isnode])) - numpy.sum(numpy.log(Z[isnode])))
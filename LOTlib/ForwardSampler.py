@@ -0,0 +1,280 @@
+"""
+    Running a stochastic hypothesis forwards many times at once (e.g. for StochasticFunctionLikelihood), instead of
+    calling it once per sample. We evaluate its tree on groups of runs that are in the same state (the same argument
+    values, and the same number of recursive calls so far), keeping how many runs are in each group:
+
+        - flip_ splits a group in two, with a binomial draw of how many runs come up True
+        - other stochastic primitives (and functions we know nothing about) are called once for each run
+        - deterministic subtrees, and pure primitives, are called once for each group
+        - if_ evaluates each branch only on the runs that take it, and recurse_ evaluates the whole tree on the
+          groups of new arguments
+
+    Groups with equal values are merged. So a program whose runs go only a few distinct ways costs about
+    as much as a few calls, however many samples we want, and the result has exactly the distribution of that many
+    separate calls.
+
+    This handles LOTHypotheses (and RecursiveLOTHypotheses) whose trees have no bound variables or primitives that
+    change their arguments; forward_sample returns None for anything else, so that the caller can call in a loop.
+
+    Example:
+        for value, count in forward_sample(h, [], 512):
+            ...
+"""
+import re
+
+import numpy
+
+from LOTlib.Eval import * # the primitives, for evaling subtrees
+from LOTlib.Primitives import *
+from LOTlib.Eval import RecursionDepthException, get_primitive_info, compiled_function_cache
+from LOTlib.FunctionNode import isFunctionNode, pystring, FunctionNode, BVAddFunctionNode, BVUseFunctionNode
+from LOTlib.SubtreeCache import Raised, keywords, string_regex, identifier_regex, attribute_regex
+
+class Unsupported(Exception):
+    """Raised while planning a tree that forward_sample can't run in groups."""
+    pass
+
+lazy_regex = re.compile(r"\b(if|and|or|lambda)\b") # templates that might not evaluate all of their args
+keyword_arg_regex = re.compile(r"(?<![\w.=!<>])[A-Za-z_]\w*\s*=(?!=)") # as in 'sep=""'
+
+# About how many nodes a compiled hypothesis evaluates, when called, in the time that TreeSampler takes for one step
+STEP_COST = 25
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# What kind of thing each node is
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+def classify(s, args):
+    """
+        Is the string s (a node's name, or a terminal) 'pure' (it uses only args, pure primitives, and constants),
+        'stochastic' (it also uses a stochastic primitive), or 'opaque' (it uses something else, or calls a value)?
+        Raises Unsupported if it uses a primitive that changes its args.
+    """
+    s = keyword_arg_regex.sub('', string_regex.sub("''", s).replace('%s', '0'))
+    kind = 'opaque' if attribute_regex.search(s) else 'pure'
+    for name in identifier_regex.findall(s):
+        info = get_primitive_info(name)
+        if name in args:
+            if re.search(r"\b%s\s*\(" % re.escape(name), s):
+                kind = 'opaque' # calls an argument
+        elif name in keywords or info is not None and info.pure:
+            pass
+        elif info is not None and info.stochastic:
+            if kind == 'pure':
+                kind = 'stochastic'
+        elif info is not None:
+            raise Unsupported("%s changes its arguments" % name)
+        elif not (name in globals() and not callable(globals()[name])):
+            kind = 'opaque'
+    if re.search(r"\)\s*\(", s):
+        kind = 'opaque' # calls a value
+    return kind
+
+def freeze(v):
+    """A hashable key for v that is equal only for equal values of the same types (e.g. for the lists cons_ makes)."""
+    t = type(v)
+    if t is list or t is tuple:
+        return (t, tuple([freeze(x) for x in v]))
+    elif t is set or t is frozenset:
+        return (t, frozenset([freeze(x) for x in v]))
+    elif t is dict:
+        return (t, frozenset([(freeze(k), freeze(x)) for k, x in v.iteritems()]))
+    else:
+        hash(v)
+        return (t, v)
+
+def merge(groups):
+    """Merge the groups (value, calls, count) that have equal values and calls, and drop empty ones."""
+    if len(groups) == 1:
+        return groups if groups[0][2] > 0 else []
+    out, index = [], dict()
+    for v, c, k in groups:
+        if k == 0:
+            continue
+        try:
+            key = (freeze(v), c)
+        except TypeError: # unhashable values stay as they are
+            out.append([v, c, k])
+            continue
+        i = index.get(key)
+        if i is None:
+            index[key] = len(out)
+            out.append([v, c, k])
+        else:
+            out[i][2] += k
+    return [tuple(g) for g in out]
+
+def call(f, args):
+    """f(*args), or a Raised if it raises."""
+    try:
+        return f(*args)
+    except Exception as e:
+        return Raised(e)
+
+class TreeSampler(object):
+    """
+        Runs the tree of hypothesis h in groups (see forward_sample). Making one raises Unsupported if it can't.
+    """
+
+    def __init__(self, h):
+        if not isFunctionNode(h.value) or h.args is None:
+            raise Unsupported("Not a tree")
+
+        self.recurse = getattr(h, 'recurse', None)
+        self.bound = getattr(h, 'recursive_depth_bound', None)
+        self.names = [a for a in h.args if a and a != self.recurse] # args=[''] means no args
+        self.root = h.value
+        self.plan = dict() # id(node) -> (kind, function)
+        self._plan(self.root)
+
+    def compile(self, s, extra=()):
+        # a function of our args (and then extra) that evals the string s
+        s = 'lambda %s: %s' % (', '.join(self.names + list(extra)), s)
+        f = compiled_function_cache.get(s)
+        if f is None:
+            try:
+                f = eval(s)
+            except Exception as e: # e.g. a SyntaxError from a template we don't understand
+                raise Unsupported("Can't compile %r: %s" % (s, e))
+            compiled_function_cache.add(s, f)
+        return f
+
+    def combiner(self, n):
+        # a function of our args and the values of n's FunctionNode args that evals n
+        vs = ['_v%i' % i for i, a in enumerate(n.args) if isFunctionNode(a)]
+        stub = FunctionNode(None, n.returntype, n.name,
+                            [('_v%i' % i if isFunctionNode(a) else a) for i, a in enumerate(n.args)])
+        return self.compile(pystring(stub), vs)
+
+    def arguments(self, n):
+        # a function of our args and the values of n's FunctionNode args that gives the tuple of n's args
+        vs = ['_v%i' % i for i, a in enumerate(n.args) if isFunctionNode(a)]
+        return self.compile('(%s)' % ''.join(('_v%i' % i if isFunctionNode(a) else a) + ','
+                                             for i, a in enumerate(n.args) if a != ''), vs)
+
+    def _plan(self, n):
+        # Plan how to run n (and what's below it), and return whether it is deterministic
+        if isinstance(n, (BVAddFunctionNode, BVUseFunctionNode)):
+            raise Unsupported("Bound variables")
+        if n.args is None:
+            kind = classify(n.name, self.names)
+            self.plan[id(n)] = ('whole' if kind == 'pure' else 'each', self.compile(pystring(n)))
+            return kind == 'pure'
+
+        deterministic = [self._plan(a) for a in n.args if isFunctionNode(a)]
+        terminals = set([classify(a, self.names) for a in n.args if not isFunctionNode(a)])
+        if n.name == self.recurse:
+            if terminals - set(['pure']):
+                raise Unsupported("Recursing on stochastic or unknown args")
+            self.plan[id(n)] = ('recurse', self.arguments(n))
+            return False
+
+        kind = classify(n.name, self.names)
+        kinds = terminals | set([kind])
+        if kinds == set(['pure']) and all(deterministic):
+            self.plan[id(n)] = ('whole', self.compile(pystring(n)))
+            return True
+        elif n.name == 'if_' and len(n.args) == 3 and all(isFunctionNode(a) for a in n.args):
+            self.plan[id(n)] = ('if', None)
+            return False
+        elif lazy_regex.search(string_regex.sub("''", n.name)) or n.name == 'if_':
+            raise Unsupported("Lazy node %s" % n.name)
+        elif n.name == 'flip_' and kind == 'stochastic' and terminals <= set(['pure']):
+            self.plan[id(n)] = ('flip', self.arguments(n))
+            return False
+        else:
+            self.plan[id(n)] = ('group' if kinds == set(['pure']) else 'each', self.combiner(n))
+            return False
+
+    def run(self, args, n, max_steps=None):
+        """A list of (value or Raised, count) for n runs on args. Raises Unsupported after max_steps steps (each
+        node we evaluate on a group, or on each run in it, is one)."""
+        self.max_steps = max_steps
+        self.steps = 0
+        groups = self.evaluate(self.root, tuple(args), 0, n)
+        return [(v, k) for v, c, k in merge([(v, 0, k) for v, c, k in groups])]
+
+    def evaluate(self, n, env, calls, count):
+        # A list of (value or Raised, calls, count) for count runs of n, with args env, that have made calls
+        # recursive calls so far
+        kind, f = self.plan[id(n)]
+
+        self.charge(1)
+
+        if kind == 'whole':
+            return [(call(f, env), calls, count)]
+        elif kind == 'if':
+            out = []
+            for v, c, k in self.evaluate(n.args[0], env, calls, count):
+                if isinstance(v, Raised):
+                    out.append((v, c, k))
+                else:
+                    out.extend(self.evaluate(n.args[1] if v else n.args[2], env, c, k))
+            return merge(out)
+
+        out = []
+        for vs, c, k in self.evaluate_args(n, env, calls, count):
+            if isinstance(vs, Raised):
+                out.append((vs, c, k))
+            elif kind == 'group':
+                out.append((call(f, env + vs), c, k))
+            elif kind == 'each':
+                self.charge(k)
+                out.extend([(call(f, env + vs), c, 1) for _ in xrange(k)])
+            elif kind == 'flip':
+                p = call(f, env + vs)
+                if isinstance(p, Raised):
+                    out.append((p, c, k))
+                    continue
+                p = p[0] if len(p) > 0 else 0.5
+                try:
+                    yes = int(numpy.random.binomial(k, p)) if 0.0 <= p <= 1.0 else (k if p > 1.0 else 0)
+                except TypeError: # as flip does, for whatever p is
+                    self.charge(k)
+                    out.extend([(call(flip_, (p,)), c, 1) for _ in xrange(k)])
+                    continue
+                out.append((True, c, yes))
+                out.append((False, c, k - yes))
+            elif kind == 'recurse':
+                newenv = call(f, env + vs)
+                if isinstance(newenv, Raised):
+                    out.append((newenv, c, k))
+                elif c + 1 > self.bound:
+                    out.append((Raised(RecursionDepthException()), c + 1, k))
+                else:
+                    out.extend(self.evaluate(self.root, newenv, c + 1, k))
+        return merge(out)
+
+    def charge(self, steps):
+        self.steps += steps
+        if self.max_steps is not None and self.steps > self.max_steps:
+            raise Unsupported("Too slow")
+
+    def evaluate_args(self, n, env, calls, count):
+        # A list of (the tuple of n's FunctionNode args' values or a Raised, calls, count), evaluating them in order
+        partial = [((), calls, count)]
+        for a in n.args or []:
+            if not isFunctionNode(a):
+                continue
+            new = []
+            for vs, c, k in partial:
+                if isinstance(vs, Raised):
+                    new.append((vs, c, k))
+                else:
+                    for v, c2, k2 in self.evaluate(a, env, c, k):
+                        new.append((v if isinstance(v, Raised) else vs + (v,), c2, k2))
+            partial = new
+        return partial
+
+def forward_sample(h, args, n, max_steps=None):
+    """
+        A list of (value, count) for what n runs of h's tree on args give, with a Raised for the runs that raise an
+        exception, or None if we can't run h's tree in groups (or it takes more than max_steps steps -- see
+        TreeSampler.run -- e.g. because the runs go so many different ways that it is no faster than calling h).
+    """
+    if any(callable(a) for a in args):
+        return None # functions might do anything
+    try:
+        return TreeSampler(h).run(args, n, max_steps=max_steps)
+    except (Unsupported, RuntimeError): # RuntimeError if the recursion is too deep
+        return None
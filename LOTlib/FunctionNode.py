@@ -25,6 +25,21 @@ def cleanFunctionNodeString(x):
     return s
 
 
+def cacheable_weight(f):
+    """Decorator for resampleProbability functions whose value at a node depends only on that node and what is
+    below it (not, e.g., on its parents). FunctionNodes cache the sums of these over their subtrees, so that
+    sample_subnode and sample_node_normalizer do not need to go through the whole tree. lambdaOne is cacheable.
+
+    NOTE: Use this on functions, not bound methods, since the caches keep a reference to it.
+    """
+    f.cacheable_weight = True
+    return f
+
+
+def is_cacheable_weight(f):
+    return f is lambdaOne or getattr(f, 'cacheable_weight', False)
+
+
 # ------------------------------------------------------------------------------------------------------------
 # Handle exceptions when sampling
 
@@ -56,16 +71,61 @@ class FunctionNode(object):
     * Each FunctionNode used to store the rule that generated it. This caused problems when loading a FunctionNode from
       a pickle file and trying to compute its probability under a new grammar. Now, matching to rules is done on the fly
       using get_rule_signature()
+    * To save memory, nodes have no __dict__; all of the attributes are slots, declared here for the subclasses too
+      (so that setto can change a node's class). Any other per-node information, like a resample_p, is an
+      annotation: pass it as a keyword to the constructor or set it with annotate(resample_p=0.0). Annotations
+      are read as attributes (node.resample_p), and are copied, pickled, and moved by setto along with the node.
 
     """
-    NoCopy = {'self', 'parent', 'returntype', 'name', 'args', 'parent'}
-
-    def __init__(self, parent, returntype, name, args):
-        self.__dict__.update(locals())
+    NodeSlots = ('parent', 'returntype', 'name', 'args', 'added_rule', 'bv_prefix',
+                 '_hash', '_free_bvs',    # the structural hash and the free bound variables below, cached by __hash__
+                 '_weight_fn', '_weight') # a cacheable_weight function and its sum over the subtree
+    __slots__ = NodeSlots + ('annotations',)
+
+    def __init__(self, parent, returntype, name, args, **annotations):
+        self.parent = parent
+        self.returntype = returntype
+        self.name = name
+        self.args = args
         self.added_rule = None
-        
+        self.bv_prefix = None
+        self._hash = None
+        self._free_bvs = None
+        self._weight_fn = None
+        self._weight = None
+        self.annotations = annotations if annotations else None
+
         assert self.name is None or isinstance(self.name, str)
 
+    def annotate(self, **kwargs):
+        """Store extra per-node information, e.g. fn.annotate(resample_p=0.0). See the class notes."""
+        if self.annotations is None:
+            self.annotations = kwargs
+        else:
+            self.annotations.update(kwargs)
+
+    def __getattr__(self, k):
+        # This is only called when k is not a slot or method, so look in the annotations
+        if k != 'annotations' and self.annotations is not None and k in self.annotations:
+            return self.annotations[k]
+        raise AttributeError("'%s' object has no attribute '%s'" % (type(self).__name__, k))
+
+    def __getstate__(self):
+        """Pickle the slots and annotations, but not the cached hash."""
+        state = dict(self.annotations) if self.annotations is not None else dict()
+        for k in FunctionNode.NodeSlots:
+            state[k] = getattr(self, k)
+        del state['_hash'], state['_free_bvs'], state['_weight_fn'], state['_weight']
+        return state
+
+    def __setstate__(self, state):
+        """Unpickle from __getstate__, or from the __dict__ of a FunctionNode pickled before we had slots."""
+        state = dict(state)
+        state.pop('self', None) # old __init__ stored this too
+        for k in FunctionNode.NodeSlots:
+            setattr(self, k, state.pop(k, None))
+        self.annotations = state if state else None
+
     def setto(self, q):
         """Makes all the parts the same as q, not copies.
 
@@ -73,7 +133,8 @@ class FunctionNode(object):
 
         """
         old_parent = self.parent        # preserve my parent
-        self.__dict__ = q.__dict__
+        for k in FunctionNode.__slots__:
+            setattr(self, k, getattr(q, k))
         self.__class__ = q.__class__    # to update in case q is a different subtype of FunctionNode.
                                         # NOTE: Setting __class__ is not a recommended thing to do.
         # and we must fix the kid refs. Everything else should be right.
@@ -81,6 +142,33 @@ class FunctionNode(object):
             a.parent = self
         self.parent = old_parent
 
+        # q's cached hash is still right for us, but not the ones above
+        if self.parent is not None:
+            self.parent.invalidate()
+
+    def invalidate(self):
+        """Clear the cached structure (hash and subtree weights) of this node and everything above it.
+
+        This must be called after modifying a node's args, name, or returntype in place (setto does it for you).
+        Caches are always filled from the bottom up, so we can stop at the first node above that has none.
+
+        """
+        self._clear_cache()
+
+        p = self.parent
+        while p is not None and (p._hash is not None or p._weight_fn is not None):
+            p._clear_cache()
+            p = p.parent
+
+    def _clear_cache(self):
+        self._hash, self._free_bvs = None, None
+        self._weight_fn, self._weight = None, None
+
+    def _copy_cache(self, fn):
+        # for __copy__: a copy has the same structure, so the same cache
+        fn._hash, fn._free_bvs = self._hash, self._free_bvs
+        fn._weight_fn, fn._weight = self._weight_fn, self._weight
+
     def get_rule_signature(self):
         """ The rule signature is used to pair up FunctionNodes with GrammarRules in computing log probability
             So it needs to be synced to GrammarRule.get_rule_signature and provide a unique identifier
@@ -104,10 +192,12 @@ class FunctionNode(object):
 
         """
         fn = FunctionNode(self.parent, self.returntype, self.name, None)
+        fn.added_rule = self.added_rule
+        self._copy_cache(fn)
 
-        # And then then copy the rest -- needed for if we add info to FunctionNodes, like a resample_p
-        for k in set(self.__dict__.keys()).difference(FunctionNode.NoCopy): # None of these!
-            fn.__dict__[k] = copy(self.__dict__[k])
+        # And then then copy the annotations, like a resample_p
+        if self.annotations is not None:
+            fn.annotations = dict((k, copy(v)) for k, v in self.annotations.iteritems())
 
         if (not shallow) and self.args is not None:
             fn.args = map(copy, self.args)
@@ -243,24 +333,51 @@ class FunctionNode(object):
         NOTE: We need to do thsi using fullstring instead of pystring in order to avoid the fact that pystring ignores
         returntypes and nodes whose name is ''
 
+        Since equal trees have equal hashes, we only compare them when the (cached) hashes match, and then we walk
+        both trees at once (see _same_structure) instead of building their strings.
+
         """
+        if self is other:
+            return True
+        elif isFunctionNode(other):
+            return hash(self) == hash(other) and _same_structure(self, other, 0, dict(), dict())
+
         return fullstring(self) == fullstring(other)
 
-    # TODO: overwrite these with something faster
-    # hash trees. This just converts to string -- maybe too slow?
     def __hash__(self):
-        # # An attempt to speed things up -- not so great!
-        # hsh = self.ruleid
-        # if self.args is not None:
-        #     for a in filter(isFunctionNode, self.args):
-        #         hsh = hsh ^ hash(a)
-        # return hsh
-        #
-        # # use a quicker string hash
-        # return hash(self.quickstring())
+        """A structural hash, computed bottom-up and cached on each node (see invalidate).
+
+        Like fullstring, this names bound variables by where their lambda is, so that (lambda (x) x) and
+        (lambda (y) y) hash the same; bound variables that are free in this subtree hash by their uuid.
+
+        """
+        if self._hash is None:
+            free = _NO_FREE_BVS
+            if self.args is None:
+                argh = None
+            else:
+                argh = []
+                for a in self.args:
+                    if isFunctionNode(a):
+                        argh.append(hash(a))
+                        if a._free_bvs:
+                            free = free | a._free_bvs
+                    else:
+                        argh.append(hash(a))
+                argh = tuple(argh)
+
+            if isinstance(self, BVAddFunctionNode):
+                free = free - {self.added_rule.name}
+                h = hash((self.name, self.returntype, self.added_rule.bv_prefix,
+                          _bound_hash(self.args[0], {self.added_rule.name: 0}, 1)))
+            else:
+                if isinstance(self, BVUseFunctionNode):
+                    free = free | {self.name}
+                h = hash((self.name, self.returntype, argh))
+
+            self._hash, self._free_bvs = h, free
 
-        # normal string hash -- faster?
-        return hash(str(self))
+        return self._hash
 
 
     def __cmp__(self, x):
@@ -403,19 +520,59 @@ class FunctionNode(object):
         Compute Z to be the sum of all subnodes' value from resampleProbability.
         * resampleProbability -- a function that gives the resample probability (NOT log prob.) of each node.
         NOTE: We allow resampleProbability to return a boolean, for 0/1 probability.
+        NOTE: If resampleProbability is a cacheable_weight, the sums are cached on each node
         """
-        return sum([ 1.0*resampleProbability(x) for x in self])
+        if is_cacheable_weight(resampleProbability):
+            return self._subtree_weight(resampleProbability)
+        else:
+            return sum([ 1.0*resampleProbability(x) for x in self])
+
+    def _subtree_weight(self, f):
+        """The sum of the cacheable_weight f over this subtree, cached here and below."""
+        if self._weight_fn is not f:
+            w = 1.0*f(self)
+            for a in self.argFunctionNodes():
+                w += a._subtree_weight(f)
+            self._weight_fn, self._weight = f, w
+
+        return self._weight
 
     def sample_subnode(self, resampleProbability=lambdaOne):
         """Sample a subnode at random.
 
         We return a sampled tree and the log probability of sampling it
 
+        If resampleProbability is a cacheable_weight, we walk down from the root using the cached subtree sums,
+        instead of going through the whole tree.
+
         """
         Z = self.sample_node_normalizer(resampleProbability=resampleProbability) # the total probability
         if not (Z > 0.0):
             raise NodeSamplingException
 
+        if is_cacheable_weight(resampleProbability):
+            r = random() * Z
+            x = self
+            while True:
+                w = 1.0*resampleProbability(x)
+                if r < w:
+                    break
+                r -= w
+
+                # the sums below x were cached by sample_node_normalizer, unless since then some were cached for
+                # another function (e.g. by calling it on a subtree), which _subtree_weight recomputes
+                kids = [(a, a._subtree_weight(resampleProbability)) for a in x.argFunctionNodes()]
+                kids = [(a, w) for a, w in kids if w > 0.0]
+                if len(kids) == 0:
+                    break # only from numerical error, if r falls at the very end of x's weight
+                for a, w in kids:
+                    if r < w:
+                        break
+                    r -= w
+                x = a # (on numerical error, this is the last kid)
+
+            return [x, log(1.0*resampleProbability(x)) - log(Z)]
+
         r = random() * Z # now select a random number (giving a random node)
         #
         # for t in self:
@@ -579,6 +736,7 @@ class FunctionNode(object):
 
         ret = self.__copy__(shallow=True)  # don't copy kids
         ret.args = newargs
+        ret.invalidate()
 
         return ret
 
@@ -609,8 +767,9 @@ class FunctionNode(object):
             if self.added_rule is not None:
                 remap[self.added_rule.name] = newbv
                 self.added_rule.name = newbv
-        elif isinstance(self, BVUseFunctionNode):
-            self.name = remap.get(self.name, self.name)
+        elif isinstance(self, BVUseFunctionNode) and self.name in remap:
+            self.name = remap[self.name]
+            self.invalidate()
 
         for a in self.argFunctionNodes():
             a.uniquify_bv(remap)
@@ -657,6 +816,7 @@ class BVAddFunctionNode(FunctionNode):
 
     This should almost never need to be called, as it is defaultly handled by LOTlib.Grammar
     """
+    __slots__ = () # see FunctionNode
     def __init__(self, parent, returntype, name, args,  added_rule=None):
         FunctionNode.__init__(self, parent, returntype, name, args)
         self.added_rule = added_rule
@@ -684,6 +844,9 @@ class BVAddFunctionNode(FunctionNode):
         """
         fn = BVAddFunctionNode(self.parent, self.returntype, self.name, None,
             added_rule=copy(self.added_rule)) ## TODO: We should not need to copy added_rule
+        self._copy_cache(fn)
+        if self.annotations is not None:
+            fn.annotations = dict((k, copy(v)) for k, v in self.annotations.iteritems())
 
         if (not shallow) and self.args is not None:
             fn.args = map(copy, self.args)
@@ -733,6 +896,7 @@ class BVUseFunctionNode(FunctionNode):
     """
     A FunctionNode that uses a bound variable. As in, the use of "x" in lambda x: x+1
     """
+    __slots__ = () # see FunctionNode
     def __init__(self, parent, returntype, name, args, bv_prefix=None):
         FunctionNode.__init__(self, parent, returntype, name, args)
         self.bv_prefix = bv_prefix
@@ -768,6 +932,9 @@ class BVUseFunctionNode(FunctionNode):
 
         """
         fn = BVUseFunctionNode(self.parent, self.returntype, self.name, None, bv_prefix=self.bv_prefix)
+        self._copy_cache(fn)
+        if self.annotations is not None:
+            fn.annotations = dict((k, copy(v)) for k, v in self.annotations.iteritems())
         
         if (not shallow) and self.args is not None:
             fn.args = map(copy, self.args)
@@ -789,6 +956,73 @@ class BVUseFunctionNode(FunctionNode):
 # ------------------------------------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------------------------------------
 
+# ------------------------------------------------------------------------------------------------------------
+# Structural hashing
+
+_NO_FREE_BVS = frozenset()
+
+def _same_structure(x, y, d, x_names, y_names):
+    """Is fullstring(x, d) == fullstring(y, d), where x_names and y_names name the bound variables of the lambdas
+    above each? This walks both trees at once, and skips subtrees with no free bound variables that are the same
+    node, or whose (cached) hashes differ.
+    """
+    if not (isFunctionNode(x) and isFunctionNode(y)):
+        return not isFunctionNode(x) and not isFunctionNode(y) and x == y
+
+    if not x._free_bvs and not y._free_bvs: # hash(x) and hash(y) filled these in
+        if x is y:
+            return True
+        elif hash(x) != hash(y):
+            return False
+
+    if x.returntype != y.returntype or isinstance(x, BVAddFunctionNode) != isinstance(y, BVAddFunctionNode):
+        return False
+
+    if isinstance(x, BVAddFunctionNode):
+        bvn = x.added_rule.bv_prefix+str(d)
+        if x.name != y.name or y.added_rule.bv_prefix+str(d) != bvn:
+            return False
+        x_names[x.added_rule.name], y_names[y.added_rule.name] = bvn, bvn
+        ret = _same_structure(x.args[0], y.args[0], d+1, x_names, y_names)
+        del x_names[x.added_rule.name], y_names[y.added_rule.name]
+        return ret
+
+    # bound variables are named by where their lambda is, as in fullstring
+    xn = x_names.get(x.name, x.name) if isinstance(x, BVUseFunctionNode) else x.name
+    yn = y_names.get(y.name, y.name) if isinstance(y, BVUseFunctionNode) else y.name
+    if xn != yn:
+        return False
+
+    if x.args is None or y.args is None:
+        return x.args is None and y.args is None
+    return len(x.args) == len(y.args) and \
+        all(_same_structure(a, b, d+1, x_names, y_names) for a, b in zip(x.args, y.args))
+
+def _bound_hash(x, bound, d):
+    """The hash of x, where the bound variables in *bound* (a dict from uuids to the depth of their lambda) are
+    replaced by how far up their lambda is. This is how FunctionNode.__hash__ hashes the body of a lambda.
+
+    We only descend into subtrees where one of these is free; elsewhere the cached hash is already right.
+    """
+    if not isFunctionNode(x):
+        return hash(x)
+
+    h = hash(x) # fills in x._free_bvs
+    if x._free_bvs.isdisjoint(bound):
+        return h
+
+    if isinstance(x, BVAddFunctionNode):
+        bound = dict(bound)
+        bound[x.added_rule.name] = d
+        return hash((x.name, x.returntype, x.added_rule.bv_prefix, _bound_hash(x.args[0], bound, d+1)))
+    else:
+        name = x.name
+        if isinstance(x, BVUseFunctionNode) and x.name in bound:
+            name = ('<BV>', d - bound[x.name])
+        argh = None if x.args is None else tuple(_bound_hash(a, bound, d+1) for a in x.args)
+        return hash((name, x.returntype, argh))
+
+
 import re
 percent_s_regex = re.compile(r"%s")
 bv_regex = re.compile(r"\<BV\>")
@@ -11,14 +11,25 @@ from LOTlib.Miscellaneous import *
 from LOTlib.GrammarRule import GrammarRule, BVAddGrammarRule
 from LOTlib.BVRuleContextManager import BVRuleContextManager
 from LOTlib.FunctionNode import FunctionNode
+from LOTlib.PersistentFunctionNode import PersistentFunctionNode
+from LOTlib.RuleCounts import RuleCounts
 
 class Grammar:
     """
     A PCFG-ish class that can handle rules that introduce bound variables
+
+    Note
+    ----
+    The grammar caches, for each nonterminal, the cumulative probabilities of its rules and the log of their
+    sum. add_rule, renormalize, and BVRuleContextManager keep these up to date, but if you change a rule's p
+    directly, you must call invalidate_normalizers() afterwards.
     """
     def __init__(self, BV_P=10.0, start='START'):
         self.__dict__.update(locals())
         self.rules = defaultdict(list)  # A dict from nonterminals to lists of GrammarRules.
+        self.rules_by_signature = defaultdict(list)  # A dict from rule signatures to lists of GrammarRules, for get_matching_rule
+        self.cumulative_probabilities = dict()  # A dict from nonterminals to the running sums of their rules' p
+        self.log_normalizers = dict()  # A dict from nonterminals to the log of the sum of their rules' p
         self.rule_count = 0
         self.bv_count = 0   # How many rules in the grammar introduce bound variables?
 
@@ -59,19 +70,62 @@ class Grammar:
 
     def get_matching_rule(self, t):
         """
-        Get the rule matching t's signature. Note: We could probably speed this up with a hash table if need be.
+        Get the rule matching t's signature. This is a lookup in self.rules_by_signature, which is kept in sync
+        by add_rule, add_bv_rule, and remove_bv_rule.
         """
-        rules = self.get_rules(t.returntype)
-        matching_rules = [r for r in rules if (r.get_rule_signature() == t.get_rule_signature())]
+        matching_rules = self.rules_by_signature.get(t.get_rule_signature(), ())
         assert len(matching_rules) == 1, \
             "Grammar Error: " + str(len(matching_rules)) + " matching rules for this FunctionNode! %s %s" % (t.get_rule_signature(), str(t))
         return matching_rules[0]
 
+    # --------------------------------------------------------------------------------------------------------
+    # Cached normalizers
+    # --------------------------------------------------------------------------------------------------------
+
+    def get_cumulative_probabilities(self, nt):
+        """
+        The running sums of p over self.rules[nt], in order. The last entry is the normalizer.
+        """
+        c = self.cumulative_probabilities.get(nt)
+        if c is None:
+            c, z = [], 0.0
+            for r in self.rules[nt]:
+                z += r.p
+                c.append(z)
+            self.cumulative_probabilities[nt] = c
+        return c
+
+    def log_normalizer(self, nt):
+        """
+        The log of the sum of p over the rules for nt (including any bound variable rules currently added)
+        """
+        z = self.log_normalizers.get(nt)
+        if z is None:
+            z = log(self.get_cumulative_probabilities(nt)[-1])
+            self.log_normalizers[nt] = z
+        return z
+
+    def invalidate_normalizers(self, nt=None):
+        """
+        Forget the cached normalizers for nt, or for every nonterminal if nt is None. Call this if you change
+        a rule's p by hand.
+        """
+        if nt is None:
+            self.cumulative_probabilities = dict()
+            self.log_normalizers = dict()
+        else:
+            self.cumulative_probabilities.pop(nt, None)
+            self.log_normalizers.pop(nt, None)
+
+    # --------------------------------------------------------------------------------------------------------
+    # Probabilities
+    # --------------------------------------------------------------------------------------------------------
+
     def single_probability(self, t):
         # in this tree, in its context (recursing up), what is the probability of this single expansion?
 
         with BVRuleContextManager(self, t, recurse_up=True):
-            z = log(sum([ r.p for r in self.get_rules(t.returntype) ]))
+            z = self.log_normalizer(t.returntype)
             r = self.get_matching_rule(t)
             return log(r.p)-z
 
@@ -81,9 +135,9 @@ class Grammar:
 
         This is overall about half as fast, but it means we don't have to store generation_probability
         """
-        assert isinstance(t, FunctionNode)
+        assert isinstance(t, (FunctionNode, PersistentFunctionNode))
 
-        z = log(sum([ r.p for r in self.get_rules(t.returntype) ]))
+        z = self.log_normalizer(t.returntype)
 
         # Find the one that matches. While it may seem like we should store this, that is hard to make work
         # with multiple grammar objects across loading/saving, because the objects will change. This way,
@@ -100,6 +154,21 @@ class Grammar:
 
         return lp
 
+    def rule_counts(self, trees):
+        """
+        Count the rules used by each of trees (FunctionNodes, or hypotheses whose value is one), for
+        batch_log_probability. The counts don't change with the rules' p, so they can be reused after changing them.
+        """
+        return RuleCounts(self, trees)
+
+    def batch_log_probability(self, trees):
+        """
+        The log_probability of each of trees (or of the trees in a RuleCounts) as a numpy array, computed all at
+        once from their rule counts with the rules' current p.
+        """
+        counts = trees if isinstance(trees, RuleCounts) else self.rule_counts(trees)
+        return counts.log_probability(self)
+
     def add_rule(self, nt, name, to, p, bv_type=None, bv_args=None, bv_prefix='y', bv_p=None):
         """Adds a rule and returns the added rule.
 
@@ -120,7 +189,46 @@ class Grammar:
             newrule = GrammarRule(nt, name, to, p=p)
 
         self.rules[nt].append(newrule)
+        self.rules_by_signature[newrule.get_rule_signature()].append(newrule)
+        self.invalidate_normalizers(nt)
         return newrule
+
+    def add_bv_rule(self, r):
+        """
+        Add a rule introduced by a bound variable. This is called by BVRuleContextManager and, unlike add_rule,
+        takes an already constructed rule.
+        """
+        self.rules[r.nt].append(r)
+        self.rules_by_signature[r.get_rule_signature()].append(r)
+
+        # Extend the cumulative probabilities in place, rather than recomputing them
+        c = self.cumulative_probabilities.get(r.nt)
+        if c is not None:
+            c.append(c[-1] + r.p if len(c) > 0 else r.p)
+        self.log_normalizers.pop(r.nt, None)
+
+    def remove_bv_rule(self, r):
+        """
+        Remove a rule added via add_bv_rule. Since each bound variable has a unique name, we delete empty
+        entries of rules_by_signature so that it does not grow without bound.
+        """
+        rules = self.rules[r.nt]
+        was_last = (rules[-1] is r)
+        rules.remove(r)
+
+        # BVRuleContextManager (and BVPathContextManager) remove rules last in, first out, so this is typically
+        # just a pop, which restores the previous sums exactly (without any floating point drift)
+        c = self.cumulative_probabilities.get(r.nt)
+        if c is not None and was_last:
+            c.pop()
+        else:
+            self.cumulative_probabilities.pop(r.nt, None)
+        self.log_normalizers.pop(r.nt, None)
+
+        sig = r.get_rule_signature()
+        self.rules_by_signature[sig].remove(r)
+        if len(self.rules_by_signature[sig]) == 0:
+            del self.rules_by_signature[sig]
     
     def is_terminal_rule(self, r):
         """
@@ -159,8 +267,8 @@ class Grammar:
             rules = self.get_rules(x)
             assert len(rules) > 0, "*** No rules in x=%s"%x
 
-            # sample the rule
-            r = weighted_sample(rules, probs=lambda x: x.p, log=False)
+            # sample the rule, via binary search on the cached cumulative probabilities
+            r = weighted_sample(rules, cumulative=self.get_cumulative_probabilities(x))
 
             # Make a stub for this functionNode 
             fn = r.make_FunctionNodeStub(self, None)
@@ -323,3 +431,5 @@ class Grammar:
             for r in self.get_rules(nt):
                 r.p = r.p / z
 
+        self.invalidate_normalizers()
+
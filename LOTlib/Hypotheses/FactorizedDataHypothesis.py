@@ -11,7 +11,8 @@ from LOTlib.Hypotheses.Likelihoods.StochasticFunctionLikelihood import Stochasti
 from LOTlib.Hypotheses.RecursiveLOTHypothesis import RecursiveLOTHypothesis, RecursionDepthException
 from LOTlib.Hypotheses.Proposers.RegenerationProposer import RegenerationProposer
 from LOTlib.Hypotheses.Proposers.InsertDeleteProposer import InsertDeleteProposer
-from LOTlib.Evaluation.EvaluationException import TooBigException
+from LOTlib.Eval import TooBigException
+from LOTlib.ForwardSampler import merge
 
 
 class InnerHypothesis(StochasticFunctionLikelihood, RecursiveLOTHypothesis, RegenerationProposer, InsertDeleteProposer):
@@ -85,6 +86,31 @@ class FactorizedDataHypothesis(SimpleLexicon):
 
         return v # return the last one
 
+    def sample_outcomes(self, args, n):
+        """
+            A list of (value, count) for what n calls of self() return, running each word once on each distinct
+            list of args the previous ones gave (see LOTHypothesis.sample_outcomes).
+        """
+        assert len(args) == 0
+        groups = [(((), ''), 0, n)] # ((the args so far, what we'd return), 0, how many runs got there), for merge
+        for w in xrange(self.N):
+            f = self.get_word(w)
+            new = []
+            for (theargs, v), _, k in groups:
+                try:
+                    outcomes = f.sample_outcomes(theargs, k)
+                except TooBigException: # as in __call__, but for each run
+                    outcomes = []
+                    for _ in xrange(k):
+                        try:
+                            outcomes.append((f(*theargs), 1))
+                        except TooBigException:
+                            outcomes.append((TooBigException, 1))
+                new.extend([((theargs + ('',), v) if x is TooBigException else (theargs + (x,), x), 0, c)
+                            for x, c in outcomes])
+            groups = merge(new)
+        return [(v, k) for (theargs, v), _, k in groups]
+
     def make_hypothesis(self, **kwargs):
         raise NotImplementedError
 
@@ -74,6 +74,13 @@ class FunctionHypothesis(Hypothesis):
         else:
             self.fvalue =  self.compile_function() # now that the value is set
 
+    def batch_responses(self, data):
+        """
+                Our responses to all of a ColumnarFunctionData's inputs at once (as a numpy array), for batch likelihoods.
+                Returns None if we can only be called on one input at a time, which is all we know how to do here.
+        """
+        return None
+
     def force_function(self, f):
         """
         Sets the function to f, ignoring value.
@@ -103,4 +110,4 @@ class FunctionHypothesis(Hypothesis):
                 sets the state of the hypothesis (when we unpickle)
         """
         self.__dict__.update(state)
-        self.set_value(self.value) # just re-set the value so that we re-compute the function
+        self.set_value(self.value) # just re-set the value so that we re-compute the function (from the cache, if we can)
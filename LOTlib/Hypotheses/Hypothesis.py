@@ -1,3 +1,4 @@
+from LOTlib.DataAndObjects import ColumnarFunctionData
 from LOTlib.Miscellaneous import Infinity, attrmem
 from copy import copy, deepcopy
 
@@ -16,9 +17,17 @@ class Hypothesis(object):
         value: The default value for the hypothesis.
         prior_temperature: Temperature used when running compute_prior.
         likelihood_temperature: Temperature used when running compute_likelihood.
+        likelihood_cache: If not None, compute_likelihood goes through this (see
+          Likelihoods.BehavioralLikelihoodCache).
 
     """
-    def __init__(self, value=None, prior_temperature=1.0, likelihood_temperature=1.0, **kwargs):
+
+    # An upper bound on every datum's compute_single_likelihood, so that compute_likelihood can stop once the
+    # likelihood can't reach a shortcut. 0.0 is right for probabilities of discrete outputs; likelihoods that can
+    # be positive (densities, like GaussianLikelihood) must give a real bound, or None to never stop early.
+    max_single_likelihood = 0.0
+
+    def __init__(self, value=None, prior_temperature=1.0, likelihood_temperature=1.0, likelihood_cache=None, **kwargs):
         self.__dict__.update(kwargs)
 
         self.set_value(value)
@@ -27,6 +36,7 @@ class Hypothesis(object):
         self.prior, self.likelihood, self.posterior_score = [-Infinity, -Infinity, -Infinity]
         self.prior_temperature = prior_temperature
         self.likelihood_temperature = likelihood_temperature
+        self.likelihood_cache = likelihood_cache
         self.stored_likelihood = None
 
 
@@ -83,19 +93,36 @@ class Hypothesis(object):
         This is typically NOT subclassed, as compute_single_likelihood is what subclasses should implement.
 
         Shortcut here allows us to stop evaluation if the likelihood falls below the shortcut value (taking into account temperature)
+        -- that is, once even max_single_likelihood on each remaining datum would leave it below.
 
         Versions using decayed likelihood can be found in Hypothesis.DecayedLikelihoodHypothesis.
         """
+        if self.likelihood_cache is not None:
+            return self.likelihood_cache.compute_likelihood(self, data, shortcut=shortcut, **kwargs)
 
+        if isinstance(data, ColumnarFunctionData):
+            ll = self.compute_batch_likelihood(data, **kwargs) / self.likelihood_temperature
+            return ll if ll >= shortcut else -Infinity
+
+        bound = self.max_single_likelihood if shortcut > -Infinity else None
         ll = 0.0
-        for datum in data:
+        for i, datum in enumerate(data):
             ll += self.compute_single_likelihood(datum, **kwargs) / self.likelihood_temperature
-            if ll < shortcut:
+            if bound is not None and ll + (bound * (len(data)-i-1) / self.likelihood_temperature if bound else 0.0) < shortcut:
                 # print "** Shortcut", self
                 return -Infinity
 
         return ll
 
+    def compute_batch_likelihood(self, data, **kwargs):
+        """Compute the summed likelihood of a ColumnarFunctionData (not taking into account likelihood_temperature).
+
+        Likelihoods (e.g. BinaryLikelihood) override this to score all the data at once; this default just adds up
+        compute_single_likelihood.
+
+        """
+        return sum([self.compute_single_likelihood(datum, **kwargs) for datum in data])
+
     # ========================================================================================================
     #  Methods for accessing likelihoods etc. on a big arrays of data
 
@@ -3,6 +3,13 @@ from LOTlib.Hypotheses.FunctionHypothesis import FunctionHypothesis
 from LOTlib.Hypotheses.Proposers.RegenerationProposer import RegenerationProposer
 from LOTlib.Miscellaneous import Infinity, raise_exception, attrmem
 from LOTlib.Primitives import *
+from LOTlib.Primitives.NumpyArithmetic import namespace as vectorized_namespace, vectorizable, vectorized_code, \
+    NotVectorizable
+from LOTlib.FunctionNode import pystring, isFunctionNode
+from LOTlib.Simplify import simplify
+from LOTlib.ForwardSampler import forward_sample, STEP_COST as FORWARD_STEP_COST
+from LOTlib.SubtreeCache import Raised
+import numpy
 
 class LOTHypothesis(FunctionHypothesis, RegenerationProposer):
     """A FunctionHypothesis built from a grammar.
@@ -17,6 +24,15 @@ class LOTHypothesis(FunctionHypothesis, RegenerationProposer):
         The maximum amount of nodes that the grammar can have
     args : list
         The arguments to the function.
+    subtree_cache : LOTlib.SubtreeCache.SubtreeCache
+        If not None, batch_responses evaluates pure trees through this, storing each subtree's responses so that
+        other hypotheses (e.g. our proposals) with that subtree don't evaluate it again.
+    simplify : bool
+        If True, compile_function folds constants and applies some identities to (a copy of) the value first, so
+        they aren't recomputed on every call (see LOTlib.Simplify).
+    budget : LOTlib.Eval.EvaluationBudget
+        If not None, calls that use too many primitive operations or take too long raise TooBigException (and give a
+        likelihood of -inf), and we keep what our calls cost (see get_evaluation_cost).
 
     Attributes
     ----------
@@ -26,7 +42,8 @@ class LOTHypothesis(FunctionHypothesis, RegenerationProposer):
 
     """
 
-    def __init__(self, grammar=None, value=None, f=None, maxnodes=25, args=['x'], **kwargs):
+    def __init__(self, grammar=None, value=None, f=None, maxnodes=25, args=['x'], subtree_cache=None, budget=None,
+                 simplify=False, **kwargs):
 
         # Save all of our keywords
         self.__dict__.update(locals())
@@ -38,8 +55,22 @@ class LOTHypothesis(FunctionHypothesis, RegenerationProposer):
 
         self.likelihood = 0.0
         self.rules_vector = None
+        self.tree_statistics = None # (value, log probability, node count) -- see get_tree_statistics
+        self.vectorized_fvalue = None # (value, function) -- see get_vectorized_function
+        self.evaluation_cost = None # [value, calls, ops, seconds] -- see get_evaluation_cost
+        self.forward_sampling = None # (value, whether ForwardSampler runs it faster) -- see sample_outcomes
+
+    def plain_function(self):
+        """Is our function just our value's python string, as a lambda of self.args (as FunctionHypothesis.__str__
+        gives)? Then simplify, a subtree_cache, and forward sampling can work from self.value directly;
+        subclasses that change __str__ must eval str(self) instead.
+        """
+        return self.args is not None and type(self).__str__.im_func is FunctionHypothesis.__str__.im_func
 
     def __call__(self, *args):
+        if self.budget is not None and self.budget.depth == 0:
+            return self.call_within_budget(*args)
+
         # NOTE: This no longer catches all exceptions.
         try:
             return FunctionHypothesis.__call__(self, *args)
@@ -50,35 +81,202 @@ class LOTHypothesis(FunctionHypothesis, RegenerationProposer):
             print "NameError in function call: ", e, " ; ", str(self), args
             raise NameError
 
+    def call_within_budget(self, *args):
+        """Call, counting what we use against self.budget, and add it to our evaluation cost."""
+        aborted = False
+        self.budget.start()
+        try:
+            return FunctionHypothesis.__call__(self, *args)
+        except TooBigException:
+            aborted = True
+            raise
+        finally:
+            ops, t = self.budget.stop(self, aborted=aborted)
+            c = self.evaluation_cost
+            if c is None or c[0] is not self.value:
+                c = self.evaluation_cost = [self.value, 0, 0, 0.0]
+            c[1] += 1
+            c[2] += ops
+            c[3] += t
+
+    def sample_outcomes(self, args, n):
+        """A list of (value, count) for what n calls of self(*args) return. When LOTlib.ForwardSampler can run our
+        value in groups, we run them all at once, unless that takes more steps than calling would take the time for
+        (see LOTlib.ForwardSampler.STEP_COST). If it does (or can't), we call instead, and don't try again for this
+        value. We count steps rather than timing them, so that seeded runs are repeatable.
+        """
+        s = self.forward_sampling
+        if self.budget is not None or not self.plain_function() or not isFunctionNode(self.value) or \
+                self.value.count_nodes() > self.maxnodes or (s is not None and s[0] is self.value and not s[1]):
+            return [(self(*args), 1) for _ in xrange(n)]
+
+        groups = forward_sample(self, args, n, max_steps=n * self.value.count_nodes() // FORWARD_STEP_COST)
+        self.forward_sampling = (self.value, groups is not None)
+
+        if groups is None:
+            return [(self(*args), 1) for _ in xrange(n)]
+
+        outcomes = []
+        for v, c in groups:
+            if isinstance(v, Raised): # do what __call__ does with it
+                v = self.call_raising(v.exception, args)
+            outcomes.append((v, c))
+        return outcomes
+
+    def call_raising(self, e, args):
+        """What self(*args) gives (or raises) when evaluating our value raises the exception e."""
+        f = self.fvalue
+        self.fvalue = lambda *a: raise_exception(e)
+        try:
+            return self(*args)
+        finally:
+            self.fvalue = f
+
+    def get_evaluation_cost(self):
+        """Return how many times our current value has been called within our budget, and the total primitive
+        operations and seconds those took.
+        """
+        c = self.evaluation_cost
+        if c is None or c[0] is not self.value:
+            return 0, 0, 0.0
+        return c[1], c[2], c[3]
+
     def type(self):
         return self.value.type()
 
     def compile_function(self):
-        """Called in set_value to compile into a function."""
+        """Called in set_value to compile into a function.
+
+        Functions are looked up by str(self) in LOTlib.Eval.compiled_function_cache, so we only eval each
+        expression once (including when unpickling, since FunctionHypothesis.__setstate__ calls set_value).
+        With a budget, the function calls the budget's counting primitives, and is cached there instead.
+        With simplify, we compile a simplified copy of the value instead (see LOTlib.Simplify), and keep how many
+        nodes that removed in self.simplified_nodes.
+
+        """
+        self.simplified_nodes = 0
+
         if self.value.count_nodes() > self.maxnodes:
             return lambda *args: raise_exception(TooBigException)
         else:
+            value, s = self.value, None
+            if self.simplify and self.plain_function():
+                value, self.simplified_nodes = simplify(self.value, self.args)
+                s = 'lambda %s: %s' % (','.join(self.args), pystring(value))
+
             try:
-                return eval(str(self)) # evaluate_expression(str(self))
+                if s is None:
+                    s = str(self)
+                if self.budget is not None:
+                    return self.budget.compile(s, globals())
+
+                f = compiled_function_cache.get(s)
+                if f is None:
+                    f = eval(s) # evaluate_expression(str(self))
+                    compiled_function_cache.add(s, f)
+                return f
             except Exception as e:
                 print "# Warning: failed to execute evaluate_expression on " + str(self)
                 print "# ", e
                 return lambda *args: raise_exception(EvaluationException)
 
+    def get_vectorized_function(self):
+        """Return our function compiled with numpy primitives (see LOTlib.Primitives.NumpyArithmetic), which takes
+        (and returns) whole arrays, or None if some part of self.value has no numpy version. This is kept for each
+        value in self.vectorized_fvalue.
+        """
+        v = self.vectorized_fvalue
+        if v is None or v[0] is not self.value:
+            f = None
+            if self.args is not None and self.value.count_nodes() <= self.maxnodes and \
+                    vectorizable(self.value, self.args):
+                f = eval(vectorized_code('lambda %s: %s' % (','.join(self.args), pystring(self.value))),
+                         vectorized_namespace())
+            v = self.vectorized_fvalue = (self.value, f)
+        return v[1]
+
+    def batch_responses(self, data, *extra):
+        """Our responses to a ColumnarFunctionData's inputs, from one call to get_vectorized_function (with extra
+        args after the input columns) or else from our subtree_cache, or None if we can't do either.
+        """
+        f = self.get_vectorized_function()
+        if f is not None and data.input_columns is not None:
+            try:
+                with numpy.errstate(all='ignore'):
+                    r = numpy.asarray(f(*(data.input_columns + list(extra))))
+                return r if r.shape == (len(data),) else numpy.repeat(r, len(data)) # constants give scalars
+            except NotVectorizable:
+                pass # the elements can't all agree with calling us on them, so call us instead
+
+        if self.subtree_cache is not None and self.budget is None and not extra and self.plain_function() and \
+                (self.get_tree_statistics()[1] if self.grammar is not None else self.value.count_nodes()) <= self.maxnodes:
+            # this is None if we raise on some input, so that the loop raises it
+            return self.subtree_cache.responses(self.value, self.args, data.inputs)
+
+        return None
+
+    def __getstate__(self):
+        dd = FunctionHypothesis.__getstate__(self)
+        dd['vectorized_fvalue'] = None
+        return dd
+
     def compute_single_likelihood(self, datum):
         raise NotImplementedError
 
+    @attrmem('likelihood')
+    def compute_likelihood(self, data, **kwargs):
+        """As Hypothesis.compute_likelihood, except that with a budget, going over it makes the likelihood -inf."""
+        try:
+            return FunctionHypothesis.compute_likelihood(self, data, **kwargs)
+        except TooBigException:
+            if self.budget is None:
+                raise
+            return -Infinity
+
     # --------------------------------------------------------------------------------------------------------
     # Compute prior
 
+    def get_tree_statistics(self):
+        """Return the grammar log probability (without prior_temperature) and the node count of self.value.
+
+        These are stored in self.tree_statistics along with the value they were computed for, so a copy with a
+        new value recomputes them. RegenerationProposer sets them on its proposals from the changed subtree.
+        The log probability is None if the tree has more than maxnodes nodes, since then we never need it.
+
+        """
+        s = self.tree_statistics
+        if s is None or s[0] is not self.value:
+            nodes = self.value.count_subnodes()
+            lp = self.grammar.log_probability(self.value) if nodes <= self.maxnodes else None
+            s = (self.value, lp, nodes)
+            self.tree_statistics = s
+        return s[1], s[2]
+
     @attrmem('prior')
     def compute_prior(self):
         """Compute the log of the prior probability.
 
         """
         # Compute this hypothesis prior
-        if self.value.count_subnodes() > self.maxnodes:
+        lp, nodes = self.get_tree_statistics()
+        if nodes > self.maxnodes:
             return -Infinity
         else:
             # Compute prior with either RR or not.
-            return self.grammar.log_probability(self.value) / self.prior_temperature
+            return lp / self.prior_temperature
+
+    @classmethod
+    def compute_batch_prior(cls, hypotheses, counts=None):
+        """The priors of hypotheses (which share a grammar), as compute_prior gives them, as a numpy array computed
+        all at once from their rule counts. Give counts (from grammar.rule_counts(hypotheses)) to reuse them, e.g.
+        after changing the grammar's rule probabilities. This doesn't set each hypothesis's prior.
+
+        """
+        grammar = hypotheses[0].grammar
+        if counts is None:
+            counts = grammar.rule_counts(hypotheses)
+        assert len(counts) == len(hypotheses), "*** counts must be for these hypotheses"
+
+        maxnodes = numpy.array([h.maxnodes for h in hypotheses])
+        temperatures = numpy.array([h.prior_temperature for h in hypotheses], dtype=float)
+        return numpy.where(counts.nodes > maxnodes, -Infinity, counts.log_probability(grammar) / temperatures)
@@ -0,0 +1,120 @@
+from collections import OrderedDict
+from random import sample
+
+from LOTlib.Miscellaneous import Infinity
+
+def respond_to_input(h, datum):
+    """The default response of h to a datum: what it returns on FunctionData.input."""
+    return h(*datum.input)
+
+def hashable(x):
+    """Make x into something we can hash, e.g. for sets or lists that hypotheses return."""
+    try:
+        hash(x)
+        return x
+    except TypeError:
+        if isinstance(x, (set, frozenset)):
+            return frozenset(map(hashable, x))
+        elif isinstance(x, dict):
+            return frozenset((hashable(k), hashable(v)) for k, v in x.iteritems())
+        else:
+            return tuple(map(hashable, x))
+
+class BehavioralLikelihoodCache(object):
+    """
+        A likelihood cache shared by hypotheses that compute the same thing on the data. Hypotheses are keyed by
+        their responses to a few "probe" data points, so that, e.g., and_(x, True) and x share an entry. To use
+        one, give likelihood_cache=BehavioralLikelihoodCache() to a hypothesis; its copies and proposals share it.
+
+        This is only right when a hypothesis's likelihood depends only on its responses to the data (and not, e.g.,
+        on a noise parameter that differs between hypotheses), and the probes tell apart most that differ. To catch
+        the ones they don't, on each hit we recompute nverify random data points' likelihoods and check them against
+        the stored ones. If they differ, we compute the whole likelihood (and count a mismatch).
+
+        The cache is for one data set at a time; a call with different data clears it.
+
+        nprobes -- how many data points to key on (spread evenly over the data)
+        maxsize -- how many entries to keep (the least recently used are dropped)
+        nverify -- how many data points to check on each hit
+        respond -- respond(h, datum) gives h's response to datum (by default, h(*datum.input))
+
+        NOTE: Entries store untempered likelihoods, so hypotheses with different likelihood_temperatures can share
+              a cache. A cache pickles without its entries.
+    """
+
+    def __init__(self, nprobes=10, maxsize=100000, nverify=1, respond=respond_to_input):
+        self.nprobes = nprobes
+        self.maxsize = maxsize
+        self.nverify = nverify
+        self.respond = respond
+        self.clear()
+
+    def clear(self):
+        self.data, self.probes = None, None
+        self.entries = OrderedDict() # behavior -> (per-datum likelihoods, their sum), least recently used first
+        self.hits, self.misses, self.mismatches = 0, 0, 0
+
+    def __getstate__(self):
+        return (self.nprobes, self.maxsize, self.nverify, self.respond)
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __str__(self):
+        return "<BehavioralLikelihoodCache: %i entries, %i hits, %i misses, %i mismatches>" % \
+               (len(self), self.hits, self.misses, self.mismatches)
+
+    def set_data(self, data):
+        self.entries.clear()
+        self.data = data
+        n = min(self.nprobes, len(data))
+        self.probes = [(i * len(data)) // n for i in xrange(n)]
+
+    def behavior(self, h):
+        """The key for h: its responses to the probes (or the type of exception it raises)."""
+        out = []
+        for i in self.probes:
+            try:
+                out.append(hashable(self.respond(h, self.data[i])))
+            except Exception as e:
+                out.append(type(e))
+        return tuple(out)
+
+    def compute_likelihood(self, h, data, shortcut=-Infinity, **kwargs):
+        """Return h's likelihood of data (taking into account likelihood_temperature), as Hypothesis.compute_likelihood."""
+        if data is not self.data:
+            self.set_data(data)
+
+        key = self.behavior(h)
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.entries[key] = entry # now the most recent
+
+            lls, total = entry
+            if all(h.compute_single_likelihood(data[i], **kwargs) == lls[i]
+                   for i in sample(xrange(len(data)), min(self.nverify, len(data)))):
+                self.hits += 1
+                ll = total / h.likelihood_temperature
+                return ll if ll >= shortcut else -Infinity
+
+            self.mismatches += 1
+        else:
+            self.misses += 1
+
+        bound = h.max_single_likelihood if shortcut > -Infinity else None
+        lls, ll = [], 0.0
+        for i, datum in enumerate(data):
+            lls.append(h.compute_single_likelihood(datum, **kwargs))
+            ll += lls[-1] / h.likelihood_temperature
+            if bound is not None and ll + (bound * (len(data)-i-1) / h.likelihood_temperature if bound else 0.0) < shortcut:
+                return -Infinity
+
+        if entry is None and self.maxsize > 0:
+            self.entries[key] = (lls, sum(lls))
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+        return ll
@@ -1,4 +1,4 @@
-
+import numpy
 from math import log
 from LOTlib.Eval import RecursionDepthException
 from LOTlib.Miscellaneous import Infinity
@@ -9,4 +9,27 @@ class BinaryLikelihood(object):
         try:
             return log(datum.alpha * (self(*datum.input) == datum.output) + (1.0-datum.alpha) / 2.0)
         except RecursionDepthException as e: # we get this from recursing too deep -- catch and thus treat "ret" as None
-            return -Infinity
\ No newline at end of file
+            return -Infinity
+
+    def compute_batch_likelihood(self, data, **kwargs):
+        """ The summed likelihood of a ColumnarFunctionData, computed with numpy once we have our responses """
+        responses, failed = self.batch_responses(data), numpy.zeros(len(data), dtype=bool)
+        if responses is None:
+            responses = []
+            for i, inp in enumerate(data.inputs):
+                try:
+                    responses.append(self(*inp))
+                except RecursionDepthException:
+                    responses.append(None)
+                    failed[i] = True
+
+        r = numpy.asarray(responses) if data.outputs.dtype != object else None
+        if r is not None and r.shape == data.outputs.shape and r.dtype.kind in 'biuf':
+            correct = (r == data.outputs)
+        else: # compare with python's ==
+            correct = numpy.fromiter((x == y for x, y in zip(responses, data.outputs)), dtype=bool, count=len(data))
+
+        with numpy.errstate(divide='ignore'):
+            ll = numpy.log(data.alpha * correct + (1.0-data.alpha) / 2.0)
+        ll[failed] = -Infinity
+        return float(numpy.sum(ll))
@@ -3,53 +3,195 @@
     This likelihood is for stochastic functions. To compute the likelihood, we must simulate forwards a bunch of times.
     (Previously, this was a hypothesis type, SimpleGenerativeHypothesis)
 
-    NOTE: A very subtle error can occur if exceptions (like TooBigException) are caught in __call__, then ll_counts may never get set.
+    The counts of outcomes are kept in an LLCountsCache, keyed by the hypothesis (as a string) and the input, so
+    that copies and proposals whose value is unchanged reuse them instead of sampling again. A hypothesis makes one
+    the first time it needs it (or give it ll_counts_cache=LLCountsCache(...)); its copies made after that share it.
+
+    With a tolerance, we sample sequentially, doubling the samples until the standard error of datum's likelihood is
+    below it. And when computing the likelihood with a shortcut (as MHSampler does), we stop sampling for a datum as
+    soon as even an optimistic estimate of its likelihood puts the total below the shortcut, so bad hypotheses are
+    rejected after a handful of samples.
 """
 
-from LOTlib.Miscellaneous import attrmem, nicelog
-from collections import Counter
+from collections import Counter, OrderedDict
+from math import sqrt
+
+from LOTlib.Miscellaneous import attrmem, nicelog, Infinity
+from LOTlib.ForwardSampler import freeze
+
+class LLCountsCache(object):
+    """
+        Stores the Counter of outcomes that each hypothesis (keyed by str(h)) gave on each input.
+
+        maxsize -- how many counters to keep (the oldest are dropped)
+
+        hits and misses count the lookups. A cache pickles without its entries.
+
+        NOTE: The stored counters are shared, so they must not be changed (we replace them when we sample more).
+    """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self.clear()
+
+    def clear(self):
+        self.entries = OrderedDict() # (str(h), input) -> Counter, oldest first
+        self.hits, self.misses = 0, 0
+
+    def __getstate__(self):
+        return self.maxsize
+
+    def __setstate__(self, state):
+        self.__init__(state)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __str__(self):
+        return "<LLCountsCache: %i entries, %i hits, %i misses>" % (len(self), self.hits, self.misses)
+
+    def key(self, h, input):
+        return (str(h), freeze(input))
+
+    def get(self, key):
+        c = self.entries.get(key)
+        if c is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return c
+
+    def set(self, key, llcounts):
+        if self.maxsize > 0:
+            self.entries[key] = llcounts
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+def likelihood_standard_error(datum, llcounts, sm=0.1):
+    """
+        The standard error of likelihood_of_counts(datum, llcounts), by the delta method: with p the smoothed
+        outcome probabilities and o datum's counts, it is sqrt((sum_k o_k**2/p_k - (sum_k o_k)**2) / n).
+    """
+    n = sum(llcounts.values())
+    if n == 0:
+        return Infinity
+    z = n + sm*len(datum.output)
+    s = sum([o*o * z / (llcounts[k] + sm) for k, o in datum.output.items()])
+    return sqrt(max(0.0, s - sum(datum.output.values())**2) / n)
+
+def likelihood_upper_bound(datum, llcounts, z=3.0):
+    """
+        An optimistic likelihood of datum given llcounts: the likelihood if each outcome's probability were at the top
+        of its Wilson score interval (z standard deviations), so that it is very unlikely that more samples would
+        give more than this.
+    """
+    n = sum(llcounts.values())
+    if n == 0:
+        return 0.0
+    ll = 0.0
+    for k, o in datum.output.items():
+        c = llcounts[k]
+        p = (c + z*z/2 + z*sqrt(c*(n-c)/float(n) + z*z/4)) / (n + z*z)
+        ll += o * nicelog(min(1.0, p))
+    return ll
 
 class StochasticFunctionLikelihood(object):
-    # NOTE: TODO: Should make this delete ll_counts when value changes
 
-    @attrmem('ll_counts')
-    def make_ll_counts(self, input, nsamples=512):
+    def make_ll_counts(self, input, nsamples=512, llcounts=None):
         """
             Run this model forward nsamples times (defaultly self.nsamples),
-            returning a dictionary of how often each outcome occurred
+            returning a dictionary of how often each outcome occurred (added to llcounts, if given).
+            If we have sample_outcomes (as LOTHypotheses do), this runs them all at once when it can.
         """
 
         if nsamples is None:
             nsamples = self.nsamples
 
-        llcounts = Counter()
+        if llcounts is None:
+            llcounts = Counter()
 
-        for i in xrange(nsamples):
-            llcounts[self(*input)] += 1
+        if hasattr(self, 'sample_outcomes'):
+            for v, k in self.sample_outcomes(input, nsamples):
+                llcounts[v] += k
+        else:
+            for i in xrange(nsamples):
+                llcounts[self(*input)] += 1
 
         return llcounts
-    #
-    # def set_value(self, *args, **kwargs):
-    #     ret = super(type(self), self).set_value(self, *args, **kwargs)
-    #     self.ll_counts = None
-    #     return ret
 
+    def get_ll_counts_cache(self):
+        """ Our LLCountsCache, making one if we don't have one yet. """
+        cache = getattr(self, 'll_counts_cache', None)
+        if cache is None:
+            cache = self.ll_counts_cache = LLCountsCache()
+        return cache
+
+    def make_converged_ll_counts(self, datum, nsamples=512, sm=0.1, tolerance=None, start=32, bound=-Infinity):
+        """
+            The counts of outcomes on datum.input, from the cache if we have them. If there are fewer than nsamples, we
+            sample more: with a tolerance or a bound, we start with start samples and double them, stopping as soon as
+            the standard error of datum's likelihood is below tolerance, or likelihood_upper_bound is below bound
+            (so that the hypothesis will be rejected anyway).
+        """
+        cache = self.get_ll_counts_cache()
+        key = cache.key(self, datum.input)
+        llcounts = cache.get(key)
+        if llcounts is None:
+            llcounts = Counter()
+        n = sum(llcounts.values())
+
+        new = None
+        while n < nsamples:
+            if n > 0 and tolerance is not None and likelihood_standard_error(datum, llcounts, sm=sm) < tolerance:
+                break
+            if n > 0 and likelihood_upper_bound(datum, llcounts) < bound:
+                break
+
+            if tolerance is None and bound == -Infinity:
+                k = nsamples - n
+            else:
+                k = min(max(n, start), nsamples - n)
+            llcounts = self.make_ll_counts(datum.input, nsamples=k, llcounts=Counter(llcounts))
+            n, new = n + k, llcounts
 
-    # def __copy__(self, **kwargs):
-    #     h = super(self).__copy__(**kwargs)
-    #     h.ll_counts = None
-    #     return h
+        if new is not None:
+            cache.set(key, new)
+        return llcounts
 
-    def compute_single_likelihood(self, datum, llcounts=None, nsamples=512, sm=0.1):
+    def compute_single_likelihood(self, datum, llcounts=None, nsamples=512, sm=0.1, tolerance=None, bound=-Infinity):
         """
                 sm smoothing counts are added to existing bins of counts (just to prevent badness)
                 This can take an optiona llcounts in order to allow us to cache this externally
+                With a tolerance or bound, we sample only as much as we need to (see make_converged_ll_counts)
         """
         #print self
         assert isinstance(datum.output, dict), "Data supplied to SimpleGenerativeHypothesis must be a dict (function outputs to counts)"
 
         if llcounts is None: # compute if not passed in
-            llcounts = self.make_ll_counts(datum.input, nsamples=nsamples)
+            llcounts = self.make_converged_ll_counts(datum, nsamples=nsamples, sm=sm, tolerance=tolerance, bound=bound)
 
-        return sum([ datum.output[k] * (nicelog(llcounts[k] + sm)-nicelog(nsamples + sm*len(datum.output.keys())) ) for k in datum.output.keys() ])
+        return self.likelihood_of_counts(datum, llcounts, sm=sm)
 
+    @attrmem('likelihood')
+    def compute_likelihood(self, data, shortcut=-Infinity, **kwargs):
+        """
+            As Hypothesis.compute_likelihood, but giving each datum the bound below which it would take the total
+            under shortcut (since no datum's likelihood is above 0), so that we can stop sampling early.
+        """
+        # subclasses with their own compute_single_likelihood (e.g. a noise model) don't take a bound
+        if self.likelihood_cache is not None or shortcut == -Infinity or \
+                type(self).compute_single_likelihood.im_func is not StochasticFunctionLikelihood.compute_single_likelihood.im_func:
+            return super(StochasticFunctionLikelihood, self).compute_likelihood(data, shortcut=shortcut, **kwargs)
+
+        ll = 0.0
+        for datum in data:
+            ll += self.compute_single_likelihood(datum, bound=(shortcut - ll) * self.likelihood_temperature,
+                                                 **kwargs) / self.likelihood_temperature
+            if ll < shortcut:
+                return -Infinity
+        return ll
+
+    def likelihood_of_counts(self, datum, llcounts, sm=0.1):
+        """ The likelihood of datum when the model's outcomes occurred as often as in llcounts """
+        nsamples = sum(llcounts.values())
+        return sum([ datum.output[k] * (nicelog(llcounts[k] + sm)-nicelog(nsamples + sm*len(datum.output.keys())) ) for k in datum.output.keys() ])
@@ -0,0 +1,114 @@
+
+import unittest
+import pickle
+import random
+from copy import copy
+
+import numpy
+
+from LOTlib.FunctionNode import FunctionNode
+from LOTlib.DataAndObjects import FunctionData, ColumnarFunctionData
+from LOTlib.Miscellaneous import Infinity
+from LOTlib.Hypotheses.LOTHypothesis import LOTHypothesis
+from LOTlib.Hypotheses.RecursiveLOTHypothesis import RecursiveLOTHypothesis
+from LOTlib.Hypotheses.Likelihoods.BinaryLikelihood import BinaryLikelihood
+from LOTlib.Hypotheses.Likelihoods.GaussianLikelihood import GaussianLikelihood
+from LOTlib.Hypotheses.Likelihoods.BehavioralLikelihoodCache import BehavioralLikelihoodCache
+from LOTlib.Hypotheses.Likelihoods.StochasticFunctionLikelihood import StochasticFunctionLikelihood, \
+                                                                        likelihood_standard_error
+
+class BehavioralLikelihoodCacheTest(unittest.TestCase):
+    def runTest(self):
+        print "# Testing the behavioral likelihood cache"
+        class MyHypothesis(BinaryLikelihood, LOTHypothesis):
+            pass
+
+        data = [FunctionData(input=[x], output=x, alpha=0.9) for x in xrange(10)]
+        cache = BehavioralLikelihoodCache(nprobes=2, nverify=len(data))
+
+        def likelihood(name, args, cache):
+            h = MyHypothesis(value=FunctionNode(None, 'EXPR', name, args), likelihood_cache=cache)
+            return h.compute_likelihood(data)
+
+        ll = likelihood('times_', ['x', '1'], None)
+        self.assertEqual(likelihood('times_', ['x', '1'], cache), ll)
+        self.assertEqual(cache.misses, 1)
+
+        # the same function, written differently
+        self.assertEqual(likelihood('plus_', ['x', '0'], cache), ll)
+        self.assertEqual(cache.hits, 1)
+
+        # the same on the probes (0 and 5) but not elsewhere, which verifying must catch
+        ll2 = likelihood('(%s if %s in (0, 5) else -1)', ['x', 'x'], None)
+        self.assertEqual(likelihood('(%s if %s in (0, 5) else -1)', ['x', 'x'], cache), ll2)
+        self.assertEqual((cache.hits, cache.mismatches), (1, 1))
+
+        # and pickling leaves the entries behind
+        self.assertEqual(len(pickle.loads(pickle.dumps(cache))), 0)
+
+
+class BatchLikelihoodTest(unittest.TestCase):
+    def runTest(self):
+        print "# Testing batch likelihoods"
+        class BinaryHypothesis(BinaryLikelihood, LOTHypothesis):
+            pass
+        class GaussianHypothesis(GaussianLikelihood, LOTHypothesis):
+            pass
+
+        binary = [FunctionData(input=[x], output=(x % 3 == 0), alpha=0.8) for x in xrange(100)]
+        gaussian = [FunctionData(input=[float(x)], output=2.0*x, ll_sd=1.0+x) for x in xrange(100)]
+
+        for cls, data, name, args in [(BinaryHypothesis, binary, '(%s %% 2 == 0)', ['x']),
+                                      (GaussianHypothesis, gaussian, 'times_', ['x', 'x'])]:
+            h = cls(value=FunctionNode(None, 'EXPR', name, args))
+            self.assertAlmostEqual(h.compute_likelihood(ColumnarFunctionData(data)), h.compute_likelihood(data))
+            # and they take the keywords that compute_likelihood passes along
+            self.assertAlmostEqual(h.compute_likelihood(ColumnarFunctionData(data), extra=None), h.likelihood)
+
+
+class LLCountsCacheTest(unittest.TestCase):
+    def runTest(self):
+        print "# Testing caching and sequential sampling of stochastic likelihoods"
+        class MyHypothesis(StochasticFunctionLikelihood, RecursiveLOTHypothesis):
+            def __init__(self, grammar=None, **kwargs):
+                RecursiveLOTHypothesis.__init__(self, grammar, **kwargs)
+
+        def fn(name, *args):
+            return FunctionNode(None, 'EXPR', name, list(args))
+
+        # 'a' or '', with probability 1/2
+        h = MyHypothesis(None, value=fn('if_', fn('flip_', ''), FunctionNode(None, 'EXPR', "'a'", None),
+                                        FunctionNode(None, 'EXPR', "''", None)), args=[])
+        datum = FunctionData(input=[], output={'a': 5, '': 5})
+
+        # copies with the same value reuse the counts; other values and inputs don't
+        ll = h.compute_single_likelihood(datum)
+        cache = h.ll_counts_cache
+        self.assertEqual(h.compute_single_likelihood(datum), ll)
+        h2 = copy(h)
+        self.assertIs(h2.ll_counts_cache, cache)
+        self.assertEqual(h2.compute_single_likelihood(datum), ll)
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+        h2.set_value(FunctionNode(None, 'EXPR', "'a'", None))
+        h2.compute_single_likelihood(datum)
+        self.assertEqual((len(cache), cache.misses), (2, 2))
+        self.assertNotEqual(cache.key(h2, []), cache.key(h2, [1]))
+
+        # with a tolerance, we sample until the standard error is below it (seeded, since the error is 0 when the
+        # counts happen to be in the datum's proportions, and then we stop early)
+        random.seed(1)
+        numpy.random.seed(1)
+        h = MyHypothesis(None, value=h.value, args=[])
+        counts = h.make_converged_ll_counts(datum, nsamples=100000, tolerance=0.5)
+        self.assertLess(likelihood_standard_error(datum, counts), 0.5)
+        self.assertLess(sum(counts.values()), 100000)
+        # and asking for more tops up the cached counts
+        counts2 = h.make_converged_ll_counts(datum, nsamples=100000, tolerance=0.1)
+        self.assertGreater(sum(counts2.values()), sum(counts.values()))
+        self.assertLess(likelihood_standard_error(datum, counts2), 0.1)
+
+        # hypotheses that can't get above a shortcut are rejected after start samples
+        h = MyHypothesis(None, value=FunctionNode(None, 'EXPR', "'b'", None), args=[])
+        self.assertEqual(h.compute_likelihood([FunctionData(input=[], output={'a': 10})], shortcut=-10.0), -Infinity)
+        self.assertEqual(sum(h.ll_counts_cache.entries.values()[0].values()), 32)
+        self.assertLess(h.compute_likelihood([FunctionData(input=[], output={'a': 10})]), -50)
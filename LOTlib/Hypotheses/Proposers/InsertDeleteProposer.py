@@ -20,6 +20,7 @@ def is_replicating_FunctionNode(x):
     """
     return any([x.returntype == a.returntype for a in x.argFunctionNodes()])
 
+@cacheable_weight
 def isNotBVAddFunctionNode(x):
     return (not isinstance(x, BVAddFunctionNode))
 
@@ -147,6 +147,7 @@ class InverseInlineProposer(LOTProposer):
 
             # build our little structure
             n.args = lambdafn, argval
+            n.invalidate()
 
             assert self.can_inline_at(n) # this had better be true
 
@@ -177,7 +178,7 @@ class InverseInlineProposer(LOTProposer):
             possible_rules = [r for r in self.grammar.rules[n.returntype] if r.name==n.name and tuple(r.to) == tuple(n.argTypes()) ]
             assert len(possible_rules) == 1 # for now?
 
-            n.rule = possible_rules[0]
+            n.annotate(rule=possible_rules[0])
 
             ir = self.insertable_rules[n.returntype] # for the backward probability
             f = np # just the probability of choosing this apply
@@ -0,0 +1,52 @@
+from RegenerationProposer import RegenerationProposer
+from LOTlib.Hypotheses.Proposers import ProposalFailedException
+from LOTlib.FunctionNode import NodeSamplingException, isFunctionNode
+from LOTlib.PersistentFunctionNode import freeze, BVPathContextManager
+from LOTlib.Miscellaneous import lambdaOne
+from math import log
+
+class PersistentRegenerationProposer(RegenerationProposer):
+    """
+            Regeneration proposals for hypotheses whose value is a PersistentFunctionNode. The proposal shares
+            everything except the path down to the regenerated node with the current tree, so proposing costs
+            O(depth) plus the size of the old and new subtree, instead of copying the whole tree.
+
+            Mix this in before LOTHypothesis, e.g.
+
+                class MyHypothesis(PersistentRegenerationProposer, LOTHypothesis):
+                    ...
+
+            FunctionNode values (e.g. from grammar.generate in LOTHypothesis.__init__) are frozen in set_value.
+            NOTE: resampleProbability is called on PersistentFunctionNodes.
+    """
+
+    def set_value(self, value, *args, **kwargs):
+        if isFunctionNode(value):
+            value = freeze(value)
+
+        super(PersistentRegenerationProposer, self).set_value(value, *args, **kwargs)
+
+    def regenerate_tree(self, t, resampleProbability=lambdaOne):
+        """
+            See RegenerationProposer.regenerate_tree. Here, t is not modified.
+        """
+        try:
+            path, lp = t.sample_subnode(resampleProbability=resampleProbability)
+        except NodeSamplingException:
+            raise ProposalFailedException
+
+        n = t.get(path)
+
+        # in the context of everything above n, score the old subtree, generate a new one, and score it
+        with BVPathContextManager(self.grammar, t, path):
+            old_lp = self.grammar.log_probability(n)
+            new = freeze(self.grammar.generate(n.returntype))
+            new_lp = self.grammar.log_probability(new)
+
+        newt = t.replace(path, new)
+
+        f = lp + new_lp
+        b = (log(1.0*resampleProbability(new)) - log(newt.sample_node_normalizer(resampleProbability=resampleProbability)))\
+            + old_lp
+
+        return newt, f-b, new_lp-old_lp, new.size-n.size
@@ -1,4 +1,5 @@
 from LOTProposer import LOTProposer
+from LOTlib.Hypotheses.Hypothesis import Hypothesis
 from LOTlib.Hypotheses.Proposers import ProposalFailedException
 from LOTlib.FunctionNode import NodeSamplingException
 from LOTlib.Miscellaneous import lambdaOne, Infinity, logplusexp, dropfirst
@@ -12,11 +13,15 @@ class RegenerationProposer(LOTProposer):
             Propose to a tree by sampling a node at random and regenerating
     """
 
-    def propose_tree(self, t, resampleProbability=lambdaOne):
+    def regenerate_tree(self, t, resampleProbability=lambdaOne):
         """
-            Propose to a tree, returning the new tree and the prob. of sampling it.
+            Regenerate a random subnode of a copy of t. This returns the new tree, the forward-backward
+            probability, and how much the regenerated subtree changed the tree's log probability and node count.
+
+            Since only the subtree changed, f and b only need the old and new subtree's log probability (in the
+            context of the parent) rather than that of the whole trees.
         """
-        
+
         newt = copy(t)
 
         try:
@@ -28,17 +33,55 @@ class RegenerationProposer(LOTProposer):
 
         assert getattr(n, "resampleProbability", 1.0) > 0.0, "*** Error in propose_tree %s ; %s" % (resampleProbability(t), t)
 
-        # In the context of the parent, resample n according to the grammar
-        # We recurse_up in order to add all the parent's rules
-        with BVRuleContextManager(self.grammar, n.parent, recurse_up=True): 
+        # In the context of the parent, score the old subtree, resample n according to the grammar, and score
+        # the new one. We recurse_up in order to add all the parent's rules
+        with BVRuleContextManager(self.grammar, n.parent, recurse_up=True):
+            old_lp, old_nodes = self.grammar.log_probability(n), n.count_nodes()
             n.setto(self.grammar.generate(n.returntype))
-        
-        # compute the forward/backward probability    
-        f = lp + self.grammar.log_probability(newt)
+            new_lp, new_nodes = self.grammar.log_probability(n), n.count_nodes()
+
+        # compute the forward/backward probability
+        f = lp + new_lp
         b = (log(1.0*resampleProbability(n)) - log(newt.sample_node_normalizer(resampleProbability=resampleProbability)))\
-            + self.grammar.log_probability(t)
+            + old_lp
+
+        return newt, f-b, new_lp-old_lp, new_nodes-old_nodes
+
+    def propose_tree(self, t, resampleProbability=lambdaOne):
+        """
+            Propose to a tree, returning the new tree and the prob. of sampling it.
+        """
+        newt, fb, _, _ = self.regenerate_tree(t, resampleProbability=resampleProbability)
+
+        return [newt, fb]
+
+    def propose(self, **kwargs):
+        """
+            Propose a new hypothesis. If we can get the log probability and node count of our own tree (as from
+            LOTHypothesis.get_tree_statistics), the proposal's are set from the regenerated subtree alone, so that
+            computing its prior does not walk the whole tree again.
+        """
+
+        while True: # keep trying to propose
+            try:
+                newt, fb, lp_change, nodes_change = self.regenerate_tree(self.value, **kwargs)
+                break
+            except ProposalFailedException:
+                pass
+
+        p = Hypothesis.__copy__(self, value=newt)
+
+        if hasattr(self, 'get_tree_statistics'):
+            lp, nodes = self.get_tree_statistics()
+            nodes += nodes_change
+
+            # get_tree_statistics does not compute the log probability of trees that are too big
+            if nodes > self.maxnodes:
+                p.tree_statistics = (newt, None, nodes)
+            elif lp is not None:
+                p.tree_statistics = (newt, lp+lp_change, nodes)
 
-        return [newt, f-b]
+        return [p, fb]
 
     def lp_propose(self, x, y, resampleProbability=lambdaOne, xZ=None):
         """
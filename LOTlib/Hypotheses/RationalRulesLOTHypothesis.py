@@ -3,8 +3,9 @@ import numpy
 from math import log
 
 from LOTHypothesis import LOTHypothesis
-from LOTlib.Miscellaneous import Infinity, beta, attrmem
+from LOTlib.Miscellaneous import Infinity, beta, gammaln, attrmem
 from LOTlib.FunctionNode import FunctionNode
+from LOTlib.RuleCounts import RuleCounts
 from collections import defaultdict
 
 def get_rule_counts(grammar, t):
@@ -46,6 +47,23 @@ def RR_prior(grammar, t, alpha=1.0):
         lp += (beta(c+theprior) - beta(theprior))
     return lp
 
+def RR_batch_prior(grammar, trees, alpha=1.0):
+    """
+            RR_prior for each of trees (or the trees in a RuleCounts), as a numpy array, computed all at once from
+            their rule counts. This uses the rules grammar had when they were counted.
+    """
+    counts = trees if isinstance(trees, RuleCounts) else grammar.rule_counts(trees)
+    if counts.bound.any():
+        raise NotImplementedError("Rational rules not implemented for bound variables")
+
+    lp = numpy.zeros(len(counts))
+    for nt, c in counts.counts.items():
+        k = c.shape[1]
+        if k > 0:
+            lp += gammaln(c + alpha).sum(axis=1) - gammaln(c.sum(axis=1) + k*alpha)
+            lp -= k*gammaln(alpha) - gammaln(k*alpha)
+    return lp
+
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 from LOTlib.Hypotheses.Likelihoods.BinaryLikelihood import BinaryLikelihood
 
@@ -74,3 +92,19 @@ class RationalRulesLOTHypothesis(BinaryLikelihood, LOTHypothesis):
             # compute the prior with either RR or not.
             return RR_prior(self.grammar, self.value, alpha=self.rrAlpha) / self.prior_temperature
 
+    @classmethod
+    def compute_batch_prior(cls, hypotheses, counts=None):
+        """
+            compute_prior for each of hypotheses (which share a grammar and rrAlpha), as a numpy array, computed all
+            at once from their rule counts (see LOTHypothesis.compute_batch_prior).
+        """
+        grammar, alpha = hypotheses[0].grammar, hypotheses[0].rrAlpha
+        assert all(h.rrAlpha == alpha for h in hypotheses), "*** All hypotheses must have the same rrAlpha"
+        if counts is None:
+            counts = grammar.rule_counts(hypotheses)
+        assert len(counts) == len(hypotheses), "*** counts must be for these hypotheses"
+
+        maxnodes = numpy.array([h.maxnodes for h in hypotheses])
+        temperatures = numpy.array([h.prior_temperature for h in hypotheses], dtype=float)
+        return numpy.where(counts.nodes > maxnodes, -Infinity, RR_batch_prior(grammar, counts, alpha) / temperatures)
+
@@ -40,6 +40,9 @@ class RecursiveLOTHypothesis(LOTHypothesis):
         if self.recursive_call_depth > self.recursive_depth_bound:
             raise RecursionDepthException
 
+        if self.budget is not None:
+            self.budget.charge()
+
         # Call with sending myself as the recursive call
         return LOTHypothesis.__call__(self, self.recursive_call, *args)
 
@@ -52,3 +55,11 @@ class RecursiveLOTHypothesis(LOTHypothesis):
         # call with passing self.recursive_Call as the recursive call
         return LOTHypothesis.__call__(self, self.recursive_call, *args)
 
+    def batch_responses(self, data, *extra):
+        """
+        None, so that the batch likelihoods call us on each datum: our args start with recurse, which the inputs
+        don't have, and recursive calls must go through recursive_call (so neither vectorizing nor a subtree_cache can
+        evaluate us).
+        """
+        return None
+
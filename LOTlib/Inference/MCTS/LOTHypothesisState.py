@@ -11,7 +11,6 @@ from collections import defaultdict
 from LOTlib.Miscellaneous import Infinity, lambdaAssertFalse, logsumexp
 from LOTlib.BVRuleContextManager import BVRuleContextManager
 from LOTlib.FunctionNode import FunctionNode
-from LOTlib.GrammarRule import GrammarRule
 
 from State import State, StatePruneException
 from MaxScoreState import MaxScoreState
@@ -47,8 +46,7 @@ class LOTHypothesisState(MaxScoreState):
 
         #We must modify the grammar to include one more nonterminal here
         mynt = "<hsmake>"
-        myr = GrammarRule(mynt, '', [grammar.start], p=1.0)
-        grammar.rules[mynt].append(myr)
+        myr = grammar.add_rule(mynt, '', [grammar.start], 1.0)
         return cls(make_h0(value=FunctionNode(None, mynt,  '', [grammar.start], rule=myr)), data, grammar, hole_penalty=hole_penalty, parent=None, **args) # the top state
 
     def __init__(self, value, data, grammar, hole_penalty=None, **kwargs):
@@ -143,6 +141,7 @@ class LOTHypothesisState(MaxScoreState):
 
             for r in rules:
                 fn.args[argi] = r.make_FunctionNodeStub(self.grammar, fn)
+                fn.invalidate()
 
                 # copy the type in self.value
                 newh = self.value.__copy__(value=None)
@@ -1,6 +1,7 @@
 from scipy import interpolate
 
-from ParallelTempering import ParallelTemperingSampler
+from LOTlib.Inference.Samplers.ParallelTempering import ParallelTemperingSampler
+from LOTlib.Inference.Samplers.MultiprocessParallelTempering import MultiprocessParallelTemperingSampler
 
 
 class AdaptiveParallelTemperingSampler(ParallelTemperingSampler):
@@ -12,8 +13,8 @@ class AdaptiveParallelTemperingSampler(ParallelTemperingSampler):
 
     def __init__(self, make_h0, data, adapt_at=[50000, 100000, 200000, 300000, 500000, 1000000], **kwargs):
 
-        ParallelTemperingSampler.__init__(self, make_h0, data, **kwargs)
         self.adapt_at = adapt_at
+        super(AdaptiveParallelTemperingSampler, self).__init__(make_h0, data, **kwargs)
 
 
     def adapt_temperatures(self, epsilon=0.001):
@@ -44,18 +45,15 @@ class AdaptiveParallelTemperingSampler(ParallelTemperingSampler):
         # keep the old temps
         newt.append(self.temperatures[-1])
 
-        self.temperatures = newt
+        # And set each temperature chain
+        self.set_temperatures(newt)
 
         print "# Adapting temperatures to ", self.temperatures
         print "# Acceptance ratio:", self.acceptance_ratio()
 
-        # And set each temperature chain
-        for c, t in zip(self.chains, self.temperatures):
-            c.likelihod_temperature = t
-
 
     def next(self):
-        ret = ParallelTemperingSampler.next(self)
+        ret = super(AdaptiveParallelTemperingSampler, self).next()
 
         if self.nsamples in self.adapt_at: ## TODO: Maybe make this faster?
             self.adapt_temperatures()
@@ -63,6 +61,13 @@ class AdaptiveParallelTemperingSampler(ParallelTemperingSampler):
         return ret
 
 
+class MultiprocessAdaptiveParallelTemperingSampler(AdaptiveParallelTemperingSampler, MultiprocessParallelTemperingSampler):
+    """
+    AdaptiveParallelTemperingSampler, with each temperature's chain in a worker process
+    """
+    pass
+
+
 if __name__ == "__main__":
 
     from LOTlib import break_ctrlc
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+    Delayed-acceptance Metropolis-Hastings (Christen & Fox, 2005).
+
+    Each proposal is first screened with a cheap approximation to the posterior: the prior plus the likelihood of a
+    small subset of the data, scaled up to the size of the whole data. Only proposals that pass this first MH test
+    get their likelihood computed on all of the data, and then they are accepted with the second-stage probability
+
+        min(1, exp( (posterior(proposal) - posterior(current)) - (cheap(proposal) - cheap(current)) ))
+
+    which corrects for the screen, so that the sampler still has exactly the posterior as its stationary
+    distribution. The subset is either drawn at random for each proposal or (with fixed_subset=True) chosen once.
+
+    This helps when most proposals are rejected, and a few data points are enough to tell that they are bad.
+"""
+from math import log
+from random import random, sample
+
+from LOTlib.Miscellaneous import Infinity
+from LOTlib.Eval import TooBigException
+from LOTlib.Inference.Samplers.MetropolisHastings import MHSampler, MH_acceptance
+from LOTlib.PersistentFunctionNode import isPersistentFunctionNode
+
+class DelayedAcceptanceMHSampler(MHSampler):
+    """A version of MHSampler that screens proposals with the likelihood of a subset of the data.
+
+    Parameters
+    ----------
+    subset_size : int
+        How many data points to screen with.
+    fixed_subset : bool
+        If true, we choose the subset once; otherwise we draw a new one for each proposal.
+
+    Attributes
+    ----------
+    stage1_rejections : int
+        How many proposals the screen rejected (without computing their full likelihood).
+    stage2_rejections : int
+        How many proposals passed the screen, but were then rejected.
+
+    """
+    def __init__(self, current_sample, data, subset_size=10, fixed_subset=False, **kwargs):
+        self.subset_size = min(subset_size, len(data))
+        self.fixed_subset = fixed_subset
+        self.subset = sorted(sample(xrange(len(data)), self.subset_size)) if fixed_subset else None
+        self.screened = None # (hypothesis, temperatures, its cheap score) for the current sample, with a fixed subset
+        MHSampler.__init__(self, current_sample, data, **kwargs)
+
+    def reset_counters(self):
+        MHSampler.reset_counters(self)
+        self.stage1_rejections = 0
+        self.stage2_rejections = 0
+
+    def stage1_rejection_ratio(self):
+        """
+        Returns the proportion of proposals that were rejected by the screen.
+
+        """
+        if self.proposal_count > 0:
+            return float(self.stage1_rejections) / float(self.proposal_count)
+        else:
+            return float("nan")
+
+    def cheap_score(self, h, subset):
+        """
+        The prior and the likelihood of the data in subset (scaled up to all of the data), at our temperatures.
+        This doesn't change h's prior or likelihood (except that it computes the prior if it's not computed).
+
+        NOTE: This calls h.compute_single_likelihood on each datum in subset, so it doesn't go through a
+              likelihood_cache or compute_batch_likelihood (subsets are small, and the full likelihood in stage 2
+              still does). Hypotheses whose likelihood isn't a sum of compute_single_likelihoods can't use this.
+        """
+        prior = h.compute_prior()
+        if prior == -Infinity:
+            return -Infinity
+
+        ll = 0.0
+        try:
+            for i in subset:
+                ll += h.compute_single_likelihood(self.data[i]) / h.likelihood_temperature
+        except TooBigException:
+            if getattr(h, 'budget', None) is None:
+                raise
+            ll = -Infinity # as LOTHypothesis.compute_likelihood does when over budget
+
+        return prior/self.prior_temperature + ll * len(self.data) / max(len(subset), 1) / self.likelihood_temperature
+
+    def next(self):
+        """Generate another sample."""
+        if self.samples_yielded >= self.steps:
+            raise StopIteration
+        else:
+            for _ in xrange(self.skip+1):
+
+                self.proposal, fb = self.proposer(self.current_sample)
+
+                assert self.proposal is not self.current_sample, "*** Proposal cannot be the same as the current sample!"
+                # (immutable values may be shared, and are whenever a proposal regenerates the same tree)
+                assert self.proposal.value is not self.current_sample.value or isPersistentFunctionNode(self.proposal.value), \
+                    "*** Proposal cannot be the same as the current sample!"
+
+                self.proposal_count += 1
+                self.was_accepted = False
+
+                # Stage 1: screen with the subset
+                if self.fixed_subset:
+                    subset = self.subset
+                    # (parallel tempering may have changed our temperatures since we scored it)
+                    temperatures = (self.prior_temperature, self.likelihood_temperature)
+                    if self.screened is None or self.screened[0] is not self.current_sample or \
+                            self.screened[1] != temperatures:
+                        self.screened = (self.current_sample, temperatures,
+                                         self.cheap_score(self.current_sample, subset))
+                    cheap_cur = self.screened[2]
+                else:
+                    subset = sample(xrange(len(self.data)), self.subset_size)
+                    cheap_cur = self.cheap_score(self.current_sample, subset)
+                cheap_prop = self.cheap_score(self.proposal, subset)
+
+                if not MH_acceptance(cheap_cur, cheap_prop, fb, acceptance_temperature=self.acceptance_temperature):
+                    self.stage1_rejections += 1
+                    continue
+
+                # Stage 2: the full posterior, corrected for the screen. The screen can't be corrected for when it
+                # gives the current sample zero probability (which happens only before we find one with a positive
+                # posterior), so then we just do MHSampler's test
+                if cheap_cur == -Infinity:
+                    corr_cur, corr_prop, corr_fb = 0.0, 0.0, fb
+                else:
+                    corr_cur, corr_prop, corr_fb = cheap_cur, cheap_prop, 0.0
+
+                # As in MHSampler, we draw the random number first, so that we can stop computing the likelihood once
+                # it's too low to be accepted
+                cur = (self.current_sample.prior/self.prior_temperature +
+                       self.current_sample.likelihood/self.likelihood_temperature)
+                p = random()
+                ll_cutoff = -Infinity
+                if self.shortcut_likelihood and p > 0.0:
+                    ll_cutoff = (log(p)*self.acceptance_temperature + corr_prop - corr_cur + cur + corr_fb -
+                                 self.proposal.prior/self.prior_temperature) * self.likelihood_temperature
+
+                # Call myself so memoized subclasses can override
+                self.compute_posterior(self.proposal, self.data, shortcut=ll_cutoff)
+
+                prop = (self.proposal.prior/self.prior_temperature +
+                        self.proposal.likelihood/self.likelihood_temperature)
+
+                if self.trace:
+                    print "# Current: ", round(cur,3), self.current_sample
+                    print "# Proposal:", round(prop,3), self.proposal
+                    print ""
+
+                if MH_acceptance(cur - corr_cur, prop - corr_prop, corr_fb, p=p,
+                                 acceptance_temperature=self.acceptance_temperature):
+                    self.current_sample = self.proposal
+                    self.was_accepted = True
+                    self.acceptance_count += 1
+                else:
+                    self.stage2_rejections += 1
+
+            self.samples_yielded += 1
+            return self.current_sample
+
+if __name__ == "__main__":
+
+    # Just an example
+    from LOTlib import break_ctrlc
+    from LOTlib.Examples.Number.Model import make_data, NumberExpression, grammar
+
+    data = make_data(300)
+    h0 = NumberExpression(grammar)
+    sampler = DelayedAcceptanceMHSampler(h0, data, steps=100000, subset_size=10)
+    for h in break_ctrlc(sampler):
+        print h.posterior_score, h.prior, h.likelihood, sampler.stage1_rejection_ratio(), h
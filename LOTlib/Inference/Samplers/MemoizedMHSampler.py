@@ -1,35 +1,52 @@
-from cachetools import LRUCache
-
 from LOTlib.Miscellaneous import Infinity
 from MetropolisHastings import MHSampler
+from PosteriorCache import PosteriorCache
 
 class MemoizedMHSampler(MHSampler):
     """
-        Same as MHSampler, but the values of compute_posterior are cached via LRUCache
+        Same as MHSampler, but the prior, likelihood, and posterior of each hypothesis are cached in a PosteriorCache,
+        and restored on hypotheses we have seen before.
+
+        memoize -- how many entries to keep, if we make our own cache
+        cache -- a PosteriorCache (or SQLitePosteriorCache) to use, e.g. one shared with other chains
+                 (see make_memoized_sampler)
+
+        Likelihoods cut short by shortcut_likelihood (as -inf) are not stored, since they're not the real ones.
     """
-    def __init__(self, h0,  data, memoize=Infinity, **kwargs):
+    def __init__(self, h0,  data, memoize=Infinity, cache=None, **kwargs):
+        self.cache = cache if cache is not None else PosteriorCache(maxsize=memoize)
         MHSampler.__init__(self, h0, data, **kwargs)
 
-        # self.mem stores return of compute_posterior
-        self.mem = LRUCache(maxsize=memoize)
-
     def compute_posterior(self, h, data, shortcut=-Infinity):
+        key = self.cache.key(h)
+        entry = self.cache.get(key)
+        if entry is not None:
+            h.prior, h.likelihood, h.posterior_score = entry
+            return h.posterior_score
+
+        ret = MHSampler.compute_posterior(self, h, data, shortcut=shortcut) # calls update to posterior counter
+
+        if h.prior == -Infinity:
+            h.likelihood = -Infinity # we didn't compute it, so pretend it's -inf (as Hypothesis.compute_posterior)
+        elif h.likelihood == -Infinity and shortcut > -Infinity:
+            return ret # maybe cut short
+
+        self.cache.set(key, (h.prior, h.likelihood, ret))
+        return ret
 
-        if h in self.mem:
-            ret = self.mem[h]
-            h.posterior_score = ret # set this because it may not be set
-            return ret
-        else:
-            ret = MHSampler.compute_posterior(self, h, data, shortcut=-Infinity) # calls update to posterior counter
-            self.mem[h] = ret
-            return ret
+def make_memoized_sampler(cache):
+    """A make_sampler for MultipleChainMCMC (or ParallelTemperingSampler, ...) whose chains all share cache."""
+    def make_sampler(make_h0, data, **kwargs):
+        return MemoizedMHSampler(make_h0(), data, cache=cache, **kwargs)
+    return make_sampler
 
 if __name__ == "__main__":
+    from LOTlib.Examples import load_example
 
-    from LOTlib.Examples.Number.Global import generate_data, NumberExpression, grammar
+    make_hypothesis, make_data = load_example('Number')
+    data = make_data(300)
 
-    data = generate_data(100)
-    h0 = NumberExpression(grammar)
-    sampler = MemoizedMHSampler(h0, data, steps=1000)
+    sampler = MemoizedMHSampler(make_hypothesis(), data, steps=10000)
     for h in sampler:
-        pass #print q(get_knower_pattern(h)), h.posterior_score, h.prior, h.likelihood, q(h), sampler.acceptance_count, sampler.acceptance_ratio()
+        pass
+    print sampler.cache, sampler.posterior_calls
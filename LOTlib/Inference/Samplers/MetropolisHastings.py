@@ -2,6 +2,7 @@
 
 from LOTlib.Miscellaneous import q, qq, Infinity
 from LOTlib.Inference.Samplers.Sampler import Sampler, MH_acceptance
+from LOTlib.PersistentFunctionNode import isPersistentFunctionNode
 
 from math import log, exp
 from random import random
@@ -56,7 +57,7 @@ class MHSampler(Sampler):
         If true, print stuff as we sample.
     shortcut_likelihood : bool
         If true, we allow for short-cut evaluation of the likelihood, rejecting when we can if the ll
-        drops below the acceptance value
+        drops below the acceptance value (see Hypothesis.max_single_likelihood)
 
     Attributes
     ----------
@@ -64,6 +65,9 @@ class MHSampler(Sampler):
         Was the last proposal accepted?
     samples_yielded : int
         How many samples have I yielded? This doesn't count skipped samples.
+    shortcut_count : int
+        How many proposals were rejected with their likelihood cut short (as -inf, or whose likelihood is -inf
+        anyway). These are never yielded (and MemoizedMHSampler never stores one).
 
 
     """
@@ -110,6 +114,7 @@ class MHSampler(Sampler):
         self.acceptance_count = 0
         self.proposal_count   = 0
         self.posterior_calls  = 0
+        self.shortcut_count   = 0
 
     def acceptance_ratio(self):
         """
@@ -131,30 +136,44 @@ class MHSampler(Sampler):
                 self.proposal, fb = self.proposer(self.current_sample)
 
                 assert self.proposal is not self.current_sample, "*** Proposal cannot be the same as the current sample!"
-                assert self.proposal.value is not self.current_sample.value, "*** Proposal cannot be the same as the current sample!"
-
-                # Call myself so memoized subclasses can override
-                self.compute_posterior(self.proposal, self.data)
+                # (immutable values may be shared, and are whenever a proposal regenerates the same tree)
+                assert self.proposal.value is not self.current_sample.value or isPersistentFunctionNode(self.proposal.value), \
+                    "*** Proposal cannot be the same as the current sample!"
 
                 # Note: It is important that we re-compute from the temperature since these may be altered
                 #    externally from ParallelTempering and others
-                prop = (self.proposal.prior/self.prior_temperature +
-                        self.proposal.likelihood/self.likelihood_temperature)
                 cur = (self.current_sample.prior/self.prior_temperature +
                        self.current_sample.likelihood/self.likelihood_temperature)
 
+                # We draw the random number first, so that we know the least likelihood the proposal needs to be
+                # accepted, and can stop computing it once it can't get there. This is exact: we pass the same p to
+                # MH_acceptance, and the proposals we stop on are ones it would reject.
+                p = random()
+                ll_cutoff = -Infinity
+                if self.shortcut_likelihood and p > 0.0:
+                    ll_cutoff = (log(p)*self.acceptance_temperature + cur + fb -
+                                 self.proposal.compute_prior()/self.prior_temperature) * self.likelihood_temperature
+
+                # Call myself so memoized subclasses can override
+                self.compute_posterior(self.proposal, self.data, shortcut=ll_cutoff)
+
+                prop = (self.proposal.prior/self.prior_temperature +
+                        self.proposal.likelihood/self.likelihood_temperature)
+
                 if self.trace:
                     print "# Current: ", round(cur,3), self.current_sample
                     print "# Proposal:", round(prop,3), self.proposal
                     print ""
                 
                 # if MH_acceptance(cur, prop, fb, acceptance_temperature=self.acceptance_temperature): # this was the old form
-                if MH_acceptance(cur, prop, fb, acceptance_temperature=self.acceptance_temperature):
+                if MH_acceptance(cur, prop, fb, p=p, acceptance_temperature=self.acceptance_temperature):
                     self.current_sample = self.proposal
                     self.was_accepted = True
                     self.acceptance_count += 1
                 else:
                     self.was_accepted = False
+                    if ll_cutoff > -Infinity and self.proposal.prior > -Infinity and self.proposal.likelihood == -Infinity:
+                        self.shortcut_count += 1
 
                 self.proposal_count += 1
 
@@ -11,7 +11,7 @@ from copy import copy
 
 from LOTlib.Miscellaneous import Infinity
 from LOTlib.Inference.Samplers.MetropolisHastings import MHSampler
-from LOTlib.Inference.Sampler import Sampler
+from LOTlib.Inference.Samplers.Sampler import Sampler
 
 class MultipleChainMCMC(Sampler):
     
@@ -30,6 +30,8 @@ class MultipleChainMCMC(Sampler):
         self.chain_idx = -1 # what chain are we on? This get incremented before anything, so it starts with 0
         self.nsamples = 0
         assert nchains>0, "Must have > 0 chains specified (you sent %s)"%nchains
+        if make_sampler is not None:
+            self.make_sampler = make_sampler
 
         self.chains = [self.make_sampler( make_h0, data, steps=steps/nchains, **kwargs) for _ in xrange(nchains)]
 
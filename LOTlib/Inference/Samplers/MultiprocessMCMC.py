@@ -0,0 +1,244 @@
+"""
+    Multiple chains, as in MultipleChainMCMC, but run in worker processes so that they use all of the cores of one
+    machine (with multiprocessing, so no MPI is needed).
+
+    Each worker keeps its chains for the whole run, and steps each of them batch steps at a time, sending back the
+    samples with the id of the chain they came from. Samples come back in whatever order the workers finish their
+    batches (after each one, we set self.chain_idx to the chain it came from), while each chain's own samples are in
+    order. Workers start their next batch as soon as they send one, so we don't wait for them while using samples.
+
+    Each chain gets its own seed (seed + its id) for python's and numpy's random numbers, and keeps its own random
+    state, so what each chain does depends only on seed, and not on how many processes we use.
+
+    NOTE: Workers are forked, so make_h0, make_sampler and the data need not pickle, but the samples (and so the
+          hypotheses and their grammars) must. Samples are copies, and don't share a grammar with ours.
+          Call close() to stop the workers (we do when we run out of samples).
+"""
+import random
+import select
+import traceback
+from collections import deque
+from copy import copy
+from multiprocessing import Process, Pipe, cpu_count
+
+import numpy
+
+from LOTlib.Miscellaneous import Infinity
+from LOTlib.Inference.Samplers.MultipleChainMCMC import MultipleChainMCMC
+
+def seed_chain(seed, i):
+    """Seed python's and numpy's random numbers for chain i."""
+    s = (seed + i) % 2**32
+    random.seed(s)
+    numpy.random.seed(s)
+
+def run_worker(conn, ids, make_chain, seed):
+    """
+        The loop of a worker process: make chains ids (with make_chain(i)), and do what conn says, until it says
+        ('stop',). It says ('run', n, setup, report, send) to set the attributes in setup[i] on each chain i, step
+        each chain n times, and send back the samples of the chains in send (or all, if it is None) and what the
+        calls (method, args) in report give on each chain. And it says ('call', ids, method, args, kwargs) to call a
+        method of some chains.
+    """
+    try:
+        chains, states, done = dict(), dict(), set()
+        for i in ids:
+            seed_chain(seed, i)
+            chains[i] = make_chain(i)
+            states[i] = (random.getstate(), numpy.random.get_state())
+
+        while True:
+            msg = conn.recv()
+            if msg[0] == 'stop':
+                break
+
+            out, reports = ([], dict()) if msg[0] == 'run' else (dict(), None)
+            for i in (ids if msg[0] == 'run' else msg[1]):
+                random.setstate(states[i][0])
+                numpy.random.set_state(states[i][1])
+                if msg[0] == 'run':
+                    _, n, setup, report, send = msg
+                    for k, v in setup.get(i, dict()).items():
+                        setattr(chains[i], k, v)
+                    for _ in xrange(n):
+                        if i in done:
+                            break
+                        try:
+                            h = chains[i].next()
+                            if send is None or i in send:
+                                out.append((i, h))
+                        except StopIteration:
+                            done.add(i)
+                    reports[i] = [getattr(chains[i], m)(*a) for m, a in report]
+                else: # with copies of the args, as MultipleChainMCMC.set_state gives each chain its own
+                    out[i] = getattr(chains[i], msg[2])(*map(copy, msg[3]), **msg[4])
+                states[i] = (random.getstate(), numpy.random.get_state())
+
+            if msg[0] == 'run':
+                conn.send(('samples', out, len(done) == len(ids), reports))
+            else:
+                conn.send(('result', out))
+    except Exception:
+        conn.send(('error', traceback.format_exc()))
+    finally:
+        conn.close()
+
+class MultiprocessMCMC(MultipleChainMCMC):
+
+    def __init__(self, make_h0, data, steps=Infinity, nchains=10, make_sampler=None, nprocesses=None, batch=100,
+                 seed=None, **kwargs):
+        """
+        :param make_h0: -- a function to make h0 for each chain
+        :param data:  -- what data we use
+        :param steps:  -- how many steps (total, across all chains)
+        :param nchains:  -- how many chains
+        :param make_sampler: -- a function that takes make_h0, data, and steps
+        :param nprocesses: -- how many worker processes (defaultly, one per core, but no more than nchains)
+        :param batch: -- how many steps each chain takes before its worker sends back samples
+        :param seed: -- the chains' seeds are seed, seed+1, ... (defaultly, seed is drawn from python's random)
+        :param kwargs: -- special args to sampler
+        :return:
+        """
+        assert nchains > 0, "Must have > 0 chains specified (you sent %s)" % nchains
+        assert batch > 0, "*** batch must be > 0 (you sent %s)" % batch
+
+        self.nchains = nchains
+        self.chain_idx = None # the chain the last sample came from
+        self.nsamples = 0
+        self.batch = batch
+        self.seed = seed if seed is not None else random.randint(0, 2**32-1)
+        if make_sampler is not None:
+            self.make_sampler = make_sampler
+
+        nprocesses = min(nprocesses or cpu_count(), nchains)
+        self.ids = [range(w, nchains, nprocesses) for w in xrange(nprocesses)]
+        self.buffer = deque() # (chain id, sample)s we have but haven't returned
+        self.running = [False] * nprocesses # whether each worker is running a batch
+        self.done = [False] * nprocesses # whether all of each worker's chains are done
+
+        def make_chain(i):
+            return self.make_sampler(make_h0, data, steps=steps/nchains, **kwargs)
+
+        self.conns, self.processes = [], []
+        for ids in self.ids:
+            parent, child = Pipe()
+            p = Process(target=run_worker, args=(child, ids, make_chain, self.seed))
+            p.daemon = True
+            p.start()
+            child.close()
+            self.conns.append(parent)
+            self.processes.append(p)
+
+    def __str__(self):
+        return "<MultiprocessMCMC: %i chains in %i processes>" % (self.nchains, len(self.processes))
+
+    def _receive(self, w):
+        # The next message from worker w
+        msg = self.conns[w].recv()
+        if msg[0] == 'error':
+            self.close()
+            raise RuntimeError("*** A MultiprocessMCMC worker failed:\n%s" % msg[1])
+        return msg
+
+    def _collect(self, w, restart=True):
+        # Get worker w's running batch, and maybe start its next one
+        _, samples, self.done[w], _ = self._receive(w)
+        self.running[w] = False
+        self.buffer.extend(samples)
+        if restart:
+            self._run(w)
+
+    def _run(self, w):
+        if not self.done[w] and not self.running[w]:
+            self.conns[w].send(('run', self.batch, dict(), [], None))
+            self.running[w] = True
+
+    def next(self):
+        while not self.buffer:
+            for w in xrange(len(self.conns)):
+                self._run(w)
+            busy = [w for w in xrange(len(self.conns)) if self.running[w]]
+            if not busy:
+                self.close()
+                raise StopIteration
+            ready, _, _ = select.select([self.conns[w] for w in busy], [], [])
+            for w in busy:
+                if self.conns[w] in ready:
+                    self._collect(w)
+
+        self.nsamples += 1
+        self.chain_idx, h = self.buffer.popleft()
+        return h
+
+    def call(self, method, *args, **kwargs):
+        """Call method on every chain (in its worker), returning a list of what each returns, in chain order."""
+        out = dict()
+        for w, conn in enumerate(self.conns):
+            if self.running[w]:
+                self._collect(w, restart=False)
+            conn.send(('call', self.ids[w], method, args, kwargs))
+            out.update(self._receive(w)[1])
+        return [out[i] for i in xrange(self.nchains)]
+
+    def run_batch(self, n, setup=dict(), report=(), send=None):
+        """
+            Step every chain n times at once, and wait for them all. Before, set the attributes in the dict setup[i]
+            on chain i; after, make the calls (method, args) in report on each chain. Returns a list of (chain id,
+            sample) for the chains in send (defaultly all), whether all chains are done, and a dict from each chain
+            to a list of what the calls in report gave.
+        """
+        for w, conn in enumerate(self.conns):
+            if self.running[w]:
+                self._collect(w, restart=False)
+            conn.send(('run', n, dict((i, setup[i]) for i in self.ids[w] if i in setup), list(report), send))
+
+        samples, reports = [], dict()
+        for w in xrange(len(self.conns)):
+            _, s, self.done[w], r = self._receive(w)
+            samples.extend(s)
+            reports.update(r)
+        return samples, all(self.done), reports
+
+    def reset_counters(self):
+        self.call('reset_counters')
+
+    def acceptance_ratio(self):
+        """
+            Return the acceptance rate of each chain
+        """
+        return self.call('acceptance_ratio')
+
+    def set_state(self, s, **kwargs):
+        """
+        Set the states of all chains to (copies of) s. Samples from before that we haven't returned are dropped.
+        """
+        self.call('set_state', s, **kwargs)
+        self.buffer.clear()
+
+    def close(self):
+        """Stop the workers."""
+        for w, conn in enumerate(self.conns):
+            try:
+                if self.running[w]:
+                    conn.recv() # or it may wait forever to send us its batch
+                conn.send(('stop',))
+                conn.close()
+            except (IOError, EOFError):
+                pass
+        for p in self.processes:
+            p.join()
+        self.conns, self.processes = [], []
+        self.running, self.done = [], []
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+if __name__ == "__main__":
+    from LOTlib import break_ctrlc
+    from LOTlib.Examples import load_example
+
+    make_hypothesis, make_data = load_example('Number')
+    data = make_data(300)
+
+    sampler = MultiprocessMCMC(make_hypothesis, data, steps=2000, nchains=10)
+    for h in break_ctrlc(sampler):
+        print sampler.chain_idx, h.posterior_score, h
+    sampler.close()
@@ -0,0 +1,130 @@
+"""
+    Parallel tempering with each temperature's chain in a worker process (see MultiprocessMCMC), so that a ladder
+    of 10 temperatures can use 10 cores.
+
+    All chains take within_steps steps at once. Then each sends back its samples, and the score of its current
+    sample at each temperature of the ladder. We propose swaps with those scores, and a swap exchanges the two chains'
+    temperatures (not their hypotheses), which we send along with their next batch. So between batches, only
+    numbers pass between processes, besides the samples we yield (and with yield_only_t0, only the chain at the
+    lowest temperature sends its samples).
+
+    Unlike ParallelTemperingSampler, where swaps happen every within_steps samples (across all chains), here each
+    chain takes within_steps steps between swaps. The swap statistics (nup, ndown, upswaps) are the same, and
+    AdaptiveParallelTemperingSampler works on top of this (see MultiprocessAdaptiveParallelTemperingSampler).
+"""
+from collections import deque
+
+from LOTlib.Inference.Samplers.ParallelTempering import ParallelTemperingSampler
+from LOTlib.Inference.Samplers.MultiprocessMCMC import MultiprocessMCMC
+
+class MultiprocessParallelTemperingSampler(ParallelTemperingSampler):
+
+    def __init__(self, make_h0, data, nprocesses=None, seed=None, **kwargs):
+        """
+        :param nprocesses: -- how many worker processes (defaultly, one per core, but no more than one per temperature)
+        :param seed: -- the seed for the chains (see MultiprocessMCMC)
+        :param kwargs: -- as for ParallelTemperingSampler
+        """
+        self.nprocesses = nprocesses
+        self.seed = seed
+        super(MultiprocessParallelTemperingSampler, self).__init__(make_h0, data, **kwargs)
+
+    def make_chains(self, make_h0, data, steps, **kwargs):
+        self.nchains = len(self.temperatures)
+        self.chain_idx = None # the temperature of the chain the last sample came from
+        self.nsamples = 0
+
+        self.pool = MultiprocessMCMC(make_h0, data, steps=steps, nchains=self.nchains, nprocesses=self.nprocesses,
+                                     batch=self.within_steps, seed=self.seed, **kwargs)
+        self.order = range(self.nchains) # the chain at each temperature
+        self.setup = dict((i, {self.whichtemperature: t}) for i, t in enumerate(self.temperatures)) # to send
+        self.scores = None # chain -> {temperature: score of its current sample}
+        self.buffer = deque() # (temperature, sample)s we have but haven't returned
+        self.done = False
+
+    def __str__(self):
+        return "<MultiprocessParallelTemperingSampler: %i temperatures in %i processes>" % \
+               (self.nchains, len(self.pool.processes))
+
+    def tempered_score(self, i, t):
+        return self.scores[self.order[i]][t]
+
+    def swap(self, i):
+        self.order[i], self.order[i+1] = self.order[i+1], self.order[i]
+        for j in [i, i+1]:
+            self.setup[self.order[j]] = {self.whichtemperature: self.temperatures[j]}
+
+    def set_temperatures(self, temperatures):
+        self.temperatures = temperatures
+        for i, t in enumerate(temperatures):
+            self.setup[self.order[i]] = {self.whichtemperature: t}
+
+    def run_batch(self):
+        """ Run within_steps steps of every chain, then propose swaps """
+        report = [('at_temperature', (t, self.whichtemperature)) for t in self.temperatures]
+        samples, self.done, reports = self.pool.run_batch(self.within_steps, setup=self.setup, report=report,
+                                                          send=set([self.order[0]]) if self.yield_only_t0 else None)
+        self.setup = dict()
+        self.scores = dict((i, dict(zip(self.temperatures, r))) for i, r in reports.items())
+
+        # return them round-robin, from the lowest temperature up, as ParallelTemperingSampler does
+        temperature = dict((c, i) for i, c in enumerate(self.order))
+        bychain = dict()
+        for c, h in samples:
+            bychain.setdefault(c, []).append(h)
+        for k in xrange(max([len(v) for v in bychain.values()] or [0])):
+            for c in self.order:
+                if k < len(bychain.get(c, [])):
+                    self.buffer.append((temperature[c], bychain[c][k]))
+
+        self.propose_swaps()
+
+    def next(self):
+        while not self.buffer:
+            if self.done:
+                self.close()
+                raise StopIteration
+            self.run_batch()
+
+        self.nsamples += 1
+        self.chain_idx, h = self.buffer.popleft()
+        return h
+
+    def reset_counters(self):
+        self.pool.reset_counters()
+
+    def acceptance_ratio(self):
+        """
+            Return the acceptance rate of the chain at each temperature
+        """
+        r = self.pool.acceptance_ratio()
+        return [r[c] for c in self.order]
+
+    def set_state(self, s, **kwargs):
+        """
+        Set the states of all chains to (copies of) s. Samples from before that we haven't returned are dropped.
+        """
+        self.pool.set_state(s, **kwargs)
+        self.buffer.clear()
+
+    def close(self):
+        """Stop the workers."""
+        self.pool.close()
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+if __name__ == "__main__":
+    from LOTlib import break_ctrlc
+    from LOTlib.Examples import load_example
+    from LOTlib.Miscellaneous import logrange
+
+    make_hypothesis, make_data = load_example('Number')
+    data = make_data(300)
+
+    sampler = MultiprocessParallelTemperingSampler(make_hypothesis, data, steps=100000,
+                                                   temperatures=logrange(1.0, 10.0, 10))
+    for h in break_ctrlc(sampler):
+        print sampler.chain_idx, h.posterior_score, h
+    sampler.close()
+
+    print sampler.nup, sampler.ndown
+    print sampler.get_hist()
@@ -1,7 +1,7 @@
 from random import randint
 
 from LOTlib.Miscellaneous import Infinity
-from LOTlib.Inference.MHShared import MH_acceptance
+from LOTlib.Inference.Samplers.Sampler import MH_acceptance
 from LOTlib.Inference.Samplers.MultipleChainMCMC import MultipleChainMCMC
 
 
@@ -24,28 +24,46 @@ class ParallelTemperingSampler(MultipleChainMCMC):
 
         assert 'nchains' not in kwargs
 
-        MultipleChainMCMC.__init__(self, make_h0, data, nchains=len(temperatures), steps=steps, **kwargs)
-
         self.temperatures = temperatures
-
-        # and set the temperatures
-        for i, t in enumerate(temperatures):
-            setattr(self.chains[i], self.whichtemperature, t)
+        self.make_chains(make_h0, data, steps, **kwargs)
 
         # Keep track of the number of swaps
         self.upswaps = [0] * (self.nchains-1) # how often are you swapped with the immediately higher chain
 
-        # Keep track of up and down from each chain
-        for t in self.chains:
-            t.updown = 0 # +1 for up, -1 for down
-
-        self.chains[0].up = 1
-        self.chains[len(temperatures)-1].down = -1
+        # Keep track of up and down from the chain at each temperature
+        self.updown = [0] * self.nchains # +1 for up, -1 for down
 
         # fraction of particles that are up adn down
         self.nup = [0] * self.nchains
         self.ndown = [0] * self.nchains
 
+    def make_chains(self, make_h0, data, steps, **kwargs):
+        """
+        Make a chain for each temperature. This, tempered_score, swap, and set_temperatures are all that
+        depend on where the chains are (see MultiprocessParallelTempering)
+        """
+        MultipleChainMCMC.__init__(self, make_h0, data, nchains=len(self.temperatures), steps=steps, **kwargs)
+
+        # and set the temperatures
+        for i, t in enumerate(self.temperatures):
+            setattr(self.chains[i], self.whichtemperature, t)
+
+    def tempered_score(self, i, t):
+        """ The score of the current sample of the chain at temperature i, at temperature t """
+        return self.chains[i].at_temperature(t, self.whichtemperature)
+
+    def swap(self, i):
+        """ Swap the chains at temperatures i and i+1 (and so their temperatures) """
+        self.chains[i], self.chains[i+1] = self.chains[i+1], self.chains[i]
+        tmp = getattr(self.chains[i], self.whichtemperature)
+        setattr(self.chains[i], self.whichtemperature, getattr(self.chains[i+1], self.whichtemperature))
+        setattr(self.chains[i+1], self.whichtemperature, tmp)
+
+    def set_temperatures(self, temperatures):
+        """ Set the temperature of each chain (in order) """
+        self.temperatures = temperatures
+        for c, t in zip(self.chains, temperatures):
+            setattr(c, self.whichtemperature, t)
 
     def get_hist(self, smoothed=0.001):
         """
@@ -62,10 +80,8 @@ class ParallelTemperingSampler(MultipleChainMCMC):
         for _ in xrange(self.swaps):
 
             i = randint(0, self.nchains-2)
-            cur  = self.chains[i].at_temperature(   self.temperatures[i],   self.whichtemperature) +\
-                   self.chains[i+1].at_temperature( self.temperatures[i+1], self.whichtemperature)
-            prop = self.chains[i].at_temperature(   self.temperatures[i+1], self.whichtemperature) +\
-                   self.chains[i+1].at_temperature( self.temperatures[i],   self.whichtemperature)
+            cur  = self.tempered_score(i,   self.temperatures[i]) + self.tempered_score(i+1, self.temperatures[i+1])
+            prop = self.tempered_score(i,   self.temperatures[i+1]) + self.tempered_score(i+1, self.temperatures[i])
 
             if self.print_swapstats:
                 print "# Proposing ", cur-prop, self.upswaps, [ float(a+0.01)/float(a+b+0.01) for a,b in zip(self.nup, self.ndown)]
@@ -74,21 +90,19 @@ class ParallelTemperingSampler(MultipleChainMCMC):
 
                 # update the counts
                 for idx in [i, i+1]:
-                    self.nup[idx]   += (self.chains[idx].updown==1)
-                    self.ndown[idx] += (self.chains[idx].updown==-1)
+                    self.nup[idx]   += (self.updown[idx]==1)
+                    self.ndown[idx] += (self.updown[idx]==-1)
 
-                self.chains[i], self.chains[i+1] = self.chains[i+1], self.chains[i]
-                tmp = getattr(self.chains[i], self.whichtemperature)
-                setattr(self.chains[i], self.whichtemperature, getattr(self.chains[i+1], self.whichtemperature))
-                setattr(self.chains[i+1], self.whichtemperature, tmp)
+                self.swap(i)
+                self.updown[i], self.updown[i+1] = self.updown[i+1], self.updown[i]
 
                 self.upswaps[i] += 1
 
                 # keep track of who is up and down
                 if i == 0:
-                    self.chains[i].updown = 1
+                    self.updown[i] = 1
                 elif i == self.nchains-2:
-                    self.chains[self.nchains-1].updown = -1
+                    self.updown[self.nchains-1] = -1
 
 
     def next(self):
@@ -77,12 +77,13 @@ class PartitionMCMC(MultipleChainMCMC):
 
             for n in p.subnodes():
                 # set to not resample these
-                setattr(n, 'resample_p', 0.0) ## NOTE: This is an old version of how proposals were made, but we use it here to store in each node a prob of being resampled
+                n.annotate(resample_p=0.0) ## NOTE: This is an old version of how proposals were made, but we use it here to store in each node a prob of being resampled
 
                 # and fill in the missing leaves with a random generation
                 for i, a in enumerate(n.args):
                     if grammar.is_nonterminal(a):
                         n.args[i] = grammar.generate(a)
+                n.invalidate()
         print "# Initialized %s partitions" % len(partitions)
 
         # initialize each chain
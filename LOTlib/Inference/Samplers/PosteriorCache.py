@@ -0,0 +1,174 @@
+"""
+    Caches of hypotheses' (prior, likelihood, posterior), for MemoizedMHSampler.
+
+    PosteriorCache keeps them in memory, and can be shared by the chains of one process (e.g. of MultipleChainMCMC
+    or ParallelTemperingSampler; see make_memoized_sampler). SQLitePosteriorCache keeps them in an sqlite file, so
+    that chains in different processes (e.g. of MultiprocessMCMC) or runs can share them.
+
+    Entries are keyed by key(h) (defaultly str(h)), and store the prior and likelihood as the hypothesis computes
+    them, so chains that share a cache must use the same data and hypotheses with the same prior and likelihood
+    temperatures. The samplers' own temperatures (as parallel tempering changes) don't matter.
+"""
+import os
+import sqlite3
+import sys
+from collections import OrderedDict
+
+from LOTlib.Miscellaneous import Infinity
+
+def entry_bytes(key, value):
+    """About how much memory an entry takes (its key, and its tuple of floats)."""
+    return sys.getsizeof(key) + sys.getsizeof(value) + sum(sys.getsizeof(x) for x in value)
+
+class PosteriorCache(object):
+    """
+        An in-memory cache of (prior, likelihood, posterior) for hypotheses. When it has more than maxsize entries,
+        or (about) more than maxbytes bytes of them, the least recently used are dropped.
+
+        key -- key(h) gives the key for h (by default, str(h))
+
+        NOTE: A cache pickles without its entries.
+    """
+
+    def __init__(self, maxsize=Infinity, maxbytes=Infinity, key=str):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.key = key
+        self.clear()
+
+    def clear(self):
+        self.entries = OrderedDict() # key -> (prior, likelihood, posterior), least recently used first
+        self.nbytes = 0
+        self.hits, self.misses, self.evictions = 0, 0, 0
+
+    def __getstate__(self):
+        return (self.maxsize, self.maxbytes, self.key)
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __str__(self):
+        return "<PosteriorCache: %i entries (%i bytes), %i hits, %i misses, %i evictions>" % \
+               (len(self), self.nbytes, self.hits, self.misses, self.evictions)
+
+    def get(self, key):
+        """Return (prior, likelihood, posterior) for key, or None if we don't have it."""
+        value = self.entries.pop(key, None)
+        if value is None:
+            self.misses += 1
+        else:
+            self.entries[key] = value # now the most recent
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.nbytes -= entry_bytes(key, old)
+
+        self.entries[key] = value
+        self.nbytes += entry_bytes(key, value)
+
+        while self.entries and (len(self.entries) > self.maxsize or self.nbytes > self.maxbytes):
+            k, v = self.entries.popitem(last=False)
+            self.nbytes -= entry_bytes(k, v)
+            self.evictions += 1
+
+class SQLitePosteriorCache(PosteriorCache):
+    """
+        A PosteriorCache kept in the sqlite file path, which processes (and later runs) can share. Each process opens
+        its own connection (even if it got the cache by forking or unpickling), and counts its own hits, misses, and
+        evictions.
+
+        Every check_every stores, if there are more than maxsize entries, or (about) more than maxbytes bytes of
+        them, the oldest are dropped (the first stored, not the least recently used, so that hits don't write).
+
+        NOTE: This is a cache, so we don't wait for writes to reach the disk, and a store that can't get a lock in
+              timeout seconds is skipped.
+    """
+    ROW_BYTES = 40 # about what sqlite takes for a row, besides its key
+
+    def __init__(self, path, maxsize=Infinity, maxbytes=Infinity, key=str, check_every=100, timeout=60.0):
+        self.path = path
+        self.check_every = check_every
+        self.timeout = timeout
+        self.connection, self.pid = None, None
+        PosteriorCache.__init__(self, maxsize=maxsize, maxbytes=maxbytes, key=key)
+
+    def clear(self):
+        """Reset our counters. (This does not drop the entries, which other processes may be using.)"""
+        self.hits, self.misses, self.evictions = 0, 0, 0
+        self.nstored = 0
+
+    def __getstate__(self):
+        return (self.path, self.maxsize, self.maxbytes, self.key, self.check_every, self.timeout)
+
+    def connect(self):
+        """Our connection to the file (opening it, and making the table, if this process hasn't)."""
+        if self.connection is None or self.pid != os.getpid():
+            self.connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            self.connection.text_factory = str
+            self.pid = os.getpid()
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=OFF")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS posteriors "
+                                    "(key TEXT PRIMARY KEY, prior REAL, likelihood REAL, posterior REAL)")
+        return self.connection
+
+    def __len__(self):
+        return self.connect().execute("SELECT COUNT(*) FROM posteriors").fetchone()[0]
+
+    def __str__(self):
+        return "<SQLitePosteriorCache %s: %i entries, %i hits, %i misses, %i evictions>" % \
+               (self.path, len(self), self.hits, self.misses, self.evictions)
+
+    def get(self, key):
+        row = self.connect().execute("SELECT prior, likelihood, posterior FROM posteriors WHERE key=?",
+                                     (key,)).fetchone()
+        if row is None or None in row: # sqlite stores nan as NULL
+            self.misses += 1
+            return None
+        else:
+            self.hits += 1
+            return row
+
+    def set(self, key, value):
+        try:
+            self.connect().execute("INSERT OR REPLACE INTO posteriors VALUES (?, ?, ?, ?)", (key,) + tuple(value))
+        except sqlite3.OperationalError: # locked
+            return
+
+        self.nstored += 1
+        if self.nstored % self.check_every == 0:
+            self.evict()
+
+    def evict(self):
+        """Drop the oldest entries until we're within maxsize and maxbytes."""
+        c = self.connect()
+        n, nbytes = c.execute("SELECT COUNT(*), TOTAL(LENGTH(key)) + ? * COUNT(*) FROM posteriors",
+                              (self.ROW_BYTES,)).fetchone()
+        if n <= self.maxsize and nbytes <= self.maxbytes:
+            return
+
+        # find the newest entry we need to drop
+        last, dropped = None, 0
+        rows = c.execute("SELECT rowid, LENGTH(key) + ? FROM posteriors ORDER BY rowid", (self.ROW_BYTES,))
+        for rowid, size in rows:
+            if n - dropped <= self.maxsize and nbytes <= self.maxbytes:
+                break
+            last, dropped, nbytes = rowid, dropped + 1, nbytes - size
+        rows.close()
+
+        try:
+            c.execute("DELETE FROM posteriors WHERE rowid <= ?", (last,))
+            self.evictions += dropped
+        except sqlite3.OperationalError:
+            pass
+
+    def close(self):
+        if self.connection is not None and self.pid == os.getpid():
+            self.connection.close()
+        self.connection = None
@@ -6,7 +6,7 @@ from numpy import log, exp
 from scipy.stats import chisquare
 
 from LOTlib import break_ctrlc
-from LOTlib.Miscellaneous import logsumexp, attrmem
+from LOTlib.Miscellaneous import logsumexp, attrmem, Infinity
 from MetropolisHastings import MHSampler
 
 
@@ -74,6 +74,317 @@ class TestMetropolisHastings(unittest.TestCase):
 
 
 
+from LOTlib.DefaultGrammars import finiteTestGrammar
+from LOTlib.Hypotheses.LOTHypothesis import LOTHypothesis
+from LOTlib.Inference.Samplers.MultipleChainMCMC import MultipleChainMCMC
+from LOTlib.Inference.Samplers.MultiprocessMCMC import MultiprocessMCMC
+
+class PriorHypothesis(LOTHypothesis):
+    """ A hypothesis whose posterior is its prior (at module level, so that samples can be pickled) """
+    def __init__(self, **kwargs):
+        LOTHypothesis.__init__(self, grammar=finiteTestGrammar, **kwargs)
+
+    @attrmem('likelihood')
+    def compute_likelihood(self, *args, **kwargs):
+        return 0.0
+
+class TestMultiprocessMCMC(unittest.TestCase):
+    def runTest(self):
+        print "# Testing chains in worker processes"
+
+        # MultipleChainMCMC uses make_sampler if given one
+        made = []
+        def make_sampler(make_h0, data, **kwargs):
+            made.append(kwargs['steps'])
+            return MHSampler(make_h0(), data, **kwargs)
+        self.assertEqual(len(list(MultipleChainMCMC(PriorHypothesis, [], steps=30, nchains=3,
+                                                    make_sampler=make_sampler))), 30)
+        self.assertEqual(made, [10, 10, 10])
+
+        # each chain does the same whatever the number of processes
+        runs = []
+        for nprocesses in [1, 3]:
+            sampler = MultiprocessMCMC(PriorHypothesis, [], steps=200, nchains=4, nprocesses=nprocesses, batch=7, seed=3)
+            chains = [[] for _ in xrange(4)]
+            for h in sampler:
+                chains[sampler.chain_idx].append(str(h))
+            self.assertEqual(map(len, chains), [50, 50, 50, 50])
+            runs.append(chains)
+        self.assertEqual(runs[0], runs[1])
+        self.assertNotEqual(runs[0][0], runs[0][1])
+
+        # and the counters and state are the chains'
+        sampler = MultiprocessMCMC(PriorHypothesis, [], nchains=3, nprocesses=2, batch=10)
+        for _ in xrange(30):
+            sampler.next()
+        self.assertTrue(all(0.0 <= r <= 1.0 for r in sampler.acceptance_ratio()))
+        sampler.reset_counters()
+        self.assertTrue(all(r != r for r in sampler.acceptance_ratio())) # nan, with no proposals
+        h0 = PriorHypothesis()
+        sampler.set_state(h0)
+        self.assertEqual(map(str, sampler.call('get_state')), [str(h0)] * 3)
+        sampler.close()
+
+
+import random
+from LOTlib.Inference.Samplers.ParallelTempering import ParallelTemperingSampler
+from LOTlib.Inference.Samplers.MultiprocessParallelTempering import MultiprocessParallelTemperingSampler
+from LOTlib.Inference.Samplers.AdaptiveParallelTempering import MultiprocessAdaptiveParallelTemperingSampler
+
+class TestMultiprocessParallelTempering(unittest.TestCase):
+    def runTest(self):
+        print "# Testing parallel tempering in worker processes"
+        kwargs = dict(steps=400, temperatures=[1.0, 2.0, 4.0, 8.0], within_steps=5,
+                      whichtemperature='acceptance_temperature')
+
+        sampler = ParallelTemperingSampler(PriorHypothesis, [], **kwargs)
+        self.assertLessEqual(len(list(sampler)), 400) # it stops when the first chain does
+        self.assertEqual(len(sampler.get_hist()), 4)
+
+        # each run is the same whatever the number of processes
+        runs = []
+        for nprocesses in [1, 2]:
+            random.seed(1)
+            sampler = MultiprocessParallelTemperingSampler(PriorHypothesis, [], nprocesses=nprocesses, seed=5, **kwargs)
+            runs.append([(sampler.chain_idx, str(h)) for h in sampler])
+            self.assertEqual(len(runs[-1]), 400)
+            self.assertGreater(sum(sampler.upswaps), 0)
+            self.assertGreater(sum(sampler.nup) + sum(sampler.ndown), 0)
+        self.assertEqual(runs[0], runs[1])
+
+        # only the lowest temperature's samples
+        sampler = MultiprocessParallelTemperingSampler(PriorHypothesis, [], yield_only_t0=True, **kwargs)
+        self.assertEqual(set(sampler.chain_idx for h in sampler), set([0]))
+
+        # adapting the temperatures
+        sampler = MultiprocessAdaptiveParallelTemperingSampler(PriorHypothesis, [], adapt_at=[200], **kwargs)
+        self.assertEqual(len(list(sampler.take(300))), 300)
+        self.assertNotEqual(sampler.temperatures, kwargs['temperatures'])
+        self.assertEqual((sampler.temperatures[0], sampler.temperatures[-1]), (1.0, 8.0))
+        self.assertEqual(len(sampler.acceptance_ratio()), 4)
+        self.assertEqual(len(list(sampler)), 100)
+
+
+from LOTlib.Inference.Samplers.DelayedAcceptance import DelayedAcceptanceMHSampler
+
+class TestDelayedAcceptance(unittest.TestCase):
+    """
+    The two-stage sampler should still sample from the posterior
+    """
+    def runTest(self):
+        print "# Testing delayed acceptance"
+        random.seed(2)
+        from LOTlib.DataAndObjects import FunctionData
+        from LOTlib.DefaultGrammars import finiteTestGrammar as grammar
+
+        class MyH(LOTHypothesis):
+            # penalize big trees, by how much each datum says
+            def compute_single_likelihood(self, datum):
+                return -datum.output * len(str(self.value))
+
+            @attrmem('prior')
+            def compute_prior(self):
+                return grammar.log_probability(self.value)
+
+        data = [FunctionData(input=[], output=random.random() * 0.004) for _ in xrange(40)]
+
+        for fixed_subset in [False, True]:
+            cnt = Counter()
+            sampler = DelayedAcceptanceMHSampler(MyH(grammar=grammar), data, steps=3000, skip=3, subset_size=3,
+                                                 fixed_subset=fixed_subset)
+            for h in sampler:
+                cnt[h] += 1
+
+            self.assertGreater(sampler.stage1_rejections, 0)
+            self.assertEqual(sampler.stage1_rejections + sampler.stage2_rejections + sampler.acceptance_count,
+                             sampler.proposal_count)
+            self.assertAlmostEqual(sampler.stage1_rejection_ratio(),
+                                   float(sampler.stage1_rejections) / sampler.proposal_count)
+
+            trees = [t for t in cnt.keys()]
+            for t in trees:
+                t.compute_posterior(data)
+            Z = logsumexp([t.posterior_score for t in trees])
+            obsc = [cnt[t] for t in trees]
+            expc = [exp(t.posterior_score - Z) * sum(obsc) for t in trees]
+            # pool the rare trees, so the test is fair
+            big = [e >= 5 for e in expc]
+            obsc = [o for o, b in zip(obsc, big) if b] + [sum(o for o, b in zip(obsc, big) if not b)]
+            expc = [e for e, b in zip(expc, big) if b] + [sum(e for e, b in zip(expc, big) if not b)]
+            csq, pv = chisquare(obsc, expc)
+            print fixed_subset, sampler.stage1_rejection_ratio(), (csq, pv)
+            self.assertGreater(pv, 0.01, msg="Sampler failed chi squared!")
+
+        # if we start on a sample with zero posterior, every other proposal must be accepted (not a coin flip)
+        class ZeroStart(MyH):
+            def compute_single_likelihood(self, datum):
+                return -Infinity if self.value == h0.value else MyH.compute_single_likelihood(self, datum)
+
+        for _ in xrange(100):
+            h0 = ZeroStart(grammar=grammar)
+            sampler = DelayedAcceptanceMHSampler(h0, data, steps=1, subset_size=3)
+            h = sampler.next()
+            self.assertEqual(h.value == h0.value, sampler.proposal.value == h0.value)
+
+        # with a fixed subset, the current sample's screen is rescored when the temperatures change
+        sampler = DelayedAcceptanceMHSampler(MyH(grammar=grammar), data, steps=100, subset_size=3, fixed_subset=True)
+        sampler.next()
+        for t in [1.0, 5.0, 0.5]:
+            sampler.likelihood_temperature = sampler.prior_temperature = t
+            cur = sampler.current_sample
+            sampler.next()
+            self.assertIs(sampler.screened[0], cur)
+            self.assertEqual(sampler.screened[2], sampler.cheap_score(cur, sampler.subset))
+
+
+class TestShortcutLikelihood(unittest.TestCase):
+    """
+    Shortcutting the likelihood should give exactly the same chain, with fewer likelihood evaluations
+    """
+    def runTest(self):
+        print "# Testing shortcut likelihoods"
+        from math import log as mlog
+        from LOTlib.DataAndObjects import FunctionData
+        from LOTlib.DefaultGrammars import finiteTestGrammar as grammar
+
+        calls = Counter()
+        class MyH(LOTHypothesis):
+            # each datum is a letter that good hypotheses have in them
+            def compute_single_likelihood(self, datum):
+                calls[self.shortcut] += 1
+                return mlog(0.9 if datum.output in str(self.value) else 0.1)
+
+            @attrmem('prior')
+            def compute_prior(self):
+                return grammar.log_probability(self.value)
+
+        data = [FunctionData(input=[], output=x) for x in 'abcd' * 10]
+
+        chains = dict()
+        for shortcut in [False, True]:
+            random.seed(3)
+            h0 = MyH(grammar=grammar)
+            h0.shortcut = shortcut
+            sampler = MHSampler(h0, data, steps=300, shortcut_likelihood=shortcut)
+            chains[shortcut] = [(str(h), h.posterior_score) for h in sampler]
+            if shortcut:
+                self.assertGreater(sampler.shortcut_count, 0)
+            else:
+                self.assertEqual(sampler.shortcut_count, 0)
+
+        self.assertEqual(chains[False], chains[True])
+        self.assertLess(calls[True], calls[False])
+
+
+import os
+import shutil
+import tempfile
+from MemoizedMHSampler import MemoizedMHSampler, make_memoized_sampler
+from PosteriorCache import PosteriorCache, SQLitePosteriorCache
+
+class LetterHypothesis(LOTHypothesis):
+    """ Each datum is a letter that good hypotheses have in them (at module level, so that samples can be pickled) """
+    def __init__(self, **kwargs):
+        LOTHypothesis.__init__(self, grammar=finiteTestGrammar, **kwargs)
+
+    def compute_single_likelihood(self, datum):
+        return log(0.9 if datum.output in str(self.value) else 0.1)
+
+    @attrmem('prior')
+    def compute_prior(self):
+        return finiteTestGrammar.log_probability(self.value)
+
+class TestMemoizedMHSampler(unittest.TestCase):
+    """
+    Memoizing should give exactly the same chain as MHSampler, with fewer posterior evaluations, and a cache
+    should be shareable by chains and (on disk) by processes
+    """
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def make_data(self):
+        from LOTlib.DataAndObjects import FunctionData
+        return [FunctionData(input=[], output=x) for x in 'abcd' * 10]
+
+    def make_h0(self):
+        return LetterHypothesis()
+
+    def runTest(self):
+        print "# Testing MemoizedMHSampler"
+        data = self.make_data()
+
+        chains, calls = dict(), dict()
+        for cache in [None, PosteriorCache(), SQLitePosteriorCache(os.path.join(self.dir, 'cache.db'))]:
+            random.seed(3)
+            if cache is None:
+                sampler = MHSampler(self.make_h0(), data, steps=300)
+            else:
+                sampler = MemoizedMHSampler(self.make_h0(), data, steps=300, cache=cache)
+            chains[cache] = [(str(h), h.prior, h.likelihood, h.posterior_score) for h in sampler]
+            calls[cache] = sampler.posterior_calls
+
+            if cache is not None:
+                self.assertEqual(chains[cache], chains[None])
+                self.assertGreater(cache.hits, 0)
+                self.assertEqual(cache.hits + cache.misses, sampler.proposal_count)
+                self.assertLess(calls[cache], calls[None])
+
+        # shared across chains
+        cache = PosteriorCache()
+        sampler = MultipleChainMCMC(self.make_h0, data, steps=400, nchains=4, make_sampler=make_memoized_sampler(cache))
+        for h in sampler:
+            self.assertAlmostEqual(h.posterior_score, h.prior + h.likelihood)
+        self.assertTrue(all(c.cache is cache for c in sampler.chains))
+        self.assertEqual(cache.misses, sum(c.posterior_calls for c in sampler.chains))
+        self.assertGreater(cache.hits, 0)
+
+        # and across processes, through the disk
+        cache = SQLitePosteriorCache(os.path.join(self.dir, 'shared.db'))
+        sampler = MultiprocessMCMC(self.make_h0, data, steps=400, nchains=4, nprocesses=2, seed=1,
+                                   make_sampler=make_memoized_sampler(cache))
+        samples = [(str(h), h.prior, h.likelihood) for h in sampler]
+        self.assertEqual(len(samples), 400)
+        other = SQLitePosteriorCache(cache.path)
+        for s, prior, likelihood in samples:
+            self.assertEqual(other.get(s)[:2], (prior, likelihood))
+
+class TestPosteriorCache(unittest.TestCase):
+    """
+    Caches should stay within their sizes, and count what they do
+    """
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def runTest(self):
+        for cache in [PosteriorCache(maxsize=10), SQLitePosteriorCache(os.path.join(self.dir, 'cache.db'), maxsize=10,
+                                                                       check_every=1)]:
+            for i in xrange(25):
+                cache.set(str(i), (-1.0, -float(i), -1.0-i))
+            self.assertEqual(len(cache), 10)
+            self.assertEqual(cache.evictions, 15)
+            self.assertIsNone(cache.get('0'))
+            self.assertEqual(cache.get('24'), (-1.0, -24.0, -25.0))
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        cache = PosteriorCache(maxbytes=1000)
+        for i in xrange(100):
+            cache.set(str(i), (-1.0, -float(i), -1.0-i))
+        self.assertLessEqual(cache.nbytes, 1000)
+        self.assertGreater(len(cache), 0)
+        self.assertEqual(len(cache) + cache.evictions, 100)
+
+        # -inf round trips through the disk
+        cache = SQLitePosteriorCache(os.path.join(self.dir, 'inf.db'))
+        cache.set('x', (-float('inf'), -float('inf'), -float('inf')))
+        self.assertEqual(cache.get('x'), (-float('inf'),)*3)
+
+
 # class TestMetropolisHastings2(unittest.TestCase):
 #     Test the sampler, using the number model
     # def runTest(self):
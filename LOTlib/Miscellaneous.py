@@ -7,6 +7,7 @@ Miscellaneous functions for LOTlib.
 # Special handling to deal with numpypy (which actually tends to be slower for LOTlib)
 import collections
 import math
+from bisect import bisect_left
 from math import exp, log, pi
 from random import random, sample
 import re
@@ -465,7 +466,7 @@ def flip(p):
 
 # TODO: THIS FUNCTION SUCKS PLEASE FIX IT
 # TODO: Change this so that if N is large enough, you sort
-def weighted_sample(objs, N=1, probs=None, log=False, return_probability=False, returnlist=False, Z=None):
+def weighted_sample(objs, N=1, probs=None, log=False, return_probability=False, returnlist=False, Z=None, cumulative=None):
     """When we return_probability, it is *always* a log probability.
 
     Takes unnormalized probabilities and returns a list of the log probability and the object returnlist
@@ -475,6 +476,8 @@ def weighted_sample(objs, N=1, probs=None, log=False, return_probability=False,
 
     Note:
         This now can take probs as a function, which is then mapped!
+        If cumulative (the running sums of the unnormalized probabilities of objs) is given, probs and log
+        are ignored and we sample by binary search. Grammar.generate uses this with its cached tables.
 
     """
     # Check how probabilities are specified either as an argument, or attribute of objs (either probability
@@ -485,6 +488,25 @@ def weighted_sample(objs, N=1, probs=None, log=False, return_probability=False,
     if isinstance(objs, set):
         objs = list(objs)
 
+    if cumulative is not None:
+        assert len(cumulative) == len(objs), "*** cumulative must have one entry per object"
+        Z = cumulative[-1]
+        assert Z > 0
+
+        out = []
+        for n in range(N):
+            # the first i whose running sum reaches r*Z is the same one the linear walk below finds
+            i = min(bisect_left(cumulative, random()*Z), len(objs)-1)
+            if return_probability:
+                out.append([objs[i], math.log(cumulative[i] - (cumulative[i-1] if i > 0 else 0.0)) - math.log(Z)])
+            else:
+                out.append(objs[i])
+
+        if N == 1 and (not returnlist):
+            return out[0]
+        else:
+            return out
+
     myprobs = None
     if probs is None:   # Defaultly, we use .lp
         myprobs = [1.0] * len(objs)     # Sample uniform
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+    Compare the time to compile hypotheses by eval'ing str(h) and by building a python ast straight from the tree.
+
+    For each model we generate hypotheses from its grammar, check that both ways give the same outputs on the
+    model's data, and then time each, along with LOTHypothesis.compile_function when LOTlib.Eval's
+    compiled_function_cache already has the hypotheses (as when MCMC comes back to them).
+
+    NOTE: The ast builder lives here, not in LOTlib: on the Examples' trees it is 2-3.5x slower than eval, since
+          making python's ast objects and handing them back to compile() costs more than parsing the string.
+"""
+import ast
+import re
+from copy import deepcopy
+from keyword import iskeyword
+from optparse import OptionParser
+from time import time
+
+import LOTlib.Hypotheses.LOTHypothesis
+from LOTlib.Eval import compiled_function_cache
+from LOTlib.Examples import load_example
+from LOTlib.FunctionNode import BVAddFunctionNode, BVUseFunctionNode
+
+parser = OptionParser()
+parser.add_option("--hypotheses", dest="HYPOTHESES", type="int", default=300, help="Number of hypotheses per model")
+parser.add_option("--repetitions", dest="REPETITIONS", type="int", default=5, help="Times to compile each one")
+parser.add_option("--models", dest="MODELS", type="str", default='SymbolicRegression.Galileo,Magnetism.Simple,RationalRules,Number,FOL', help="Which models do we run on?")
+options, _ = parser.parse_args()
+
+# compile in the same namespace LOTHypothesis.compile_function does
+GLOBALS = vars(LOTlib.Hypotheses.LOTHypothesis)
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Building an ast from a tree, following pystring's rules
+
+class Unsupported(Exception):
+    pass
+
+identifier_regex = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+PLACEHOLDER = '__LOTlib_arg%i__'
+templates = dict() # (name, nargs) -> the parsed expression, with placeholders for the args
+
+class Substitute(ast.NodeTransformer):
+    def __init__(self, args):
+        self.args = args
+
+    def visit_Name(self, n):
+        if n.id.startswith('__LOTlib_arg'):
+            return self.args[int(n.id[len('__LOTlib_arg'):-2])]
+        return n
+
+def template(name, args):
+    key = (name, len(args))
+    if key not in templates:
+        try:
+            s = name % tuple(PLACEHOLDER % i for i in xrange(len(args))) if len(args) > 0 else name
+            templates[key] = ast.parse(s, mode='eval').body
+        except SyntaxError:
+            raise Unsupported(name)
+    return Substitute(args).visit(deepcopy(templates[key]))
+
+def node(cls, *args):
+    return cls(*args, lineno=1, col_offset=0)
+
+def name_ast(name):
+    if identifier_regex.match(name) and not iskeyword(name):
+        return node(ast.Name, name, ast.Load())
+    return template(name, [])
+
+def tree_ast(x, d=0, bv_names=None):
+    if isinstance(x, str):
+        return name_ast(x)
+    if bv_names is None:
+        bv_names = dict()
+
+    name, bvn = x.name, ''
+    if isinstance(x, BVAddFunctionNode):
+        bvn = x.added_rule.bv_prefix+str(d)
+        bv_names[x.added_rule.name] = bvn
+    elif isinstance(x, BVUseFunctionNode):
+        name = bv_names.get(name, name)
+    name = name.replace('<BV>', bvn)
+
+    args = x.args
+    if args is None:
+        ret = name_ast(name)
+    elif name == 'if_':
+        ret = node(ast.IfExp, *[tree_ast(a, d+1, bv_names) for a in args])
+    elif name == '':
+        ret = tree_ast(args[0], d+1, bv_names)
+    elif name == 'apply_':
+        ret = node(ast.Call, tree_ast(args[0], d+1, bv_names), [tree_ast(args[1], d+1, bv_names)], [], None, None)
+    elif '%s' in name:
+        ret = template(name, [tree_ast(a, d+1, bv_names) for a in args])
+    elif name == 'lambda':
+        params = [node(ast.Name, bvn, ast.Param())] if bvn else []
+        ret = node(ast.Lambda, ast.arguments(params, None, None, []), tree_ast(args[0], d+1, bv_names))
+    elif name == ',':
+        raise Unsupported(name)
+    else:
+        ret = node(ast.Call, name_ast(name), [tree_ast(a, d+1, bv_names) for a in args], [], None, None)
+
+    if isinstance(x, BVAddFunctionNode):
+        del bv_names[x.added_rule.name]
+    return ret
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# The ways to compile
+
+def compile_eval(h):
+    return eval(str(h), GLOBALS)
+
+def compile_ast(h):
+    params = [node(ast.Name, a, ast.Param()) for a in h.args]
+    lam = node(ast.Lambda, ast.arguments(params, None, None, []), tree_ast(h.value))
+    return eval(compile(ast.Expression(lam), '<LOTlib>', 'eval'), GLOBALS)
+
+def compile_cached(h):
+    return h.compile_function()
+
+def outputs(f, data):
+    # what f gives (or the kind of exception it raises) on each input
+    out = []
+    for di in data:
+        try:
+            out.append(f(*di.input))
+        except Exception as e:
+            out.append(type(e))
+    return out
+
+def time_it(f, hs):
+    start = time()
+    for _ in xrange(options.REPETITIONS):
+        for h in hs:
+            f(h)
+    return (time() - start) / (options.REPETITIONS * len(hs))
+
+if __name__ == "__main__":
+
+    print "\t".join(["model", "hypotheses", "unsupported", "eval.us", "ast.us", "cached.us", "ast.speedup"])
+
+    for model in options.MODELS.split(','):
+        make_hypothesis, make_data = load_example(model)
+        data = [di for di in make_data() if hasattr(di, 'input')]
+
+        hs, unsupported = [], 0
+        while len(hs) < options.HYPOTHESES:
+            h = make_hypothesis()
+            if h.value.count_nodes() > h.maxnodes:
+                continue
+
+            try:
+                f = compile_ast(h)
+            except Unsupported:
+                unsupported += 1
+                continue
+
+            a, b = outputs(f, data), outputs(compile_eval(h), data)
+            assert all(x == y or (x != x and y != y) for x, y in zip(a, b)), "*** Different outputs for %s" % h
+            hs.append(h)
+
+        teval = time_it(compile_eval, hs)
+        tast = time_it(compile_ast, hs)
+
+        compiled_function_cache.clear()
+        for h in hs:
+            compile_cached(h)
+        tcached = time_it(compile_cached, hs)
+
+        print "\t".join(map(str, [model, len(hs), unsupported, round(teval*1e6, 1), round(tast*1e6, 1),
+                                  round(tcached*1e6, 1), round(teval/tast, 2)]))
@@ -0,0 +1,280 @@
+"""
+    An immutable, hash-consed version of FunctionNode.
+
+    PersistentFunctionNodes never change, so they can share structure: a tree and a proposal to it share everything
+    except the path down to the node that was changed (see replace), and since every node is interned, identical
+    subtrees made anywhere in a run (e.g. across a chain, or in a TopN) are the same object. This means two
+    PersistentFunctionNodes are equal exactly when they are identical.
+
+    They have no parent references; instead, a node below a root is given by its path, the tuple of argument
+    indices followed from the root.
+
+    Use freeze(fn) to make one from a FunctionNode, and thaw() to get back a (new) FunctionNode. FunctionNode
+    annotations (like resample_p) are not kept.
+
+    NOTE: Interning goes by the bound variables' uuids, so unlike FunctionNode.__eq__, (lambda (x) x) and
+          (lambda (y) y) are different PersistentFunctionNodes unless they came from copies of the same tree.
+"""
+from copy import copy
+from math import log
+from random import random
+from weakref import WeakValueDictionary
+
+from LOTlib.FunctionNode import FunctionNode, BVAddFunctionNode, BVUseFunctionNode, NodeSamplingException, \
+    isFunctionNode, pystring
+from LOTlib.Miscellaneous import lambdaTrue, lambdaOne
+
+# All PersistentFunctionNodes that are still in use, keyed by their contents
+_interned = WeakValueDictionary()
+
+
+def isPersistentFunctionNode(x):
+    """Returns true if *x* is of type PersistentFunctionNode."""
+    return isinstance(x, PersistentFunctionNode)
+
+
+def freeze(fn):
+    """Return the PersistentFunctionNode for the FunctionNode *fn* (or fn, if it is not a FunctionNode)."""
+    if not isFunctionNode(fn):
+        return fn
+
+    args = None if fn.args is None else map(freeze, fn.args)
+
+    return PersistentFunctionNode(type(fn), fn.returntype, fn.name, args,
+                                  added_rule=fn.added_rule if isinstance(fn, BVAddFunctionNode) else None,
+                                  bv_prefix=getattr(fn, 'bv_prefix', None))
+
+
+class PersistentFunctionNode(object):
+    """An immutable FunctionNode. Calling the constructor returns the existing node if there is one.
+
+    Arguments
+    ---------
+    nodetype : class
+        The kind of FunctionNode this stands for (FunctionNode, BVAddFunctionNode, or BVUseFunctionNode)
+    returntype, name, args : as in FunctionNode
+        args must already be PersistentFunctionNodes (or strings)
+    added_rule : GrammarRule
+        The rule a BVAddFunctionNode adds
+    bv_prefix : str
+        The bv_prefix of a BVUseFunctionNode
+
+    Attributes
+    ----------
+    size : int
+        The number of nodes in this tree, so that we can sample nodes uniformly in O(depth)
+
+    """
+    __slots__ = ['nodetype', 'returntype', 'name', 'args', 'added_rule', 'bv_prefix', 'size', '_hash', '__weakref__']
+
+    def __new__(cls, nodetype, returntype, name, args, added_rule=None, bv_prefix=None):
+        if args is not None:
+            args = tuple(args)
+
+        key = (nodetype, returntype, name, args, None if added_rule is None else added_rule.name, bv_prefix)
+
+        x = _interned.get(key)
+        if x is None:
+            x = object.__new__(cls)
+            setslot = object.__setattr__
+            setslot(x, 'nodetype', nodetype)
+            setslot(x, 'returntype', returntype)
+            setslot(x, 'name', name)
+            setslot(x, 'args', args)
+            setslot(x, 'added_rule', added_rule)
+            setslot(x, 'bv_prefix', bv_prefix)
+            setslot(x, 'size', 1 + sum([a.size for a in x.argFunctionNodes()]))
+            setslot(x, '_hash', hash(key)) # the kids' hashes are stored, so this is quick
+            _interned[key] = x
+
+        return x
+
+    def __setattr__(self, k, v):
+        raise AttributeError("PersistentFunctionNodes cannot be changed; use replace to make a new tree")
+
+    def __delattr__(self, k):
+        raise AttributeError("PersistentFunctionNodes cannot be changed; use replace to make a new tree")
+
+    # Immutable, so there is never a need to copy
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        # unpickling goes through the constructor, so it is interned again
+        return (PersistentFunctionNode, (self.nodetype, self.returntype, self.name, self.args,
+                                         self.added_rule, self.bv_prefix))
+
+    def __hash__(self):
+        return self._hash
+
+    # Interned nodes are equal only if they are identical
+    def __eq__(self, other):
+        return self is other
+
+    def __ne__(self, other):
+        return self is not other
+
+    def __str__(self):
+        return pystring(self.thaw())
+
+    def __repr__(self):
+        return str(self)
+
+    def thaw(self, parent=None):
+        """Return a new FunctionNode for this tree."""
+        if self.nodetype is BVAddFunctionNode:
+            fn = BVAddFunctionNode(parent, self.returntype, self.name, None, added_rule=copy(self.added_rule))
+        elif self.nodetype is BVUseFunctionNode:
+            fn = BVUseFunctionNode(parent, self.returntype, self.name, None, bv_prefix=self.bv_prefix)
+        else:
+            fn = self.nodetype(parent, self.returntype, self.name, None)
+
+        if self.args is not None:
+            fn.args = [a.thaw(parent=fn) if isPersistentFunctionNode(a) else a for a in self.args]
+
+        return fn
+
+    # --------------------------------------------------------------------------------------------------------
+    # The parts of FunctionNode's interface that make sense without parents, so that Grammar.log_probability and
+    # LOTHypothesis work with these
+
+    def get_rule_signature(self):
+        """ See FunctionNode.get_rule_signature """
+        sig = [self.returntype, self.name]
+        if self.args is not None:
+            sig.extend([a.returntype if isPersistentFunctionNode(a) else a for a in self.args])
+        return tuple(sig)
+
+    def argFunctionNodes(self):
+        """Yield the PersistentFunctionNodes immediately below."""
+        if self.args is not None:
+            for a in self.args:
+                if isPersistentFunctionNode(a):
+                    yield a
+
+    def __iter__(self):
+        """Iterate over subnodes. Identical subtrees are yielded once for each place they occur."""
+        yield self
+
+        for a in self.argFunctionNodes():
+            for ssn in a:
+                yield ssn
+
+    def count_nodes(self, predicate=lambdaTrue):
+        return self.count_subnodes(predicate=predicate)
+
+    def count_subnodes(self, predicate=lambdaTrue):
+        """Returns the subnode count."""
+        if predicate is lambdaTrue:
+            return self.size
+        else:
+            return len(filter(predicate, self))
+
+    # --------------------------------------------------------------------------------------------------------
+    # Paths
+
+    def iterate_paths(self, path=()):
+        """Yield (path, node) for every subnode."""
+        yield path, self
+
+        if self.args is not None:
+            for i, a in enumerate(self.args):
+                if isPersistentFunctionNode(a):
+                    for x in a.iterate_paths(path + (i,)):
+                        yield x
+
+    def get(self, path):
+        """Return the node at path."""
+        x = self
+        for i in path:
+            x = x.args[i]
+        return x
+
+    def nodes_on_path(self, path):
+        """Yield the nodes from here down to (and including) the node at path."""
+        x = self
+        yield x
+        for i in path:
+            x = x.args[i]
+            yield x
+
+    def replace(self, path, new):
+        """Return a tree that is this one with the node at path replaced by new.
+
+        Only the nodes on the path are rebuilt; everything else is shared with this tree.
+
+        """
+        if len(path) == 0:
+            return new
+
+        args = list(self.args)
+        args[path[0]] = args[path[0]].replace(path[1:], new)
+
+        return PersistentFunctionNode(self.nodetype, self.returntype, self.name, args,
+                                      added_rule=self.added_rule, bv_prefix=self.bv_prefix)
+
+    def sample_node_normalizer(self, resampleProbability=lambdaOne):
+        """ See FunctionNode.sample_node_normalizer """
+        if resampleProbability is lambdaOne:
+            return float(self.size)
+        else:
+            return sum([1.0*resampleProbability(x) for x in self])
+
+    def sample_subnode(self, resampleProbability=lambdaOne):
+        """Sample a subnode at random, returning its path and the log probability of sampling it.
+
+        With the default resampleProbability, this only walks down to the node it samples.
+
+        """
+        if resampleProbability is lambdaOne:
+            r = int(random() * self.size)
+            path, x = [], self
+            while r > 0:
+                r -= 1 # skip x itself
+                for i, a in enumerate(x.args):
+                    if isPersistentFunctionNode(a):
+                        if r < a.size:
+                            path.append(i)
+                            x = a
+                            break
+                        r -= a.size
+
+            return tuple(path), -log(self.size)
+
+        Z = self.sample_node_normalizer(resampleProbability=resampleProbability)
+        if not (Z > 0.0):
+            raise NodeSamplingException
+
+        r = random() * Z
+        for path, x in self.iterate_paths():
+            p = 1.0*resampleProbability(x)
+            r -= p
+            if r <= 0.0 and p > 0.0:
+                return path, log(p) - log(Z)
+
+        assert False, "*** Should not get here in sample_subnode"
+
+
+class BVPathContextManager(object):
+    """
+        Like BVRuleContextManager(grammar, n.parent, recurse_up=True) for the node n at path below root: this adds
+        to grammar the bound variable rules of all the nodes above n.
+    """
+
+    def __init__(self, grammar, root, path):
+        self.grammar = grammar
+        self.added_rules = [x.added_rule for x in root.nodes_on_path(path[:-1]) if x.added_rule is not None] \
+            if len(path) > 0 else []
+
+    def __enter__(self):
+        for r in self.added_rules:
+            self.grammar.add_bv_rule(r)
+
+    def __exit__(self, t, value, traceback):
+        for r in reversed(self.added_rules): # last in, first out, as BVRuleContextManager
+            self.grammar.remove_bv_rule(r)
+
+        return False # re-raise exceptions
@@ -15,75 +15,75 @@ E = math.e
 # Basic arithmetic
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-@primitive
+@primitive(pure=True)
 def negative_(x): return -x
 def neg_(x): return -x
 
-@primitive
+@primitive(pure=True)
 def plus_(x,y): return x+y
 
-@primitive
+@primitive(pure=True)
 def times_(x,y): return x*y
 
-@primitive
+@primitive(pure=True)
 def divide_(x,y):
     if y != 0.: return x/y
     else:     return float("inf")*x
 
-@primitive
+@primitive(pure=True)
 def subtract_(x,y): return x-y
 
-@primitive
+@primitive(pure=True)
 def minus_(x,y): return x-y
 
-@primitive
+@primitive(pure=True)
 def sin_(x):
     try:
         return math.sin(x)
     except: return float("nan")
 
-@primitive
+@primitive(pure=True)
 def cos_(x):
     try:
         return math.cos(x)
     except: return float("nan")
 
-@primitive
+@primitive(pure=True)
 def tan_(x):
     try:
         return math.tan(x)
     except: return float("nan")
 
-@primitive
+@primitive(pure=True)
 def sqrt_(x):
     try: return math.sqrt(x)
     except: return float("nan")
 
-@primitive
+@primitive(pure=True)
 def pow_(x,y):
     #print x,y
     try: return pow(x,y)
     except: return float("nan")
 
-@primitive
+@primitive(pure=True)
 def powf_(x,y):
     try: return pow(float(x),float(y))
     except: return float("nan")
 
-@primitive
+@primitive(pure=True)
 def ipowf_(x,y):
     try: return int(pow(float(x),float(y)))
     except: return float("nan")
 
 
-@primitive
+@primitive(pure=True)
 def abspow_(x,y):
     """ Absolute power. sign(x)*abs(x)**y """
     #print x,y
     try: return sign(x)*pow(abs(x),y)
     except: return float("nan")
 
-@primitive
+@primitive(pure=True)
 def exp_(x):
     try:
         r = math.exp(x)
@@ -91,7 +91,7 @@ def exp_(x):
     except:
         return float("inf")*x
 
-@primitive
+@primitive(pure=True)
 def abs_(x):
     try:
         r = abs(x)
@@ -100,44 +100,44 @@ def abs_(x):
         return float("inf")*x
 
 
-@primitive
+@primitive(pure=True)
 def log_(x):
     if x > 0: return math.log(x)
     else: return -float("inf")
 
-@primitive
+@primitive(pure=True)
 def log2_(x):
     if x > 0: return math.log(x)/math.log(2.0)
     else: return -float("inf")
 
-@primitive
+@primitive(pure=True)
 def pow2_(x):
     return math.pow(2.0,x)
 
-@primitive
+@primitive(pure=True)
 def mod_(x,y):
     if y==0.0 or math.isnan(x) or math.isnan(y):
         return float("nan")
     return x % y
 
-@primitive
+@primitive(pure=True)
 def gt_(x, y):
     return (x>y)
 
-@primitive
+@primitive(pure=True)
 def geq_(x, y):
     return (x>=y)
 
 
-@primitive
+@primitive(pure=True)
 def lt_(x, y):
     return (x<y)
 
-@primitive
+@primitive(pure=True)
 def leq_(x, y):
     return (x<=y)
 
-@primitive
+@primitive(pure=True)
 def eequals_(x, y, epsilon=0.0001):
     """
     Equals up to some epsilon
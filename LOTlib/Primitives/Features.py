@@ -4,20 +4,20 @@ from LOTlib.Eval import primitive
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
 # Some of our own primitivesS
-@primitive
+@primitive(pure=True)
 def is_color_(x,y): return (x.color == y)
 
-@primitive
+@primitive(pure=True)
 def is_shape_(x,y): return (x.shape == y)
 
-@primitive
+@primitive(pure=True)
 def is_pattern_(x,y): return (x.pattern == y)
 
-@primitive
+@primitive(pure=True)
 def isattr_(x,a,y):
     return getattr(x,a) == y
 
-@primitive
+@primitive(pure=True)
 def switch_(i,*ar):
     """
         Index into an array. NOTE: with run-time priors, the *entire* array gets evaluated.
@@ -57,7 +57,7 @@ def fold_(f, initial, lst):
     else:
         return f( lst[0], fold_(f, initial, lst[1:]))
 
-@primitive
+@primitive(pure=True)
 def reverse_(lst):
     return lst[::-1]
 
@@ -74,25 +74,25 @@ def map_(f,A):
 def apply_(f,*args):
     return f(*args)
 
-@primitive
+@primitive(pure=True)
 def cons_(x,y):
     return [x,y]
 
-@primitive
+@primitive(pure=True)
 def cdr_(x):
     try:    return x[1:]
     except IndexError: return []
 
-@primitive
+@primitive(pure=True)
 def rest_(x):
     return cdr_(x)
 
-@primitive
+@primitive(pure=True)
 def car_(x):
     try:    return x[0]
     except IndexError: return []
 
-@primitive
+@primitive(pure=True)
 def first_(x):
     return car_(x)
 
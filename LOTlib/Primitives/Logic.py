@@ -5,79 +5,79 @@ import itertools
 # Basic logic
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-@primitive
+@primitive(pure=True)
 def id_(A): return A # an identity function
 
-@primitive
+@primitive(pure=True)
 def and_(A,B): return (A and B)
 
-@primitive
+@primitive(pure=True)
 def AandnotB_(A,B): return (A and (not B))
 
-@primitive
+@primitive(pure=True)
 def notAandB_(A,B): return ((not A) and B)
 
-@primitive
+@primitive(pure=True)
 def AornotB_(A,B): return (A or (not B))
 
-@primitive
+@primitive(pure=True)
 def A_(A,B): return A
 
-@primitive
+@primitive(pure=True)
 def notA_(A,B): return not A
 
-@primitive
+@primitive(pure=True)
 def B_(A,B): return B
 
-@primitive
+@primitive(pure=True)
 def notB_(A,B): return not B
 
-@primitive
+@primitive(pure=True)
 def nand_(A,B): return not (A and B)
 
-@primitive
+@primitive(pure=True)
 def or_(A,B): return (A or B)
 
-@primitive
+@primitive(pure=True)
 def nor_(A,B): return not (A or B)
 
-@primitive
+@primitive(pure=True)
 def xor_(A,B): return (A and (not B)) or ((not A) and B)
 
-@primitive
+@primitive(pure=True)
 def not_(A): return (not A)
 
-@primitive
+@primitive(pure=True)
 def implies_(A,B): return (A or (not B))
 
-@primitive
+@primitive(pure=True)
 def iff_(A,B): return ((A and B) or ((not A) and (not B)))
 
-@primitive
+@primitive(pure=True)
 def if_(C,X,Y):
     if C: return X
     else: return Y
 
-@primitive
+@primitive(pure=True)
 def gt_(x,y): return x>y
 
-@primitive
+@primitive(pure=True)
 def gte_(x,y): return x>=y
 
-@primitive
+@primitive(pure=True)
 def lt_(x,y): return x<y
 
-@primitive
+@primitive(pure=True)
 def lte_(x,y): return x<=y
 
-@primitive
+@primitive(pure=True)
 def eq_(x,y): return x==y
 
-@primitive
+@primitive(pure=True)
 def zero_(x,y): return x==0.0
 
 
-@primitive
+@primitive(pure=True)
 def streq_(x,y): return str(x)==str(y)
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
@@ -27,20 +27,20 @@ word_to_number['undef'] = 'U'
 
 prev_hash[None] = None
 
-@primitive
+@primitive(pure=True)
 def next_(w): return next_hash[w]
 
-@primitive
+@primitive(pure=True)
 def prev_(w): return prev_hash[w]
 
-@primitive
+@primitive(pure=True)
 def ifU_(C,X):
     if C:
         return X
     else:
         return 'undef'
 
-@primitive
+@primitive(pure=True)
 def ends_in_(n, d):
     """Return `n` if it ends with digit `d`, 0 otherwise. E.g. ends_in_(427, 7) == 427"""
 
@@ -49,7 +49,7 @@ def ends_in_(n, d):
     else:
         return 0
 
-@primitive
+@primitive(pure=True)
 def contains_digit_(n, d):
     """Return `n` if it contains digit `d`, 0 otherwise. E.g. contains_digit_(86, 8) == 86"""
     if str(n) == 'nan':
@@ -59,7 +59,7 @@ def contains_digit_(n, d):
     else:
         return 0
 
-@primitive
+@primitive(pure=True)
 def isprime_(n):
     """Is `n` a prime number?"""
     if n > 1000 or str(n) == 'nan':
@@ -75,11 +75,11 @@ def isprime_(n):
 
     return n
 
-@primitive
+@primitive(pure=True)
 def primes_in_set_(A):
     return [n for n in A if isprime_(n)]
 
-@primitive
+@primitive(pure=True)
 def in_domain_(A, domain):
     return [n for n in A if (n <= domain)]
 
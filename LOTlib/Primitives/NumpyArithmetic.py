@@ -0,0 +1,190 @@
+"""
+    Numpy versions of the primitives in Arithmetic, so that a hypothesis can be run on a whole vector of inputs in
+    one call (see LOTHypothesis.get_vectorized_function). Each gives, elementwise, what the scalar version gives,
+    including its nans and infs (e.g. pow_ is nan where python's pow would overflow).
+
+    These are registered as the vectorized versions of the scalar ones (see LOTlib.Eval.PrimitiveInfo), and
+    namespace() gives the globals to evaluate in. Primitives without one (e.g. pow2_, which can raise) can't be
+    vectorized.
+
+    Ints keep python 2's semantics: divide_ of two ints floor-divides, and pow_ and mod_ of ints give ints. Where
+    the elements can't all agree with the scalar version (e.g. an int divided by 0 is inf, but by anything else an
+    int; or an int result too big for numpy's int64), we raise NotVectorizable, and callers use the scalar version.
+    Calls on scalars (e.g. constant subtrees) just call the scalar version. Operators in format names, like
+    '(%s * %s)', are compiled (by vectorized_code) into calls to these too, so they get the same checks.
+"""
+import ast
+import re
+import numpy
+
+import Arithmetic
+from Arithmetic import PI, TAU, E
+from LOTlib.FunctionNode import isFunctionNode
+from LOTlib.Eval import register_vectorized, vectorized_primitives
+
+inf = float("inf")
+nan = float("nan")
+max_int = 2**62 # the biggest int we'll let numpy's int64s compute
+
+class NotVectorizable(Exception):
+    """Raised when a vectorized primitive can't give what the scalar one would on every element."""
+    pass
+
+def isint(x):
+    return numpy.asarray(x).dtype.kind in 'biu'
+
+def ints(x):
+    # bools as ints, as python's arithmetic treats them
+    return numpy.asarray(x, dtype=numpy.int64) if numpy.asarray(x).dtype.kind == 'b' else x
+
+def biggest(x):
+    return int(numpy.max(numpy.abs(x))) if numpy.size(x) > 0 else 0
+
+def scalar(name, *args):
+    """If args are all scalars, what the scalar primitive name gives on them (as python numbers), else None."""
+    if all(numpy.ndim(a) == 0 for a in args):
+        return getattr(Arithmetic, name)(*[a.item() if isinstance(a, numpy.generic) else a for a in args])
+
+def negative_(x): return -ints(x)
+
+def plus_(x,y):
+    s = scalar('plus_', x, y)
+    if s is not None:
+        return s
+    if isint(x) and isint(y) and biggest(x) + biggest(y) > max_int:
+        raise NotVectorizable
+    return ints(x)+ints(y)
+
+def times_(x,y):
+    s = scalar('times_', x, y)
+    if s is not None:
+        return s
+    if isint(x) and isint(y) and biggest(x) * biggest(y) > max_int:
+        raise NotVectorizable
+    return ints(x)*ints(y)
+
+def divide_(x,y):
+    s = scalar('divide_', x, y)
+    if s is not None:
+        return s
+    if isint(x) and isint(y):
+        if numpy.any(numpy.asarray(y) == 0):
+            raise NotVectorizable # inf or nan there, ints elsewhere
+        return numpy.floor_divide(ints(x), ints(y))
+    x, y = numpy.asarray(x, dtype=float), numpy.asarray(y, dtype=float)
+    return numpy.where(y != 0., x / numpy.where(y != 0., y, 1.), inf*x)
+
+def subtract_(x,y): return plus_(x, negative_(y))
+
+def minus_(x,y): return plus_(x, negative_(y))
+
+def sin_(x): return numpy.sin(x)
+
+def cos_(x): return numpy.cos(x)
+
+def tan_(x): return numpy.tan(x)
+
+def sqrt_(x): return numpy.sqrt(x)
+
+def pow_(x,y):
+    s = scalar('pow_', x, y)
+    if s is not None:
+        return s
+    if isint(x) and isint(y): # exact ints, as python's
+        if numpy.any(numpy.asarray(y) < 0) or \
+                (biggest(x) > 1 and numpy.max(y) * numpy.log2(biggest(x)) >= numpy.log2(max_int)):
+            raise NotVectorizable
+        return numpy.power(ints(x), ints(y))
+    # python's pow raises (and so pow_ gives nan) on overflow and on 0 to a negative power
+    r = numpy.power(numpy.asarray(x, dtype=float), y)
+    return numpy.where(numpy.isinf(r) & numpy.isfinite(x) & numpy.isfinite(y), nan, r)
+
+def exp_(x): return numpy.exp(x)
+
+def abs_(x): return numpy.abs(ints(x))
+
+def log_(x):
+    x = numpy.asarray(x, dtype=float)
+    return numpy.where(x > 0, numpy.log(numpy.where(x > 0, x, 1.)), -inf)
+
+def log2_(x):
+    x = numpy.asarray(x, dtype=float)
+    return numpy.where(x > 0, numpy.log(numpy.where(x > 0, x, 1.))/numpy.log(2.0), -inf)
+
+def mod_(x,y):
+    s = scalar('mod_', x, y)
+    if s is not None:
+        return s
+    if isint(x) and isint(y):
+        if numpy.any(numpy.asarray(y) == 0):
+            raise NotVectorizable # nan there, ints elsewhere
+        return numpy.mod(ints(x), ints(y))
+    x, y = numpy.asarray(x, dtype=float), numpy.asarray(y, dtype=float)
+    return numpy.where((y == 0.0) | numpy.isnan(x) | numpy.isnan(y), nan, numpy.mod(x, numpy.where(y == 0.0, 1., y)))
+
+def gt_(x, y): return numpy.greater(x, y)
+
+def geq_(x, y): return numpy.greater_equal(x, y)
+
+def lt_(x, y): return numpy.less(x, y)
+
+def leq_(x, y): return numpy.less_equal(x, y)
+
+for f in [negative_, plus_, times_, divide_, subtract_, minus_, sin_, cos_, tan_, sqrt_, pow_, exp_, abs_, log_,
+          log2_, mod_, gt_, geq_, lt_, leq_]:
+    register_vectorized(f.__name__, f)
+
+constants = dict(PI=PI, TAU=TAU, E=E)
+
+def namespace():
+    """The globals for evaluating vectorized functions: the constants, and every vectorized primitive."""
+    return dict(vectorized_primitives, **constants)
+
+class CheckedOperators(ast.NodeTransformer):
+    """Replace +, - and * (and unary -) with calls to plus_, minus_, times_ and negative_."""
+    binary = {ast.Add: 'plus_', ast.Sub: 'minus_', ast.Mult: 'times_'}
+
+    def call(self, name, args, n):
+        return ast.copy_location(ast.Call(ast.Name(name, ast.Load()), args, [], None, None), n)
+
+    def visit_BinOp(self, n):
+        self.generic_visit(n)
+        name = self.binary.get(type(n.op))
+        return self.call(name, [n.left, n.right], n) if name is not None else n
+
+    def visit_UnaryOp(self, n):
+        self.generic_visit(n)
+        return self.call('negative_', [n.operand], n) if isinstance(n.op, ast.USub) else n
+
+def vectorized_code(s):
+    """Compile the python expression s to evaluate in namespace(), with its operators going through the
+    vectorized primitives (so that ints are checked for overflow)."""
+    tree = CheckedOperators().visit(ast.parse(s, mode='eval'))
+    return compile(ast.fix_missing_locations(tree), '<vectorized>', 'eval')
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Which trees we can vectorize
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+# format names that only add, subtract, or multiply their args, like '(%s + %s)'
+operator_regex = re.compile(r"^[\s()+\-*]*(%s[\s()+\-*]*)+$")
+number_regex = re.compile(r"^-?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?$")
+
+def vectorizable(t, args):
+    """Is everything in the tree t (with arguments args) a vectorized primitive, operator, argument, constant, or
+    number?"""
+    def terminal_ok(name):
+        return name in args or name in constants or name in vectorized_primitives or \
+            number_regex.match(name) is not None
+
+    for n in t:
+        if n.args is None:
+            if not terminal_ok(n.name):
+                return False
+        else:
+            if not (n.name in vectorized_primitives or n.name == '' or
+                    (operator_regex.match(n.name) and '**' not in n.name)):
+                return False
+            if not all(isFunctionNode(a) or terminal_ok(a) for a in n.args):
+                return False
+    return True
@@ -4,14 +4,14 @@ from LOTlib.Eval import primitive
 # For language / semantics
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-@primitive
+@primitive(pure=True)
 def presup_(a,b):
     if a: return b
     else:
         if b: return "undefT" # distinguish these so that we can get presup out
         else: return "undefF"
 
-@primitive
+@primitive(pure=True)
 def is_undef_(x):
     return is_undef(x)
 
@@ -21,7 +21,7 @@ def is_undef(x):
     else:
         return (x is None) or (x =="undefT") or (x == "undefF") or (x == "undef")
 
-@primitive
+@primitive(pure=True)
 def collapse_undef(x):
     """
         Change undefT->True and undefF->False
@@ -5,7 +5,7 @@ from math import isnan, isinf
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 # Set-theoretic primitives
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-@primitive
+@primitive(pure=True)
 def set_(*args):
     """
     NOTE: This makes a set from args, but it has the property that when called with a string, it doesn't break
@@ -16,21 +16,21 @@ def set_(*args):
         out.add(a)
     return out
 
-@primitive
+@primitive(pure=False) # changes s
 def set_add_(x,s):
     s.add(x)
     return s
 
-@primitive
+@primitive(pure=True)
 def union_(A,B): return A.union(B)
 
-@primitive
+@primitive(pure=True)
 def intersection_(A,B): return A.intersection(B)
 
-@primitive
+@primitive(pure=True)
 def setdifference_(A,B): return A.difference(B)
 
-@primitive
+@primitive(pure=True)
 def select_(A): # choose an element, but don't remove it
 
     try: # quick selecting without copying
@@ -45,58 +45,58 @@ def select_(A): # choose an element, but don't remove it
     #else: return set() # empty set
 
 
-@primitive
+@primitive(pure=True)
 def issubset_(A, B): return A.issubset(B)
 
 from random import sample as random_sample
-@primitive
+@primitive(stochastic=True)
 def sample_unique_(S):
     return random_sample(S,1)[0]
 
 from random import choice as random_choice
-@primitive
+@primitive(stochastic=True)
 def sample_(S):
     if len(S) == 0: return set()
     else:           return random_choice(list(S))
 
 
-@primitive
+@primitive(pure=True)
 def exhaustive_(A,B): return coextensive(A,B)
 
-@primitive
+@primitive(pure=True)
 def coextensive_(A,B): return coextensive(A,B)
 def coextensive(A,B): # are the two sets coextensive?
     #print A,B
     return (A.issubset(B) and B.issubset(A))
 
-@primitive
+@primitive(pure=True)
 def equal_(A,B): return (A == B)
 
-@primitive
+@primitive(pure=True)
 def equal_word_(A,B): return (A == B)
 
-@primitive
+@primitive(pure=True)
 def empty_(A): return (len(A)==0)
 
-@primitive
+@primitive(pure=True)
 def nonempty_(A): return (len(A) > 0)
 
-@primitive
+@primitive(pure=True)
 def cardinality1_(A): return (len(A)==1)
 
-@primitive
+@primitive(pure=True)
 def cardinality2_(A): return (len(A)==2)
 
-@primitive
+@primitive(pure=True)
 def cardinality3_(A): return (len(A)==3)
 
-@primitive
+@primitive(pure=True)
 def cardinality4_(A): return (len(A)==4)
 
-@primitive
+@primitive(pure=True)
 def cardinality5_(A): return (len(A)==5)
 
-@primitive
+@primitive(pure=True)
 def cardinality_(A): return len(A)
 
 # returns cardinalities of sets and otherwise numbers -- for duck typing sets/ints
@@ -104,24 +104,24 @@ def cardify(x):
     if isinstance(x, set): return len(x)
     else: return x
 
-@primitive
+@primitive(pure=True)
 def cardinalityeq_(A,B): return cardify(A) == cardify(B)
 
-@primitive
+@primitive(pure=True)
 def cardinalitygt_(A,B): return cardify(A) > cardify(B)
 
-@primitive
+@primitive(pure=True)
 def cardinalitylt_(A,B): return cardify(A) > cardify(B)
 
-@primitive
+@primitive(pure=True)
 def subset_(A,B):
     return A.issubset(B)
 
-@primitive
+@primitive(pure=True)
 def is_in_(x,S):
     return (x in S)
 
-@primitive
+@primitive(pure=True)
 def diff_(S, p):
     """
     takes a set and an element of that set and
@@ -129,7 +129,7 @@ def diff_(S, p):
     """
     return S.difference(set(p))
 
-@primitive
+@primitive(pure=True)
 def range_set_(x, y, bound=Infinity):
     if y < x or y-x > bound or isnan(x) or isnan(y) or isinf(x) or isinf(y):
         return set()
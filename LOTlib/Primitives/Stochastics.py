@@ -6,11 +6,11 @@ import numpy
 # Stochastic Primitives
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-@primitive
+@primitive(stochastic=True)
 def flip_(p=0.5):
     return flip(p)
 
-@primitive
+@primitive(stochastic=True)
 def binomial_(n, p):
     if 0 < n < Infinity and 0. <= p <= 1 and (isinstance(n, int) or n.is_integer()):
         return numpy.random.binomial(int(n), p)
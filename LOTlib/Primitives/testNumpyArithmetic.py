@@ -0,0 +1,73 @@
+
+import unittest
+
+from LOTlib.Grammar import Grammar
+from LOTlib.FunctionNode import FunctionNode
+from LOTlib.DataAndObjects import FunctionData, ColumnarFunctionData
+from LOTlib.Hypotheses.LOTHypothesis import LOTHypothesis
+from LOTlib.Hypotheses.Likelihoods.GaussianLikelihood import GaussianLikelihood
+
+class VectorizedFunctionTest(unittest.TestCase):
+    def runTest(self):
+        print "# Testing vectorized arithmetic hypotheses"
+        from LOTlib.Examples.SymbolicRegression.Grammar import grammar
+        class GaussianHypothesis(GaussianLikelihood, LOTHypothesis):
+            pass
+
+        data = [FunctionData(input=[x], output=3.0*x, ll_sd=1.0) for x in [-1000.0, -2.5, -1.0, 0.0, 0.5, 1.0, 7.0, 800.0]]
+        cdata = ColumnarFunctionData(data)
+
+        for _ in xrange(500):
+            h = GaussianHypothesis(grammar=grammar)
+            if h.value.count_nodes() > h.maxnodes:
+                continue
+            self.assertIsNotNone(h.get_vectorized_function())
+
+            r = h.batch_responses(cdata)
+            for ri, di in zip(r, data):
+                s = h(*di.input)
+                self.assertTrue(ri == s or (ri != ri and s != s), "%s %s %s %s" % (h, di, ri, s))
+
+            ll, cll = h.compute_likelihood(data), h.compute_likelihood(cdata)
+            self.assertTrue(ll == cll or abs(ll - cll) < 1e-6 * abs(ll) or (ll != ll and cll != cll), "%s %s %s" % (h, ll, cll))
+
+        # things numpy can't do aren't vectorized
+        h = GaussianHypothesis(grammar=grammar, value=FunctionNode(None, 'EXPR', 'pow2_', ['x']))
+        self.assertIsNone(h.get_vectorized_function())
+        self.assertIsNone(h.batch_responses(cdata))
+
+        # on ints, they act as python 2's ints do (or we don't vectorize)
+        grammar = Grammar()
+        grammar.add_rule('START', '', ['EXPR'], 1.0)
+        for name in ['plus_', 'times_', 'minus_', 'divide_', 'pow_', 'mod_']:
+            grammar.add_rule('EXPR', name, ['EXPR', 'EXPR'], 1.0)
+        for terminal in ['x', 'x', '0', '1', '2', '3', '0.5']:
+            grammar.add_rule('EXPR', terminal, None, 1.0)
+
+        data = [FunctionData(input=[x], output=x, ll_sd=1.0) for x in [-7, -2, 0, 1, 3, 10]]
+        cdata = ColumnarFunctionData(data)
+        self.assertEqual(cdata.input_columns[0].dtype.kind, 'i')
+
+        def fn(name, *args):
+            return FunctionNode(None, 'EXPR', name, list(args))
+        h = GaussianHypothesis(value=fn('divide_', fn('pow_', 'x', '2'), '3'))
+        self.assertEqual(list(h.batch_responses(cdata)), [16, 1, 0, 0, 3, 33])
+        h = GaussianHypothesis(value=fn('divide_', 'x', fn('minus_', 'x', '1'))) # divides by 0 at x=1
+        self.assertIsNone(h.batch_responses(cdata))
+
+        # operators in format names are checked for overflow as the primitives are
+        big = ColumnarFunctionData([FunctionData(input=[x], output=x, ll_sd=1.0) for x in [2**30, 3]])
+        h = GaussianHypothesis(value=fn('(%s * %s)', fn('(%s * %s)', 'x', 'x'), 'x'))
+        self.assertIsNone(h.batch_responses(big))
+        self.assertEqual(list(h.batch_responses(cdata)), [-343, -8, 0, 1, 27, 1000])
+        h = GaussianHypothesis(value=fn('(%s - %s)', fn('-%s', 'x'), '-1'))
+        self.assertEqual(list(h.batch_responses(big)), [1-2**30, -2])
+
+        for _ in xrange(1000):
+            h = GaussianHypothesis(grammar=grammar, maxnodes=20)
+            r = h.batch_responses(cdata)
+            if r is None:
+                continue
+            for ri, di in zip(r, data):
+                s = h(*di.input)
+                self.assertTrue(ri == s or (ri != ri and s != s), "%s %s %s %s" % (h, di, ri, s))
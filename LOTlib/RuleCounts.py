@@ -0,0 +1,150 @@
+"""
+    Rule counts for many trees at once, so that we can compute all of their grammar log probabilities with a few
+    matrix products, and compute them again after changing the grammar's rule probabilities without walking any
+    tree. (GrammarInference.create_counts makes the same kind of matrices for Stan.)
+
+    Example:
+        counts = grammar.rule_counts(hypotheses)
+        lps = grammar.batch_log_probability(counts)
+        ... change some rules' p ...
+        lps = grammar.batch_log_probability(counts)
+"""
+from collections import defaultdict
+from math import log
+
+import numpy
+
+from LOTlib.FunctionNode import isFunctionNode, BVAddFunctionNode, BVUseFunctionNode
+
+def tree_of(x):
+    """x if it is a FunctionNode, or else x's value (e.g. for a LOTHypothesis)."""
+    t = x if isFunctionNode(x) else getattr(x, 'value', None)
+    assert isFunctionNode(t), "*** Can only count rules in FunctionNodes or hypotheses whose value is one: %s" % x
+    return t
+
+class RuleCounts(object):
+    """
+        How often each of a list of trees (or hypotheses whose value is a tree) uses each rule of grammar.
+
+        counts[nt] -- a (trees x rules) matrix of how often each tree uses each of grammar.rules[nt] (in that order,
+                      at the time we counted), as in create_counts
+        signatures[nt] -- the signatures of those rules (the columns of counts[nt])
+        masses[nt], normalizers[nt] -- with bound variables in scope, nt's normalizer includes their p's too. Each
+                      masses[nt][j] is a total p of bound variables of type nt that were in scope where some tree
+                      expanded nt, and normalizers[nt][i,j] is how many times tree i did (masses[nt][0] is 0)
+        offset -- for each tree, the log p of the bound variables it uses (these don't change with the grammar)
+        nodes -- each tree's node count (as count_nodes)
+        bound -- whether each tree introduces or uses any bound variables
+
+        NOTE: This is only for trees at the root (whose parents don't add bound variables).
+    """
+
+    def __init__(self, grammar, trees):
+        self.grammar = grammar
+        self.nonterminals = grammar.nonterminals()
+        self.signatures = {nt: [r.get_rule_signature() for r in grammar.rules[nt]] for nt in self.nonterminals}
+        index = {s: (nt, i) for nt in self.nonterminals for i, s in enumerate(self.signatures[nt])}
+
+        trees = map(tree_of, trees)
+        n = len(trees)
+        self.counts = {nt: numpy.zeros((n, len(self.signatures[nt]))) for nt in self.nonterminals}
+        self.offset, self.nodes, self.bound = numpy.zeros(n), numpy.zeros(n, dtype=int), numpy.zeros(n, dtype=bool)
+
+        mass_index = defaultdict(lambda: {0.0: 0}) # nt -> {mass: its column in normalizers[nt]}
+        normalizers = [] # for each tree, {(nt, column): count}
+
+        for i, t in enumerate(trees):
+            z = defaultdict(int)
+            stack = [(t, dict(), dict())] # node, the mass of bound variables in scope for each nt, and their p's
+            while stack:
+                x, scope, bvp = stack.pop()
+                self.nodes[i] += 1
+
+                m = scope.get(x.returntype, 0.0)
+                columns = mass_index[x.returntype]
+                if m not in columns:
+                    columns[m] = len(columns)
+                z[(x.returntype, columns[m])] += 1
+
+                if isinstance(x, BVUseFunctionNode):
+                    assert x.name in bvp, "*** Bound variable %s is not bound in %s" % (x.name, t)
+                    self.offset[i] += log(bvp[x.name])
+                    self.bound[i] = True
+                else:
+                    s = x.get_rule_signature()
+                    assert s in index, "*** No rule in the grammar matches %s in %s" % (s, t)
+                    nt, j = index[s]
+                    self.counts[nt][i, j] += 1
+
+                if isinstance(x, BVAddFunctionNode) and x.added_rule is not None:
+                    r = x.added_rule
+                    scope = dict(scope)
+                    scope[r.nt] = scope.get(r.nt, 0.0) + r.p
+                    bvp = dict(bvp)
+                    bvp[r.name] = r.p
+                    self.bound[i] = True
+
+                for a in x.argFunctionNodes():
+                    stack.append((a, scope, bvp))
+            normalizers.append(z)
+
+        self.masses, self.normalizers = dict(), dict()
+        for nt, columns in mass_index.items():
+            self.masses[nt] = numpy.zeros(len(columns))
+            for m, j in columns.items():
+                self.masses[nt][j] = m
+            self.normalizers[nt] = numpy.zeros((n, len(columns)))
+        for i, z in enumerate(normalizers):
+            for (nt, j), c in z.iteritems():
+                self.normalizers[nt][i, j] = c
+
+    def __len__(self):
+        return len(self.offset)
+
+    def __str__(self):
+        return "<RuleCounts: %i trees, %i nonterminals>" % (len(self), len(self.counts))
+
+    def weights(self, grammar=None):
+        """A dict from each nonterminal to the current p of each rule in signatures[nt], and the total p of its
+        rules (which is more than their sum if rules have been added since)."""
+        if grammar is None:
+            grammar = self.grammar
+
+        out = dict()
+        for nt in self.normalizers.keys():
+            p = []
+            for s in self.signatures.get(nt, []):
+                rules = grammar.rules_by_signature.get(s, ())
+                assert len(rules) == 1, "*** %i rules match %s in the grammar" % (len(rules), s)
+                p.append(rules[0].p)
+            total = sum([r.p for r in grammar.rules[nt]]) if nt in grammar.rules else 0.0
+            out[nt] = (numpy.array(p, dtype=float), total)
+        return out
+
+    def log_probability(self, grammar=None, weights=None):
+        """
+            The log probability of each tree (as Grammar.log_probability), as a numpy array, with the rule p's
+            currently in grammar (by default, the one we counted with). Or, give weights as a dict from some
+            nonterminals to arrays of their rules' p's (in the order of signatures[nt]) to use instead.
+        """
+        w = self.weights(grammar)
+        if weights is not None:
+            for nt, p in weights.items():
+                p = numpy.asarray(p, dtype=float)
+                assert p.shape == w[nt][0].shape, "*** Need a weight for each of the %i rules of %s" % (len(w[nt][0]), nt)
+                w[nt] = (p, p.sum())
+
+        lp = self.offset.copy()
+        for nt, (p, total) in w.items():
+            if nt in self.counts and len(p) > 0:
+                lp += dot_log(self.counts[nt], p)
+            lp -= dot_log(self.normalizers[nt], total + self.masses[nt])
+        return lp
+
+def dot_log(c, x):
+    """c.dot(log(x)), but where x is 0, only the rows that count it (are nonzero there) get -inf."""
+    positive = x > 0
+    out = c.dot(numpy.log(numpy.where(positive, x, 1.0)))
+    if not positive.all():
+        out[c[:, ~positive].sum(axis=1) > 0] = -numpy.inf
+    return out
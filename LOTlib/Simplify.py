@@ -0,0 +1,131 @@
+"""
+    Simplifying FunctionNode trees before we compile them, so that hypotheses don't recompute constants on every
+    call. LOTHypothesis does this when given simplify=True; its value (and so its prior and proposals) are left alone.
+
+    We replace each call of a pure arithmetic or logic primitive (from LOTlib.Primitives.Arithmetic and .Logic, see
+    LOTlib.Eval.PrimitiveInfo), or of python's operators, on number or bool literals, with the literal it evaluates
+    to. So constant subtrees fold from the bottom up. Subtrees that raise stay, so they still raise when called, and
+    so do powers and shifts whose results would be huge. Then we apply these identities:
+
+        if_(True, x, y) -> x, if_(False, x, y) -> y
+        and_(True, x) -> x, or_(False, x) -> x, and likewise for python's and/or (only with the constant first:
+            and_(x, True) is True, not x, when x is, e.g., 5)
+        x + 0, 0 + x, x - 0, x * 1, 1 * x, x / 1 -> x (for plus_, times_, etc., and python's operators; only with
+            int constants, since x * 1.0 is a float when x is an int)
+
+    The arithmetic ones assume that arithmetic gets numbers (and so may turn, e.g., True + 0 into True).
+
+    Example:
+        t, removed = simplify(h.value, h.args)
+"""
+from ast import literal_eval
+from copy import copy
+from math import isinf, isnan
+
+from LOTlib.Eval import * # the primitives, for evaling constants
+from LOTlib.Primitives import *
+from LOTlib.FunctionNode import isFunctionNode, BVUseFunctionNode
+from LOTlib.SubtreeCache import is_pure, identifier_regex, keywords
+
+foldable_modules = set(['LOTlib.Primitives.Arithmetic', 'LOTlib.Primitives.Logic'])
+powers = set(['pow_']) # and templates with ** or <<, whose int results can take forever to compute
+max_power_bits = 4096 # the most bits we'll compute an int power with
+
+def foldable(name):
+    """Is name a pure arithmetic or logic primitive, or a template of python's operators on its args?"""
+    if '%s' in name:
+        return is_pure(name, ()) and all(x in keywords for x in identifier_regex.findall(name.replace('%s', '0')))
+    info = get_primitive_info(name)
+    return info is not None and info.pure and info.function.__module__ in foldable_modules
+
+def too_big(name, values):
+    """Would folding name on values compute an enormous int?"""
+    if len(values) == 2 and (name in powers or '**' in name or '<<' in name) and \
+            all(isinstance(v, (int, long)) for v in values):
+        x, y = values
+        return abs(y) * max(abs(x).bit_length(), 1) > max_power_bits
+    return False
+
+# name -> a list of (the position of a literal arg, what it must equal, the position of the arg to keep)
+identities = dict()
+for names, rules in [(['plus_', '(%s + %s)'],  [(1, 0, 0), (0, 0, 1)]),
+                     (['times_', '(%s * %s)'], [(1, 1, 0), (0, 1, 1)]),
+                     (['subtract_', 'minus_', '(%s - %s)'], [(1, 0, 0)]),
+                     (['divide_', '(%s / %s)'], [(1, 1, 0)])]:
+    for name in names:
+        identities[name] = rules
+
+def literal(x):
+    """Return (True, value) if x is a literal (a string, or a terminal FunctionNode), and (False, None) if not."""
+    if isFunctionNode(x):
+        if x.args is not None or isinstance(x, BVUseFunctionNode):
+            return False, None
+        x = x.name
+    try:
+        return True, literal_eval(x)
+    except (ValueError, SyntaxError):
+        return False, None
+
+def to_literal(v):
+    """The string for the value v, or None if we can't write it as a literal."""
+    if v is None or isinstance(v, (bool, str)):
+        return repr(v)
+    elif isinstance(v, (int, long, float)):
+        if isinstance(v, float) and (isinf(v) or isnan(v)):
+            return None
+        s = repr(v)
+        return '(%s)' % s if v < 0 else s
+    else:
+        return None
+
+def simplify(t, args=()):
+    """Return a simplified copy of t (which may be a string, if all of t is constant), and how many nodes fewer
+    it has."""
+    s = _simplify(copy(t), tuple(args) if args is not None else ())
+    return s, t.count_nodes() - (s.count_nodes() if isFunctionNode(s) else 0)
+
+def _simplify(n, args):
+    # Simplify n (a copy, so we can change it), returning what should replace it
+    if not isFunctionNode(n) or n.args is None:
+        return n
+
+    changed = False
+    for i, a in enumerate(n.args):
+        n.args[i] = _simplify(a, args)
+        if isFunctionNode(n.args[i]):
+            n.args[i].parent = n
+        changed = changed or n.args[i] is not a
+    if changed:
+        n.invalidate() # the copy kept our cached hash
+
+    lits = [literal(a) for a in n.args]
+
+    # fold constants
+    if not isinstance(n, BVUseFunctionNode) and foldable(n.name) and \
+            all(ok and isinstance(v, (bool, int, long, float)) for ok, v in lits) and \
+            not too_big(n.name, [v for _, v in lits]):
+        try:
+            s = to_literal(eval(str(n)))
+            if s is not None:
+                return s
+        except Exception:
+            pass # leave it, so that it raises when called
+
+    # and apply identities
+
+    if n.name == 'if_' and len(n.args) == 3 and lits[0][0]:
+        return n.args[1] if lits[0][1] else n.args[2]
+
+    if len(n.args) == 2 and lits[0][0]:
+        v = lits[0][1]
+        if (n.name == 'and_' and v) or (n.name == 'or_' and not v) or \
+                (n.name == '(%s and %s)' and v) or (n.name == '(%s or %s)' and not v):
+            return n.args[1]
+        elif (n.name == '(%s and %s)' and not v) or (n.name == '(%s or %s)' and v):
+            return n.args[0] # python never evaluates the other one
+
+    for lit, value, keep in identities.get(n.name, []):
+        if len(n.args) == 2 and lits[lit][0] and type(lits[lit][1]) in (int, long) and lits[lit][1] == value:
+            return n.args[keep]
+
+    return n
@@ -0,0 +1,228 @@
+"""
+    A cache of what subtrees evaluate to on each datum, shared between hypotheses, so that scoring a proposal only
+    evaluates the subtrees that are new. Consecutive hypotheses in a chain (e.g. from RegenerationProposer) share
+    all but one subtree, so a proposal usually evaluates only the nodes from the regenerated one up to the root,
+    each by calling its primitive on its children's stored responses.
+
+    Only subtrees with no free bound variables, and whose primitives are all pure (see LOTlib.Eval.PrimitiveInfo),
+    are stored; a hypothesis with anything else in it can't be evaluated this way. Subtrees are keyed by their
+    (cached) structural hash, and checked with FunctionNode.__eq__, so equal subtrees are found anywhere in any tree,
+    and we only descend into the parts of a tree that aren't stored.
+
+    To use one, give subtree_cache=SubtreeCache() to a LOTHypothesis; then its batch_responses (and so the batch
+    likelihoods, on ColumnarFunctionData) go through the cache.
+
+    Example:
+        cache = SubtreeCache()
+        h = MyHypothesis(grammar=grammar, subtree_cache=cache)
+        data = ColumnarFunctionData(data)
+        for h in MHSampler(h, data, steps=10000):
+            ...
+        print cache
+"""
+import re
+from collections import OrderedDict
+from itertools import izip
+
+from LOTlib.Eval import * # the primitives, for evaling subtrees
+from LOTlib.Primitives import *
+from LOTlib.FunctionNode import FunctionNode, BVAddFunctionNode, BVUseFunctionNode
+
+class Raised(object):
+    """What we store for a datum when evaluating a subtree on it raises an exception."""
+    __slots__ = ['exception']
+
+    def __init__(self, exception):
+        self.exception = exception
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Which names are pure
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+# python's, and the names that pystring translates
+keywords = set(['if', 'else', 'and', 'or', 'not', 'in', 'is', 'lambda', 'True', 'False', 'None', 'if_', 'apply_'])
+
+string_regex = re.compile(r"'[^']*'|\"[^\"]*\"")
+identifier_regex = re.compile(r"(?<![\w.])[A-Za-z_]\w*")
+attribute_regex = re.compile(r"\.\s*[A-Za-z_]") # method calls might change their object
+
+def is_pure(s, args):
+    """Does the string s (a node's name or a terminal) use only args, pure primitives, and constants?"""
+    s = string_regex.sub("''", s).replace('%s', '0')
+    if attribute_regex.search(s):
+        return False
+    for name in identifier_regex.findall(s):
+        if not (name in args or name in keywords or is_pure_primitive(name) or
+                (name in globals() and not callable(globals()[name]))):
+            return False
+    return True
+
+def combiner(name):
+    """The function that computes a node called name from its args' values, or None if there isn't one."""
+    if name == 'if_':
+        return lambda c, x, y: (x if c else y)
+    elif name == '':
+        return lambda x: x
+    elif '%s' in name:
+        k = name.count('%s')
+        vs = ['v%i' % i for i in xrange(k)]
+        return eval('lambda %s: %s' % (', '.join(vs), name % tuple(vs)))
+    elif is_pure_primitive(name):
+        return eval(name)
+    else:
+        return None
+
+class SubtreeCache(object):
+    """
+        Stores each pure, closed subtree's responses to a list of inputs (as a list with one value per input, or a
+        Raised).
+
+        maxsize -- how many subtrees to keep (the oldest are dropped)
+
+        The cache is for one list of inputs at a time; a call with different inputs clears it. hits and misses
+        count the subtrees we looked up. A cache pickles without its entries.
+
+        NOTE: The stored responses are shared by every hypothesis that uses them, so they must not be changed.
+    """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self.clear()
+
+    def clear(self):
+        self.inputs = None
+        self.entries = OrderedDict() # (args, hash) -> (subtree, responses, whether any are Raised), oldest first
+        self.columns, self.terminals = dict(), dict()
+        self.purity = dict() # (name, args) -> is_pure(name, args)
+        self.combiners = dict() # node name -> combiner (or None)
+        self.hits, self.misses = 0, 0
+
+    def __getstate__(self):
+        return self.maxsize
+
+    def __setstate__(self, state):
+        self.__init__(state)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __str__(self):
+        return "<SubtreeCache: %i subtrees, %i hits, %i misses>" % (len(self), self.hits, self.misses)
+
+    def responses(self, t, args, inputs):
+        """Return the list of what lambda args: t gives on each of inputs, or None if t isn't pure or raises an
+        exception on some input.
+        """
+        if inputs is not self.inputs:
+            self.entries.clear()
+            self.inputs = inputs
+            self.columns = dict() # args -> a list of each arg's values
+            self.terminals = dict() # (terminal, args) -> what _evaluate gives for it
+
+        args = tuple(args)
+        if args not in self.columns:
+            self.columns[args] = [[inp[i] for inp in inputs] for i in xrange(len(args))]
+
+        r, raises, pure = self._evaluate(t, args)
+        return r if pure and not raises else None
+
+    def _evaluate(self, n, args):
+        # Returns n's responses (or None if we don't store them), whether any are Raised, and whether n is pure.
+        # We look n up before its children, so only the nodes that aren't stored (e.g. those from a proposal's
+        # regenerated node up to the root) are evaluated
+        if not isinstance(n, FunctionNode) or (n.args is None and not isinstance(n, BVUseFunctionNode)):
+            return self._terminal(n if not isinstance(n, FunctionNode) else n.name, args)
+
+        key = (args, hash(n))
+        closed = not n._free_bvs # which hash fills in
+        if closed:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == n:
+                self.hits += 1
+                return entry[1], entry[2], True
+
+        children = [self._evaluate(a, args) if isinstance(a, FunctionNode) else self._terminal(a, args)
+                    for a in n.args] if n.args is not None else []
+        pure = all([c[2] for c in children]) and (isinstance(n, BVUseFunctionNode) or self._is_pure(n.name, args))
+
+        if not pure or not closed or n.name == ',': # comma joins only make sense inside their parent's string
+            return None, False, pure
+
+        # NOTE: we don't move hits to the end (it's slow for OrderedDicts), so the oldest entries are dropped first
+        self.misses += 1
+        r, raises = self._compute(n, args, children)
+        if self.maxsize > 0:
+            self.entries[key] = (n, r, raises)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+        return r, raises, pure
+
+    def _terminal(self, s, args):
+        # _evaluate for a terminal s, which we do once for each input list since they're quick
+        t = self.terminals.get((s, args))
+        if t is None:
+            if not self._is_pure(s, args):
+                t = (None, False, False)
+            elif s in args:
+                t = (self.columns[args][args.index(s)], False, True)
+            else:
+                try:
+                    t = ([eval(s)] * len(self.inputs), False, True)
+                except Exception:
+                    t = (None, False, True) # e.g. part of a template, like '%s.'
+            self.terminals[(s, args)] = t
+        return t
+
+    def _is_pure(self, s, args):
+        p = self.purity.get((s, args))
+        if p is None:
+            p = self.purity[(s, args)] = is_pure(s, args)
+        return p
+
+    def _compute(self, n, args, children):
+        # Compute n's (responses, whether any are Raised), from its children's if we can
+        if n.name not in self.combiners:
+            self.combiners[n.name] = combiner(n.name)
+        g = self.combiners[n.name]
+
+        # when no child raised, try doing them all at once
+        if args and not any(c[1] for c in children):
+            try:
+                if g is None or any(c[0] is None for c in children):
+                    return map(self._whole(n, args), *self.columns[args]), False
+                else:
+                    return map(g, *[c[0] for c in children]), False
+            except Exception:
+                pass
+
+        # otherwise, one at a time, catching exceptions
+        f = self._whole(n, args)
+        def evaluate_whole(inp):
+            try:
+                return f(*inp)
+            except Exception as e:
+                return Raised(e)
+
+        if g is None or any(c[0] is None for c in children):
+            out = map(evaluate_whole, self.inputs)
+        else:
+            out = []
+            for inp, values in izip(self.inputs, izip(*[c[0] for c in children])):
+                if any(isinstance(v, Raised) for v in values):
+                    out.append(evaluate_whole(inp)) # so only the args python would evaluate can raise
+                else:
+                    try:
+                        out.append(g(*values))
+                    except Exception as e:
+                        out.append(Raised(e))
+        return out, any(isinstance(v, Raised) for v in out)
+
+    def _whole(self, n, args):
+        # The function for the whole subtree n
+        s = 'lambda %s: %s' % (', '.join(args), str(n))
+        f = compiled_function_cache.get(s)
+        if f is None:
+            f = eval(s)
+            compiled_function_cache.add(s, f)
+        return f
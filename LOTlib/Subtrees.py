@@ -96,6 +96,7 @@ def trim_leaves_(t):
     
     if isFunctionNode(t) and t.args is not None:
         t.args = [ x.returntype if (isFunctionNode(x) and x.is_terminal()) else trim_leaves_(x) for x in t.args]
+        t.invalidate()
     return t
                 
 
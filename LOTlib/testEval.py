@@ -0,0 +1,101 @@
+
+import unittest
+import pickle
+from copy import copy
+
+from LOTlib.DefaultGrammars import finiteTestGrammar
+from LOTlib.Grammar import Grammar
+from LOTlib.FunctionNode import FunctionNode
+from LOTlib.DataAndObjects import FunctionData, ColumnarFunctionData
+from LOTlib.Hypotheses.LOTHypothesis import LOTHypothesis
+from LOTlib.Hypotheses.RecursiveLOTHypothesis import RecursiveLOTHypothesis
+from LOTlib.Hypotheses.Likelihoods.BinaryLikelihood import BinaryLikelihood
+from LOTlib.Miscellaneous import Infinity
+from LOTlib.SubtreeCache import SubtreeCache
+from LOTlib.Eval import compiled_function_cache, primitive, get_primitive_info, is_pure_primitive, \
+                        EvaluationBudget, TooBigException
+
+class CompiledFunctionCacheTest(unittest.TestCase):
+    def runTest(self):
+        print "# Testing the compiled function cache"
+        h = LOTHypothesis(finiteTestGrammar)
+
+        # the same expression should give us back the same function
+        hits = compiled_function_cache.hits
+        h2 = LOTHypothesis(finiteTestGrammar, value=copy(h.value))
+        self.assertEqual(compiled_function_cache.hits, hits+1)
+        self.assertIs(h2.fvalue, h.fvalue)
+
+        # and so should unpickling
+        h3 = pickle.loads(pickle.dumps(h))
+        self.assertEqual(compiled_function_cache.hits, hits+2)
+        self.assertIs(h3.fvalue, h.fvalue)
+        self.assertEqual(str(h3), str(h))
+
+
+class PrimitiveInfoTest(unittest.TestCase):
+    def runTest(self):
+        print "# Testing primitive metadata"
+        self.assertTrue(is_pure_primitive('plus_'))
+        self.assertEqual(get_primitive_info('plus_').arity, (2, 2))
+        self.assertIsNotNone(get_primitive_info('plus_').vectorized)
+        self.assertTrue(get_primitive_info('flip_').stochastic)
+        self.assertFalse(is_pure_primitive('flip_'))
+        self.assertFalse(is_pure_primitive('set_add_'))
+        self.assertIsNone(get_primitive_info('not_a_primitive_'))
+
+        @primitive(pure=False, argtypes=['EXPR'], returntype='EXPR', cost=2.0)
+        def counted_test_(x, *rest):
+            return x
+        info = get_primitive_info('counted_test_')
+        self.assertEqual((info.pure, info.stochastic, info.arity, info.returntype, info.cost),
+                         (False, False, (1, None), 'EXPR', 2.0))
+
+        # and the subtree cache won't store what it computes
+        h = LOTHypothesis(value=FunctionNode(None, 'EXPR', 'counted_test_', ['x']), subtree_cache=SubtreeCache())
+        self.assertIsNone(h.batch_responses(ColumnarFunctionData([FunctionData(input=[1], output=1)])))
+
+
+class EvaluationBudgetTest(unittest.TestCase):
+    def runTest(self):
+        print "# Testing evaluation budgets"
+        grammar = Grammar()
+        grammar.add_rule('START', '', ['EXPR'], 1.0)
+        grammar.add_rule('EXPR', 'plus_', ['EXPR', 'EXPR'], 1.0)
+        grammar.add_rule('EXPR', 'if_', ['BOOL', 'EXPR', 'EXPR'], 1.0)
+        grammar.add_rule('EXPR', 'recurse_', ['EXPR'], 1.0)
+        grammar.add_rule('BOOL', 'gt_', ['EXPR', 'EXPR'], 1.0)
+        grammar.add_rule('EXPR', 'x', None, 1.0)
+        grammar.add_rule('EXPR', '1', None, 1.0)
+        grammar.add_rule('EXPR', '(x-1)', None, 1.0)
+
+        def plus(*args):
+            return FunctionNode(None, 'EXPR', 'plus_', list(args))
+
+        class BinaryHypothesis(BinaryLikelihood, LOTHypothesis):
+            pass
+
+        budget = EvaluationBudget(max_ops=3)
+        h = BinaryHypothesis(grammar=grammar, value=plus('x', plus('x', '1')), budget=budget)
+        self.assertEqual(h(1), 3)
+        self.assertEqual(h.get_evaluation_cost()[:2], (1, 2))
+
+        h = BinaryHypothesis(grammar=grammar, value=plus('x', plus('x', plus('x', plus('x', '1')))), budget=budget)
+        self.assertRaises(TooBigException, h, 1)
+        self.assertEqual(h.compute_likelihood([FunctionData(input=[1], output=5, alpha=0.9)]), -Infinity)
+        self.assertEqual((budget.calls, budget.aborts), (3, 2))
+        self.assertEqual(budget.most_expensive()[0][2], str(h))
+
+        # a recursion that takes exponential time, stopped by the clock
+        budget = EvaluationBudget(max_time=0.05)
+        h = RecursiveLOTHypothesis(grammar, recurse_bound=10**9, budget=budget,
+                                   value=FunctionNode(None, 'EXPR', 'if_', [FunctionNode(None, 'BOOL', 'gt_', ['x', '0']),
+                                                      plus(FunctionNode(None, 'EXPR', 'recurse_', ['(x-1)']),
+                                                           FunctionNode(None, 'EXPR', 'recurse_', ['(x-1)'])), '1']))
+        self.assertEqual(h(3), 8)
+        self.assertRaises(TooBigException, h, 50)
+
+        # and copies (and unpickled hypotheses) still count
+        h2 = pickle.loads(pickle.dumps(h))
+        self.assertEqual(h2(3), 8)
+        self.assertGreater(h2.budget.total_ops, 0)
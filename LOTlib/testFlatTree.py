@@ -0,0 +1,26 @@
+
+import unittest
+import pickle
+
+from LOTlib.DefaultGrammars import finiteTestGrammar, infiniteTestGrammar
+from LOTlib.FlatTree import FlatTreeEncoder
+
+class FlatTreeTest(unittest.TestCase):
+    def runTest(self):
+        print "# Testing flat tree encoding"
+        for grammar in [finiteTestGrammar, infiniteTestGrammar]:
+            encoder = FlatTreeEncoder(grammar)
+
+            for _ in xrange(1000):
+                t = grammar.generate()
+                ft = encoder.encode(t)
+
+                t2 = encoder.decode(ft)
+                self.assertEqual(t2, t)
+                self.assertTrue(t2.check_parent_refs())
+                self.assertEqual(encoder.encode(t2), ft)
+                self.assertEqual(pickle.loads(pickle.dumps(ft)), ft)
+
+                self.assertEqual(ft.count_nodes(), t.count_nodes())
+                self.assertEqual(encoder.depth(ft), t.depth())
+                self.assertAlmostEqual(encoder.log_probability(ft), grammar.log_probability(t))
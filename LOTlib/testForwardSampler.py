@@ -0,0 +1,71 @@
+
+import random
+import unittest
+
+import numpy
+
+from LOTlib.FunctionNode import FunctionNode
+from LOTlib.DataAndObjects import FunctionData
+from LOTlib.Hypotheses.RecursiveLOTHypothesis import RecursiveLOTHypothesis
+from LOTlib.Hypotheses.Likelihoods.StochasticFunctionLikelihood import StochasticFunctionLikelihood
+from LOTlib.ForwardSampler import forward_sample
+from LOTlib.Eval import RecursionDepthException
+
+class ForwardSamplerTest(unittest.TestCase):
+    def runTest(self):
+        print "# Testing running stochastic hypotheses in groups"
+        class MyHypothesis(StochasticFunctionLikelihood, RecursiveLOTHypothesis):
+            def __call__(self, *args):
+                try:
+                    return RecursiveLOTHypothesis.__call__(self, *args)
+                except RecursionDepthException:
+                    return None
+
+        def fn(name, *args):
+            return FunctionNode(None, 'EXPR', name, list(args))
+
+        # 'a'*k with probability 2**-(k+1)
+        v = fn('if_', fn('flip_', ''), fn('(%s + %s)', "'a'", fn('recurse_')), FunctionNode(None, 'EXPR', "''", None))
+        h = MyHypothesis(None, value=v, args=[], recurse_bound=100)
+        groups = forward_sample(h, [], 4000)
+        self.assertEqual(sum(k for _, k in groups), 4000)
+        counts = h.make_ll_counts([], nsamples=4000)
+        self.assertEqual(sum(counts.values()), 4000)
+        for k, p in [('', 0.5), ('a', 0.25), ('aa', 0.125)]:
+            self.assertLess(abs(counts[k] - 4000*p), 200)
+
+        # we give up after max_steps, and count steps (not time), so seeded runs are the same
+        self.assertIsNone(forward_sample(h, [], 4000, max_steps=5))
+        runs = []
+        for _ in xrange(2):
+            random.seed(4)
+            numpy.random.seed(4)
+            h = MyHypothesis(None, value=v, args=[], recurse_bound=100)
+            runs.append(h.sample_outcomes([], 1000))
+            self.assertEqual(h.forward_sampling, (v, True))
+        self.assertEqual(runs[0], runs[1])
+
+        # runs that raise get what __call__ gives them
+        h = MyHypothesis(None, value=fn('(%s + %s)', "'a'", fn('recurse_')), args=[], recurse_bound=3)
+        self.assertEqual(h.make_ll_counts([], nsamples=100), {None: 100})
+
+        # we can't run primitives that change their args in groups
+        h = MyHypothesis(None, value=fn('set_add_', "'a'", fn('set')), args=[])
+        self.assertIsNone(forward_sample(h, [], 10))
+
+        # with a tolerance, we stop when the likelihood's standard error is below it
+        h = MyHypothesis(None, value=FunctionNode(None, 'EXPR', "'b'", None), args=[])
+        counts = h.make_converged_ll_counts(FunctionData(input=[], output={'b': 3}), nsamples=512, start=32,
+                                            tolerance=0.1)
+        self.assertEqual(counts, {'b': 32})
+
+        # an empty arg name (as StochasticGrammarInduction uses) means no args
+        h = MyHypothesis(None, value=fn('not_', fn('flip_', '')), args=[''])
+        self.assertIsNotNone(forward_sample(h, [], 10))
+        counts = h.make_ll_counts([], nsamples=1000)
+        self.assertEqual(sum(counts.values()), 1000)
+        self.assertEqual(set(counts.keys()), set([True, False]))
+
+        # and what we can't compile is run by calling h
+        h = MyHypothesis(None, value=fn('(%s +)', "'a'"), args=[])
+        self.assertIsNone(forward_sample(h, [], 10))
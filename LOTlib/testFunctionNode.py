@@ -0,0 +1,98 @@
+
+import unittest
+import pickle
+from copy import copy
+from math import log
+
+from LOTlib.DefaultGrammars import infiniteTestGrammar
+from LOTlib.FunctionNode import fullstring, cacheable_weight
+from LOTlib.Miscellaneous import lambdaOne
+from LOTlib.BVRuleContextManager import BVRuleContextManager
+from LOTlib.Hypotheses.Proposers.InsertDeleteProposer import isNotBVAddFunctionNode
+
+class StructuralHashTest(unittest.TestCase):
+    def runTest(self):
+        print "# Testing structural hashing"
+        grammar = infiniteTestGrammar
+
+        for _ in xrange(1000):
+            t = grammar.generate()
+            h = hash(t)
+
+            # equal trees (even with new bound variable uuids) must hash equal
+            t2 = copy(t)
+            t2.uniquify_bv()
+            self.assertEqual(t, t2)
+            self.assertEqual(hash(t2), h)
+
+            # regenerating a subnode must invalidate the cache above it
+            n, _ = t2.sample_subnode()
+            n.setto(grammar.generate(n.returntype))
+            t3 = copy(t2)
+            for ti in t3:
+                ti.invalidate()
+            self.assertEqual(hash(t2), hash(t3))
+            self.assertEqual(t == t2, fullstring(t) == fullstring(t2))
+
+
+class NodeSlotsTest(unittest.TestCase):
+    def runTest(self):
+        print "# Testing node annotations and pickling"
+        grammar = infiniteTestGrammar
+
+        for _ in xrange(1000):
+            t = grammar.generate()
+            for n in t:
+                n.annotate(resample_p=0.5)
+
+            for t2 in [copy(t), pickle.loads(pickle.dumps(t)), pickle.loads(pickle.dumps(t, 2))]:
+                self.assertEqual(t2, t)
+                self.assertTrue(t2.check_parent_refs())
+                self.assertTrue(all(n.resample_p == 0.5 for n in t2))
+
+            # setto may change the class of a node, and takes the annotations along
+            n, _ = t.sample_subnode()
+            q = grammar.generate(n.returntype)
+            n.setto(q)
+            self.assertTrue(type(n) is type(q))
+            self.assertEqual(getattr(n, 'resample_p', 1.0), 1.0)
+            self.assertTrue(t.check_parent_refs())
+
+
+class SubtreeWeightTest(unittest.TestCase):
+    def runTest(self):
+        print "# Testing cached subtree weights"
+        grammar = infiniteTestGrammar
+        t = grammar.generate()
+
+        for _ in xrange(1000):
+            # the cached sums must follow along as we regenerate nodes
+            n, lp = t.sample_subnode()
+            self.assertAlmostEqual(lp, -log(t.count_nodes()))
+            with BVRuleContextManager(grammar, n.parent, recurse_up=True):
+                n.setto(grammar.generate(n.returntype))
+
+            self.assertEqual(t.sample_node_normalizer(lambdaOne), t.count_nodes())
+            self.assertEqual(t.sample_node_normalizer(isNotBVAddFunctionNode),
+                             sum([isNotBVAddFunctionNode(x) for x in t]))
+            self.assertEqual(copy(t).sample_node_normalizer(), t.count_nodes())
+
+        # interleaving two weight functions: g's sums cached on subtrees mustn't be used as f's
+        @cacheable_weight
+        def terminals(n):
+            return not any(True for _ in n.argFunctionNodes())
+
+        t = grammar.generate()
+        while not (6 <= t.count_nodes() <= 15):
+            t = grammar.generate()
+        t.sample_node_normalizer(lambdaOne)
+        for n in t:
+            if n is not t:
+                n.sample_node_normalizer(terminals)
+
+        counts = dict((id(n), 0) for n in t)
+        for _ in xrange(6000):
+            n, lp = t.sample_subnode(lambdaOne)
+            counts[id(n)] += 1
+        for c in counts.values():
+            self.assertLess(abs(c - 6000.0/len(counts)), 0.35 * 6000.0/len(counts))
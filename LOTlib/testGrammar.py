@@ -66,3 +66,98 @@ class GrammarTreeTest(unittest.TestCase):
                 for therule in added_rules:
                     self.assertTrue(therule.name not in [r.name for r in grammar.rules[ti.returntype]])
 
+                # and that the signature index agrees with the rules and did not keep any bound variable rules
+                self.assertEqual(sorted(grammar.rules_by_signature.keys()),
+                                 sorted([r.get_rule_signature() for r in grammar]))
+
+
+
+from math import log
+from LOTlib.BVRuleContextManager import BVRuleContextManager
+from LOTlib.PersistentFunctionNode import freeze, BVPathContextManager
+
+class NormalizerCacheTest(unittest.TestCase):
+    def runTest(self):
+        print "# Testing cached normalizers"
+        grammar = finiteTestGrammar
+
+        for _ in xrange(1000):
+            t = grammar.generate()
+
+            # iterate_subnodes adds and removes the bound variable rules, so the cached tables must follow along
+            for ti in t.iterate_subnodes(grammar):
+                for nt in grammar.nonterminals():
+                    ps = [r.p for r in grammar.get_rules(nt)]
+                    self.assertAlmostEqual(grammar.log_normalizer(nt), log(sum(ps)))
+                    self.assertEqual(len(grammar.get_cumulative_probabilities(nt)), len(ps))
+
+        # nested bound variables of one type are removed last in, first out, so the cached sums are kept
+        grammar = infiniteTestGrammar
+        nested = 0
+        for _ in xrange(1000):
+            t = grammar.generate()
+            pt = freeze(t)
+            for path, _ in pt.iterate_paths():
+                c = grammar.get_cumulative_probabilities('A')
+                old = list(c)
+                with BVPathContextManager(grammar, pt, path):
+                    nested += len([r for r in grammar.rules['A'] if r.name.startswith('bv__')]) > 1
+                self.assertTrue(grammar.cumulative_probabilities.get('A') is c)
+                self.assertEqual(c, old)
+
+            for ti in t:
+                c = grammar.get_cumulative_probabilities('A')
+                with BVRuleContextManager(grammar, ti, recurse_up=True):
+                    pass
+                self.assertTrue(grammar.cumulative_probabilities.get('A') is c)
+        self.assertGreater(nested, 0)
+
+        # and if we change probabilities, renormalize must update the cache
+        grammar = finiteTestGrammar
+        old = [r.p for r in grammar]
+        for r in grammar:
+            r.p = 2.0 * r.p
+        grammar.renormalize()
+        for nt in grammar.nonterminals():
+            self.assertAlmostEqual(grammar.log_normalizer(nt), 0.0)
+
+        for r, p in zip(grammar, old):
+            r.p = p
+        grammar.invalidate_normalizers()
+
+
+from LOTlib.DefaultGrammars import DNF
+from LOTlib.Hypotheses.RationalRulesLOTHypothesis import RationalRulesLOTHypothesis, RR_prior
+from LOTlib.Miscellaneous import Infinity
+
+class RuleCountsTest(unittest.TestCase):
+    def runTest(self):
+        print "# Testing batch log probabilities from rule counts"
+        for grammar in [finiteTestGrammar, infiniteTestGrammar]:
+            trees = []
+            while len(trees) < 100:
+                try:
+                    trees.append(grammar.generate())
+                except RuntimeError: # too deep
+                    pass
+            counts = grammar.rule_counts(trees)
+            self.assertTrue(counts.bound.any())
+            for lp, t in zip(grammar.batch_log_probability(counts), trees):
+                self.assertAlmostEqual(lp, grammar.log_probability(t))
+
+            # change the rules' p, and rescore without counting again
+            old = [r.p for r in grammar]
+            for i, r in enumerate(grammar):
+                r.p *= 1.0 + i
+            grammar.invalidate_normalizers()
+            for lp, t in zip(grammar.batch_log_probability(counts), trees):
+                self.assertAlmostEqual(lp, grammar.log_probability(t))
+            for r, p in zip(grammar, old):
+                r.p = p
+            grammar.invalidate_normalizers()
+
+        hs = [RationalRulesLOTHypothesis(grammar=DNF, rrAlpha=0.5, maxnodes=10) for _ in xrange(100)]
+        for lp, h in zip(RationalRulesLOTHypothesis.compute_batch_prior(hs), hs):
+            self.assertEqual(lp == -Infinity, h.value.count_nodes() > 10)
+            if lp > -Infinity:
+                self.assertAlmostEqual(lp, RR_prior(DNF, h.value, alpha=0.5))
@@ -0,0 +1,31 @@
+
+import unittest
+from copy import copy
+
+from LOTlib.DefaultGrammars import infiniteTestGrammar
+from LOTlib.PersistentFunctionNode import freeze, BVPathContextManager
+
+class PersistentFunctionNodeTest(unittest.TestCase):
+    def runTest(self):
+        print "# Testing persistent function nodes"
+        grammar = infiniteTestGrammar
+
+        for _ in xrange(1000):
+            t = grammar.generate()
+            p = freeze(t)
+
+            # interned, and the same tree as t
+            self.assertTrue(freeze(copy(t)) is p)
+            self.assertEqual(p.thaw(), t)
+            self.assertEqual(p.size, t.count_nodes())
+            self.assertAlmostEqual(grammar.log_probability(p), grammar.log_probability(t))
+
+            # replacing a node shares everything off the path
+            path, _ = p.sample_subnode()
+            with BVPathContextManager(grammar, p, path):
+                new = freeze(grammar.generate(p.get(path).returntype))
+            q = p.replace(path, new)
+            self.assertTrue(q.get(path) is new)
+            for (pa, a), (pb, b) in zip(p.iterate_paths(), q.iterate_paths()):
+                if pa == pb and pa[:len(path)] != path and path[:len(pa)] != pa:
+                    self.assertTrue(a is b)
@@ -0,0 +1,43 @@
+
+import unittest
+
+from LOTlib.FunctionNode import FunctionNode
+from LOTlib.Hypotheses.LOTHypothesis import LOTHypothesis
+from LOTlib.Simplify import simplify
+
+class SimplifyTest(unittest.TestCase):
+    def runTest(self):
+        print "# Testing simplification"
+        def fn(name, *args):
+            return FunctionNode(None, 'EXPR', name, list(args))
+
+        for t, out in [(fn('plus_', 'x', fn('plus_', '1', '1')), 'plus_(x, 2)'),
+                       (fn('if_', fn('gt_', '2', '1'), 'x', fn('flip_')), 'x'),
+                       (fn('and_', 'True', fn('not_', 'x')), 'not_(x)'),
+                       (fn('(%s + %s)', fn('(%s * %s)', 'x', '1'), fn('minus_', '1', '1')), 'x'),
+                       (fn('(%s and %s)', 'False', fn('(%s / %s)', '1', '0')), 'False'),
+                       (fn('plus_', 'x', fn('(%s / %s)', '1', '0')), 'plus_(x, (1 / 0))'), # raises, so stays
+                       (fn('plus_', fn('flip_'), '0'), 'flip_()'),
+                       (fn('plus_', '1', fn('negative_', '3')), '(-2)'),
+                       (fn('times_', 'x', '1.0'), 'times_(x, 1.0)'), # 1 * 1.0 is a float
+                       (fn('(%s / %s)', fn('plus_', 'x', '0.0'), '2'), '(plus_(x, 0.0) / 2)'),
+                       (fn('and_', 'x', 'True'), 'and_(x, True)'), # 5 and True is True
+                       (fn('pow_', '10', fn('pow_', '10', '9')), 'pow_(10, 1000000000)'), # too big to compute
+                       (fn('(%s ** %s)', '2', '10'), '1024'),
+                       (fn('cons_', '1', '2'), 'cons_(1, 2)')]: # not arithmetic or logic
+            s, removed = simplify(t, ['x'])
+            self.assertEqual(str(s), out)
+            self.assertEqual(removed, t.count_nodes() - (s.count_nodes() if isinstance(s, FunctionNode) else 0))
+
+        # simplified trees equal (and hash as) the trees written that way, even once the original's hash is cached
+        t = fn('plus_', 'x', fn('plus_', '1', '1'))
+        hash(t)
+        s, _ = simplify(t, ['x'])
+        self.assertEqual(s, fn('plus_', 'x', '2'))
+        self.assertEqual(hash(s), hash(fn('plus_', 'x', '2')))
+        self.assertNotEqual(hash(t), hash(s))
+
+        # hypotheses compile the simplified value, but keep their own
+        v = fn('plus_', 'x', fn('times_', '2', '3'))
+        h = LOTHypothesis(value=v, simplify=True)
+        self.assertEqual((h(1), h.simplified_nodes, h.value), (7, 1, v))
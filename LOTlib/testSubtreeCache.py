@@ -0,0 +1,82 @@
+
+import unittest
+from copy import copy
+
+from LOTlib.Grammar import Grammar
+from LOTlib.FunctionNode import FunctionNode
+from LOTlib.DataAndObjects import FunctionData, ColumnarFunctionData
+from LOTlib.Hypotheses.LOTHypothesis import LOTHypothesis
+from LOTlib.Hypotheses.RecursiveLOTHypothesis import RecursiveLOTHypothesis
+from LOTlib.Hypotheses.Likelihoods.GaussianLikelihood import GaussianLikelihood
+from LOTlib.SubtreeCache import SubtreeCache
+from LOTlib.Eval import TooBigException, primitive, is_pure_primitive
+
+class SubtreeCacheTest(unittest.TestCase):
+    def runTest(self):
+        print "# Testing the subtree cache"
+        grammar = Grammar()
+        grammar.add_rule('START', '', ['EXPR'], 1.0)
+        grammar.add_rule('EXPR', 'plus_', ['EXPR', 'EXPR'], 1.0)
+        grammar.add_rule('EXPR', '(%s * %s)', ['EXPR', 'EXPR'], 1.0)
+        grammar.add_rule('EXPR', '(%s / %s)', ['EXPR', 'EXPR'], 0.5)
+        grammar.add_rule('EXPR', 'if_', ['BOOL', 'EXPR', 'EXPR'], 1.0)
+        grammar.add_rule('EXPR', 'apply_', ['FUNC', 'EXPR'], 1.0)
+        grammar.add_rule('FUNC', 'lambda', ['EXPR'], 1.0, bv_type='EXPR')
+        grammar.add_rule('BOOL', 'gt_', ['EXPR', 'EXPR'], 1.0)
+        grammar.add_rule('EXPR', 'x', None, 8.0)
+        grammar.add_rule('EXPR', '1', None, 4.0)
+
+        class GaussianHypothesis(GaussianLikelihood, LOTHypothesis):
+            pass
+
+        data = ColumnarFunctionData([FunctionData(input=[x], output=x, ll_sd=1.0) for x in xrange(-3, 4)])
+        cache = SubtreeCache()
+        h = GaussianHypothesis(grammar=grammar, maxnodes=100, subtree_cache=cache)
+        for _ in xrange(500):
+            h = h.propose()[0]
+            r = h.batch_responses(data) # numpy arrays for trees we can vectorize, else from the cache
+            try:
+                expected = [h(*inp) for inp in data.inputs]
+            except (ZeroDivisionError, TooBigException):
+                self.assertIsNone(r) # so that the loop raises it
+                continue
+            self.assertIsNotNone(r, str(h))
+            self.assertEqual(list(r), expected, str(h))
+        self.assertGreater(cache.hits, 0)
+
+        # a stored tree is found at its root, even in a copy, without evaluating anything below it
+        while cache.responses(h.value, h.args, data.inputs) is None:
+            h = h.propose()[0]
+        hits, misses = cache.hits, cache.misses
+        self.assertEqual(cache.responses(copy(h.value), h.args, data.inputs),
+                         cache.responses(h.value, h.args, data.inputs))
+        self.assertEqual((cache.hits, cache.misses), (hits+2, misses))
+
+        # stochastic primitives aren't cached
+        h = GaussianHypothesis(value=FunctionNode(None, 'EXPR', 'if_', [
+            FunctionNode(None, 'BOOL', 'flip_', []), 'x', '1']), subtree_cache=cache)
+        self.assertIsNone(h.batch_responses(data))
+
+        # nor are primitives that aren't marked pure
+        calls = []
+        @primitive
+        def unmarked_test_(x):
+            calls.append(x)
+            return len(calls)
+        h = GaussianHypothesis(value=FunctionNode(None, 'EXPR', 'plus_', [
+            FunctionNode(None, 'EXPR', 'unmarked_test_', ['x']), '1']), subtree_cache=cache)
+        self.assertFalse(is_pure_primitive('unmarked_test_'))
+        self.assertIsNone(h.batch_responses(data))
+        self.assertEqual([h(1), h(1)], [2, 3])
+
+        # recursive hypotheses are called on each datum, since the inputs have no column for recurse_
+        class RecursiveGaussianHypothesis(GaussianLikelihood, RecursiveLOTHypothesis):
+            pass
+        for v in [FunctionNode(None, 'EXPR', 'plus_', ['x', '1']),
+                  FunctionNode(None, 'EXPR', 'if_', [FunctionNode(None, 'BOOL', 'gt_', ['x', '0']),
+                                                     FunctionNode(None, 'EXPR', 'recurse_', [
+                                                         FunctionNode(None, 'EXPR', 'minus_', ['x', '1'])]), 'x'])]:
+            h = RecursiveGaussianHypothesis(None, value=v, subtree_cache=cache)
+            self.assertIsNone(h.batch_responses(data))
+            self.assertAlmostEqual(h.compute_likelihood(data),
+                                   RecursiveGaussianHypothesis(None, value=v).compute_likelihood(data.data))